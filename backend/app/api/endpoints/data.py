@@ -1,13 +1,19 @@
 """
 数据采集API接口
 """
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from typing import List, Optional
 from datetime import datetime, timedelta
 
 from app.core.database import get_db
+from app.core.executor import blocking_executor
+from app.core.redis import redis_client
+from app.schemas.market import BackfillRequest
+from app.services.backfill import BackfillJob, BackfillOrchestrator
 from app.services.data_collector import data_collector
+from app.services.kline_sync import KlineSync
+from app.services.symbol_registry import symbol_registry
 
 router = APIRouter()
 
@@ -16,7 +22,7 @@ router = APIRouter()
 async def list_exchanges():
     """获取支持的交易所列表"""
     return {
-        "exchanges": list(data_collector.exchanges.keys()),
+        "exchanges": data_collector.exchange_names,
         "description": {
             "binance": "币安交易所",
             "binance_public": "币安公开数据（无需API密钥）",
@@ -27,10 +33,17 @@ async def list_exchanges():
 
 @router.get("/symbols")
 async def list_symbols(
-    exchange: str = Query(..., description="交易所名称")
+    exchange: str = Query(..., description="交易所名称"),
+    quote: Optional[str] = Query("USDT", description="计价货币，为空表示不限"),
+    base: Optional[str] = Query(None, description="基础货币"),
+    market_type: Optional[str] = Query(None, description="市场类型：spot, swap, future, option")
 ):
     """获取交易所支持的交易对"""
-    symbols = await data_collector.fetch_all_symbols(exchange)
+    try:
+        index = await symbol_registry.get(exchange)
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Failed to load symbols for {exchange}: {e}")
+    symbols = index.filter(quote=quote or None, base=base, market_type=market_type)
     return {
         "exchange": exchange,
         "symbols": symbols,
@@ -38,6 +51,24 @@ async def list_symbols(
     }
 
 
+@router.get("/symbols/search")
+async def search_symbols(
+    exchange: str = Query(..., description="交易所名称"),
+    q: str = Query(..., min_length=1, description="搜索词（交易对或币种，支持前缀和模糊匹配）"),
+    limit: int = Query(20, le=100, description="返回数量")
+):
+    """搜索交易对"""
+    try:
+        index = await symbol_registry.get(exchange)
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Failed to load symbols for {exchange}: {e}")
+    return {
+        "exchange": exchange,
+        "query": q,
+        "symbols": index.search(q, limit=limit)
+    }
+
+
 @router.get("/ticker")
 async def get_ticker(
     exchange: str = Query(..., description="交易所名称"),
@@ -76,29 +107,40 @@ async def collect_historical_data(
     symbol: str = Query(..., description="交易对，如 BTC/USDT"),
     interval: str = Query("1h", description="时间周期"),
     days: int = Query(30, le=365, description="采集天数"),
+    incremental: bool = Query(True, description="增量同步：只抓取数据库中缺失的K线"),
     db: AsyncSession = Depends(get_db)
 ):
     """
     采集历史数据并保存到数据库
     
-    这是一个异步任务，会在后台执行数据采集
+    增量模式下按覆盖图和数据库缺口只抓取缺失的区间，重复调用几乎不产生请求；
+    incremental=false 时重新抓取整个时间窗口
     """
     try:
-        await data_collector.collect_historical_data(
-            db=db,
-            exchange_name=exchange,
-            symbol=symbol,
-            interval=interval,
-            days=days
-        )
+        if incremental:
+            stats = await KlineSync().sync(
+                db, exchange, symbol, interval,
+                start=datetime.now() - timedelta(days=days)
+            )
+        else:
+            stats = await data_collector.collect_historical_data(
+                db=db,
+                exchange_name=exchange,
+                symbol=symbol,
+                interval=interval,
+                days=days
+            )
         
         return {
-            "status": "success",
-            "message": f"Started collecting {days} days of {symbol} data from {exchange}",
+            "status": "error" if stats['error'] else "success",
+            "message": stats['error'] or f"Collected {days} days of {symbol} data from {exchange}",
             "exchange": exchange,
             "symbol": symbol,
             "interval": interval,
-            "days": days
+            "days": days,
+            "fetched": stats['fetched'],
+            "inserted": stats['inserted'],
+            "skipped": stats['skipped']
         }
     except Exception as e:
         return {
@@ -107,6 +149,47 @@ async def collect_historical_data(
         }
 
 
+@router.post("/backfill")
+async def backfill(request: BackfillRequest):
+    """
+    批量回填历史数据
+    
+    多个 (交易所, 交易对, 周期, 时间范围) 任务并发抓取，每个交易所按预算限速，
+    抓取与入库流水线执行；返回每个任务的统计
+    """
+    jobs = [
+        BackfillJob(
+            job.exchange, job.symbol, job.interval,
+            job.start_date, job.end_date or datetime.now()
+        )
+        for job in request.jobs
+    ]
+    orchestrator = BackfillOrchestrator(
+        max_concurrent=request.max_concurrent,
+        requests_per_second=request.requests_per_second
+    )
+    stats = await orchestrator.run(jobs)
+    return {
+        "jobs": stats,
+        "fetched": sum(s['fetched'] for s in stats),
+        "inserted": sum(s['inserted'] for s in stats),
+        "skipped": sum(s['skipped'] for s in stats),
+        "failed": sum(1 for s in stats if s['error'])
+    }
+
+
+@router.get("/executor/metrics")
+async def get_executor_metrics():
+    """阻塞调用线程池的排队深度与各数据源的并发、耗时统计"""
+    return blocking_executor.metrics()
+
+
+@router.get("/cache/metrics")
+async def get_cache_metrics():
+    """缓存命中率与数据源调用次数（按分组，如 ticker）"""
+    return redis_client.cache_metrics()
+
+
 @router.get("/popular-symbols")
 async def get_popular_symbols():
     """获取热门交易对"""
@@ -1,11 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+import asyncio
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, WebSocket
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
 from typing import List
 from datetime import datetime
 
+from app.core.config import settings
 from app.core.database import get_db
-from app.models.market import Kline
+from app.services.data_collector import data_collector
+from app.services.kline_cache import kline_cache
+from app.services.market_gateway import market_gateway
 
 router = APIRouter()
 
@@ -14,28 +19,19 @@ router = APIRouter()
 async def get_klines(
     exchange: str = Query(..., description="交易所名称"),
     symbol: str = Query(..., description="交易对"),
-    interval: str = Query(..., description="时间间隔"),
+    interval: str = Query(..., description="时间间隔：1m, 5m, 1h, 4h, 1d, 1w 或任意分钟整数倍（如 2h, 3d）"),
     start_time: datetime = Query(None, description="开始时间"),
     end_time: datetime = Query(None, description="结束时间"),
     limit: int = Query(500, le=1000, description="返回数量"),
     db: AsyncSession = Depends(get_db)
 ):
-    """获取K线数据"""
-    query = select(Kline).where(
-        Kline.exchange == exchange,
-        Kline.symbol == symbol,
-        Kline.interval == interval
-    )
+    """
+    获取K线数据
     
-    if start_time:
-        query = query.where(Kline.timestamp >= start_time)
-    if end_time:
-        query = query.where(Kline.timestamp <= end_time)
-    
-    query = query.order_by(Kline.timestamp.desc()).limit(limit)
-    
-    result = await db.execute(query)
-    klines = result.scalars().all()
+    1m 以外的周期由 1m K线聚合（常用周期读取物化表，其他周期即时聚合），不请求交易所；
+    已收盘的K线走区间缓存，只有仍在形成的最后一根实时读取
+    """
+    data = await kline_cache.get_klines(db, exchange, symbol, interval, start_time, end_time, limit=limit)
     
     return {
         "exchange": exchange,
@@ -43,14 +39,14 @@ async def get_klines(
         "interval": interval,
         "data": [
             {
-                "timestamp": k.timestamp.isoformat(),
-                "open": k.open,
-                "high": k.high,
-                "low": k.low,
-                "close": k.close,
-                "volume": k.volume
+                "timestamp": timestamp.isoformat(),
+                "open": open_,
+                "high": high,
+                "low": low,
+                "close": close,
+                "volume": volume
             }
-            for k in reversed(klines)
+            for timestamp, open_, high, low, close, volume in data.itertuples(index=False, name=None)
         ]
     }
 
@@ -60,24 +56,115 @@ async def get_ticker(
     exchange: str = Query(..., description="交易所名称"),
     symbol: str = Query(..., description="交易对")
 ):
-    """获取实时行情"""
-    # TODO: 从Redis或交易所API获取实时行情
+    """
+    获取实时行情
+    
+    该交易对有实时推送订阅时直接取网关中的最新行情，否则读取行情缓存（见 DataCollector.fetch_ticker）
+    """
+    tick = market_gateway.latest(exchange, symbol)
+    if tick:
+        return tick
+    
+    ticker = await data_collector.fetch_ticker(exchange, symbol)
+    if not ticker:
+        raise HTTPException(status_code=502, detail=f"Failed to fetch ticker for {symbol} from {exchange}")
     return {
         "exchange": exchange,
         "symbol": symbol,
-        "last_price": 0.0,
-        "bid": 0.0,
-        "ask": 0.0,
-        "volume_24h": 0.0,
-        "change_24h": 0.0
+        "last_price": ticker.get("last") or 0.0,
+        "bid": ticker.get("bid") or 0.0,
+        "ask": ticker.get("ask") or 0.0,
+        "volume_24h": ticker.get("volume") or 0.0,
+        "change_24h": ticker.get("percentage") or 0.0
     }
 
 
+def _split_symbols(symbols: str) -> List[str]:
+    """拆分逗号分隔的交易对，忽略空项"""
+    return [symbol.strip() for symbol in symbols.split(',') if symbol.strip()]
+
+
+def _parse_symbols(symbols: str) -> List[str]:
+    parsed = _split_symbols(symbols)
+    if not parsed:
+        raise HTTPException(status_code=400, detail="symbols is required")
+    return parsed
+
+
+@router.websocket("/ws/ticker")
+async def ticker_websocket(
+    websocket: WebSocket,
+    exchange: str = Query(..., description="交易所名称"),
+    symbols: str = Query(..., description="交易对，逗号分隔")
+):
+    """
+    实时行情推送（WebSocket）
+    
+    每条消息为一批行情（JSON 数组，字段同 /ticker）。同一交易对的所有客户端共享一个上游订阅；
+    客户端接收慢时跳过中间的行情，推送超时则断开。
+    """
+    await websocket.accept()
+    parsed = _split_symbols(symbols)
+    if not parsed:
+        # 没有订阅的流会一直等待行情，直接以策略违规（1008）关闭
+        await websocket.close(code=1008, reason="symbols is required")
+        return
+    stream = market_gateway.stream(exchange, parsed)
+    
+    async def pump():
+        async for ticks in stream:
+            await asyncio.wait_for(websocket.send_json(ticks), timeout=settings.MARKET_GATEWAY_SEND_TIMEOUT)
+    
+    async def wait_disconnect():
+        while (await websocket.receive())['type'] != 'websocket.disconnect':
+            pass
+    
+    sender = asyncio.create_task(pump())
+    receiver = asyncio.create_task(wait_disconnect())
+    done, pending = await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    await stream.aclose()
+    
+    if sender in done and sender.exception() is not None:
+        try:
+            await websocket.close(code=1013)
+        except Exception:
+            pass
+
+
+@router.get("/stream/ticker")
+async def ticker_sse(
+    request: Request,
+    exchange: str = Query(..., description="交易所名称"),
+    symbols: str = Query(..., description="交易对，逗号分隔")
+):
+    """实时行情推送（Server-Sent Events），数据格式同 /ws/ticker"""
+    stream = market_gateway.stream(exchange, _parse_symbols(symbols))
+    
+    async def events():
+        try:
+            async for ticks in stream:
+                if await request.is_disconnected():
+                    break
+                yield f"data: {json.dumps(ticks)}\n\n"
+        finally:
+            await stream.aclose()
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@router.get("/stream/metrics")
+async def get_stream_metrics():
+    """行情网关状态：上游订阅数、各交易对的客户端数"""
+    return market_gateway.metrics()
+
+
 @router.get("/symbols")
 async def get_symbols(exchange: str = Query(..., description="交易所名称")):
-    """获取交易对列表"""
-    # TODO: 从交易所API获取交易对列表
+    """获取交易对列表（USDT 计价）"""
     return {
         "exchange": exchange,
-        "symbols": ["BTC/USDT", "ETH/USDT", "BNB/USDT"]
+        "symbols": await data_collector.fetch_all_symbols(exchange)
     }
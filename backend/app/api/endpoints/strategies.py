@@ -1,13 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import asyncio
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from loguru import logger
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from typing import List
+from datetime import datetime
+from typing import List, Optional
 
+from app.core.config import settings
 from app.core.database import get_db
+from app.core.redis import redis_client
 from app.models.strategy import Strategy, Backtest
 from app.schemas.strategy import (
     StrategyCreate, StrategyUpdate, StrategyResponse,
-    BacktestCreate, BacktestResponse
+    BacktestCreate, BacktestResponse, OptimizationRequest, WalkForwardRequest, PortfolioBacktestRequest
+)
+from app.services.backtest import load_klines_dataframe
+from app.services.global_markets import popular_stock_symbols
+from app.services.optimizer import ParameterOptimizer, grid_size
+from app.services.portfolio_backtest import PortfolioBacktestEngine, load_portfolio_klines
+from app.services.result_store import read_equity_curve, read_trades, downsample_indices
+from app.services.walk_forward import WalkForwardRunner
+from app.strategies.base import STRATEGY_CLASSES, PORTFOLIO_STRATEGY_CLASSES
+from app.tasks.backtest_tasks import (
+    run_backtest, backtest_progress_key, backtest_cancel_key, BACKTEST_KEY_TTL
 )
 
 router = APIRouter()
@@ -159,22 +175,37 @@ async def create_backtest(
     
     backtest = Backtest(
         strategy_id=backtest_in.strategy_id,
+        exchange=backtest_in.exchange,
+        symbol=backtest_in.symbol,
+        interval=backtest_in.interval,
         start_date=backtest_in.start_date,
         end_date=backtest_in.end_date,
-        initial_capital=backtest_in.initial_capital
+        initial_capital=backtest_in.initial_capital,
+        commission=backtest_in.commission,
+        status="pending",
+        progress=0.0
     )
     db.add(backtest)
     await db.commit()
     await db.refresh(backtest)
     
-    # TODO: 异步执行回测任务
+    # 异步执行回测任务（Celery工作进程）
+    try:
+        task = run_backtest.delay(backtest.id)
+        backtest.task_id = task.id
+    except Exception as e:
+        logger.error(f"Failed to queue backtest {backtest.id}: {e}")
+        backtest.status = "failed"
+        backtest.error_message = f"Failed to queue backtest: {e}"
+    await db.commit()
+    await db.refresh(backtest)
     
     return backtest
 
 
 @router.get("/backtest/{backtest_id}", response_model=BacktestResponse)
 async def get_backtest(backtest_id: int, db: AsyncSession = Depends(get_db)):
-    """获取回测结果"""
+    """获取回测结果（运行中的回测返回实时进度）"""
     result = await db.execute(select(Backtest).where(Backtest.id == backtest_id))
     backtest = result.scalar_one_or_none()
     
@@ -184,4 +215,293 @@ async def get_backtest(backtest_id: int, db: AsyncSession = Depends(get_db)):
             detail="Backtest not found"
         )
     
-    return backtest
+    response = BacktestResponse.model_validate(backtest)
+    if backtest.status == "running":
+        progress = await redis_client.get(backtest_progress_key(backtest_id))
+        if progress is not None:
+            response.progress = float(progress)
+    
+    return response
+
+
+async def _load_backtest_blob(db: AsyncSession, backtest_id: int, column) -> Optional[bytes]:
+    """只读取回测的一个二进制结果列"""
+    result = await db.execute(
+        select(Backtest.status, column).where(Backtest.id == backtest_id)
+    )
+    row = result.one_or_none()
+    if not row:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Backtest not found"
+        )
+    if row[1] is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Backtest result is not available (status: {row[0]})"
+        )
+    return row[1]
+
+
+@router.get("/backtest/{backtest_id}/equity")
+async def get_backtest_equity(
+    backtest_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    max_points: int = Query(1000, ge=10, le=20000),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    获取回测权益曲线
+    
+    按时间范围截取，点数超过 max_points 时降采样（保留每段的最高/最低点）
+    """
+    blob = await _load_backtest_blob(db, backtest_id, Backtest.equity_curve_data)
+    curve = await asyncio.to_thread(read_equity_curve, blob, start, end, max_points)
+    return {"backtest_id": backtest_id, **curve}
+
+
+@router.get("/backtest/{backtest_id}/trades")
+async def get_backtest_trades(
+    backtest_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(500, ge=1, le=5000),
+    db: AsyncSession = Depends(get_db)
+):
+    """获取回测成交记录（按时间范围分页）"""
+    blob = await _load_backtest_blob(db, backtest_id, Backtest.trades_data)
+    trades = await asyncio.to_thread(read_trades, blob, start, end, skip, limit)
+    return {"backtest_id": backtest_id, **trades}
+
+
+@router.post("/backtest/{backtest_id}/cancel")
+async def cancel_backtest(backtest_id: int, db: AsyncSession = Depends(get_db)):
+    """
+    取消回测
+    
+    排队中的回测直接撤销任务；运行中的回测设置取消标记，
+    工作进程在下一次上报进度时停止并将状态置为 cancelled
+    """
+    result = await db.execute(select(Backtest).where(Backtest.id == backtest_id))
+    backtest = result.scalar_one_or_none()
+    
+    if not backtest:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Backtest not found"
+        )
+    if backtest.status not in ("pending", "running"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Backtest is already {backtest.status}"
+        )
+    
+    await redis_client.set(backtest_cancel_key(backtest_id), "1", expire=BACKTEST_KEY_TTL)
+    if backtest.status == "pending":
+        if backtest.task_id:
+            run_backtest.app.control.revoke(backtest.task_id)
+        backtest.status = "cancelled"
+        await db.commit()
+    
+    return {"message": "Backtest cancellation requested", "backtest_id": backtest_id, "status": backtest.status}
+
+
+@router.post("/optimize")
+async def optimize_parameters(
+    request: OptimizationRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    参数优化
+    
+    在数据库K线上并行回测每组参数（网格搜索或随机搜索），按优化目标排序返回
+    """
+    strategy_class = STRATEGY_CLASSES.get(request.strategy)
+    if not strategy_class:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Strategy {request.strategy} not found"
+        )
+    if not request.param_grid and not request.param_ranges:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="param_grid or param_ranges is required"
+        )
+    combinations = grid_size(request.param_grid) if request.param_grid else request.n_iter
+    if combinations > settings.OPTIMIZER_MAX_COMBINATIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Too many parameter combinations: {combinations} "
+                   f"(max {settings.OPTIMIZER_MAX_COMBINATIONS})"
+        )
+    
+    data = await load_klines_dataframe(
+        db, request.exchange, request.symbol, request.interval,
+        request.start_date, request.end_date
+    )
+    if data.empty:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No kline data in the requested range"
+        )
+    
+    optimizer = ParameterOptimizer(
+        strategy_class,
+        data,
+        initial_capital=request.initial_capital,
+        commission=request.commission,
+        vectorized=request.vectorized
+    )
+    
+    # 多进程回测是阻塞调用，放到线程中执行，避免阻塞事件循环
+    if request.param_grid:
+        table = await asyncio.to_thread(optimizer.grid_search, request.param_grid, request.target)
+    else:
+        param_ranges = {name: tuple(bounds) for name, bounds in request.param_ranges.items()}
+        table = await asyncio.to_thread(
+            optimizer.random_search, param_ranges, request.n_iter, request.target
+        )
+    
+    table = table.replace({np.nan: None})
+    return {
+        "strategy": request.strategy,
+        "target": request.target,
+        "bars": len(data),
+        "total": len(table),
+        "report": optimizer.report,
+        "results": table.head(request.top_n).to_dict(orient="records")
+    }
+
+
+@router.post("/walk-forward")
+async def walk_forward(
+    request: WalkForwardRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    滚动前推回测
+    
+    每个样本内窗口做网格搜索，最优参数在随后的样本外窗口测试，各折并行执行；
+    返回各折统计和拼接后的样本外权益曲线
+    """
+    strategy_class = STRATEGY_CLASSES.get(request.strategy)
+    if not strategy_class:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Strategy {request.strategy} not found"
+        )
+    combinations = grid_size(request.param_grid)
+    if combinations > settings.OPTIMIZER_MAX_COMBINATIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Too many parameter combinations: {combinations} "
+                   f"(max {settings.OPTIMIZER_MAX_COMBINATIONS})"
+        )
+    
+    data = await load_klines_dataframe(
+        db, request.exchange, request.symbol, request.interval,
+        request.start_date, request.end_date
+    )
+    if data.empty:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No kline data in the requested range"
+        )
+    
+    runner = WalkForwardRunner(
+        strategy_class,
+        data,
+        initial_capital=request.initial_capital,
+        commission=request.commission,
+        vectorized=request.vectorized
+    )
+    try:
+        result = await asyncio.to_thread(
+            runner.run, request.param_grid, request.train_bars, request.test_bars,
+            request.step_bars, request.anchored, request.target
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    curve = result['equity_curve']
+    keep = downsample_indices(curve['equity'].to_numpy(dtype=float), request.max_points)
+    curve = curve.iloc[keep].replace({np.nan: None})
+    return {
+        "strategy": request.strategy,
+        "target": request.target,
+        "bars": len(data),
+        "report": result['report'],
+        "metrics": result['metrics'],
+        "folds": result['folds'],
+        "equity_curve": {
+            "timestamps": curve['timestamp'].tolist(),
+            "equity": curve['equity'].tolist(),
+            "total_points": len(result['equity_curve'])
+        }
+    }
+
+
+@router.post("/portfolio-backtest")
+async def portfolio_backtest(
+    request: PortfolioBacktestRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    组合回测
+    
+    所有标的共用一条时间线和一份现金一次回测完成；未指定 symbols 时使用热门股票列表
+    （GLOBAL_POPULAR_STOCKS，可按 markets 过滤）
+    """
+    strategy_class = PORTFOLIO_STRATEGY_CLASSES.get(request.strategy)
+    if not strategy_class:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Portfolio strategy {request.strategy} not found"
+        )
+    try:
+        symbols = request.symbols or popular_stock_symbols(request.markets)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    data = await load_portfolio_klines(
+        db, request.exchange, symbols, request.interval,
+        request.start_date, request.end_date
+    )
+    if not data:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No kline data in the requested range"
+        )
+    
+    params = {**request.params, 'initial_capital': request.initial_capital}
+    engine = PortfolioBacktestEngine(
+        strategy_class(params),
+        data,
+        initial_capital=request.initial_capital,
+        commission=request.commission
+    )
+    result = await asyncio.to_thread(engine.run)
+    
+    curve = result['equity_curve']
+    keep = downsample_indices(curve['equity'].to_numpy(dtype=float), request.max_points)
+    curve = curve.iloc[keep].replace({np.nan: None})
+    return {
+        "strategy": request.strategy,
+        "symbols": len(data),
+        "missing_symbols": [symbol for symbol in dict.fromkeys(symbols) if symbol not in data],
+        "bars": sum(len(df) for df in data.values()),
+        "metrics": {key: value for key, value in result.items() if key not in ('equity_curve', 'trades')},
+        "equity_curve": {
+            "timestamps": curve['timestamp'].tolist(),
+            "equity": curve['equity'].tolist(),
+            "total_points": len(result['equity_curve'])
+        }
+    }
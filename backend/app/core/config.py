@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List
 from functools import lru_cache
 
 
@@ -45,11 +45,44 @@ class Settings(BaseSettings):
     OKX_PASSPHRASE: str = ""
     OKX_TESTNET: bool = True
     
+    # 数据采集配置
+    KLINE_INSERT_BATCH_SIZE: int = 10000  # K线批量写入每批行数
+    BLOCKING_POOL_SIZE: int = 32  # 阻塞SDK调用（ccxt/yfinance/tushare）线程池大小
+    BLOCKING_CALL_TIMEOUT: float = 30.0  # 阻塞调用超时（秒）
+    CCXT_MAX_CONCURRENCY: int = 16
+    YFINANCE_MAX_CONCURRENCY: int = 4
+    TUSHARE_MAX_CONCURRENCY: int = 2
+    YFINANCE_BATCH_SIZE: int = 50  # 批量下载时每次请求的股票数
+    YFINANCE_BATCH_TIMEOUT: float = 120.0  # 批量下载超时（秒）
+    KLINE_STORE_ENABLED: bool = True  # 本地K线列式存储（需要 pyarrow）
+    KLINE_STORE_PATH: str = "data/klines"
+    KLINE_PARTITION_PREMAKE: int = 3  # 提前创建的未来时间分区数
+    KLINE_ROLLUP_INTERVALS: List[str] = ['5m', '15m', '30m', '1h', '4h', '1d', '1w']  # 由 1m 聚合并物化的周期
+    KLINE_RETENTION_DAYS: Dict[str, int] = {'1m': 180, '5m': 730}  # 各周期K线保留天数，未列出的周期永久保留
+    KLINE_CACHE_WINDOW_BARS: int = 500  # K线缓存窗口长度（根）
+    KLINE_CACHE_TTL: int = 86400  # K线缓存窗口过期时间（秒）
+    TICKER_CACHE_TTL: float = 2.0  # 行情缓存新鲜期（秒）
+    TICKER_CACHE_STALE_TTL: float = 30.0  # 行情过期后仍先返回旧值、后台刷新的时间（秒）
+    SYMBOL_REGISTRY_PATH: str = "data/symbols"  # 交易对列表快照目录
+    SYMBOL_REFRESH_INTERVAL: float = 21600.0  # 交易对列表后台刷新间隔（秒）
+    
+    # 实时行情网关配置
+    MARKET_GATEWAY_BUFFER_SIZE: int = 256  # 每个交易对的行情环形缓冲区容量
+    MARKET_GATEWAY_MAX_BATCH: int = 64  # 每次推送给客户端的最多行情条数，慢客户端跳过更早的行情
+    MARKET_GATEWAY_SEND_TIMEOUT: float = 10.0  # 单次推送超时（秒），超时的客户端被断开
+    MARKET_GATEWAY_IDLE_TIMEOUT: float = 30.0  # 最后一个客户端离开后保留上游订阅的时间（秒）
+    
     # 风控配置
     MAX_POSITION_SIZE: float = 10000.0
     MAX_DAILY_LOSS: float = 1000.0
     MAX_ORDERS_PER_MINUTE: int = 10
     
+    # 回测配置
+    INDICATOR_CACHE_MAX_MB: int = 256  # 指标缓存内存上限（每个进程）
+    OPTIMIZER_MAX_COMBINATIONS: int = 5000  # 一次参数优化/滚动前推请求最多的参数组合数
+    BACKTEST_STREAMING_MIN_BARS: int = 2000000  # 预计K线数超过该值的回测改用流式引擎（分块读取）
+    BACKTEST_STREAMING_CHUNK_SIZE: int = 50000  # 流式回测每块K线数
+    
     # 日志配置
     LOG_LEVEL: str = "INFO"
     LOG_FILE: str = "logs/app.log"
@@ -61,6 +94,10 @@ class Settings(BaseSettings):
     OPENAI_API_KEY: str = ""
     OPENAI_BASE_URL: str = "https://api.openai.com/v1"
     OPENAI_MODEL: str = "gpt-3.5-turbo"
+    NEWSAPI_KEY: str = ""  # newsapi.org 密钥，为空时不搜索新闻
+    SEARCH_HTTP_LIMIT_PER_HOST: int = 8  # 外部信息源每个主机的最大连接数
+    SEARCH_HTTP_TIMEOUT: float = 10.0  # 外部信息源请求超时（秒）
+    SEARCH_CACHE_TTL: Dict[str, int] = {'news': 600, 'crypto_news': 300, 'sentiment': 3600}  # 外部信息缓存时间（秒）
     
     class Config:
         env_file = ".env"
@@ -1,6 +1,7 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
-from typing import AsyncGenerator
+from sqlalchemy.pool import NullPool
+from typing import AsyncGenerator, Tuple
 
 from app.core.config import settings
 
@@ -23,6 +24,26 @@ AsyncSessionLocal = async_sessionmaker(
 )
 
 
+def create_worker_session_factory() -> Tuple[AsyncEngine, async_sessionmaker]:
+    """
+    创建 Celery 任务使用的引擎和会话工厂
+    
+    每次任务在新的事件循环（asyncio.run）中运行，不能复用 API 进程的连接池，
+    因此使用 NullPool；任务结束时调用 engine.dispose()。
+    """
+    worker_engine = create_async_engine(
+        settings.DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://"),
+        poolclass=NullPool
+    )
+    session_factory = async_sessionmaker(
+        worker_engine,
+        class_=AsyncSession,
+        expire_on_commit=False,
+        autoflush=False,
+    )
+    return worker_engine, session_factory
+
+
 class Base(DeclarativeBase):
     """数据库模型基类"""
     pass
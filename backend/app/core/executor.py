@@ -0,0 +1,170 @@
+"""
+阻塞调用执行器
+ccxt（同步版）、yfinance、tushare 等 SDK 的网络请求都是阻塞调用，
+统一放到有界线程池中执行，按数据源限制并发并设置超时，避免阻塞事件循环
+"""
+import asyncio
+import functools
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from loguru import logger
+
+from app.core.config import settings
+
+
+class ProviderStats:
+    """单个数据源的调用统计"""
+    
+    def __init__(self, limit: int, window: int = 200):
+        self.limit = limit
+        self.waiting = 0  # 等待并发名额的调用数
+        self.running = 0  # 正在线程池中执行的调用数
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.latencies = deque(maxlen=window)  # 最近的调用耗时（秒）
+    
+    def snapshot(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+        count = len(latencies)
+        return {
+            'limit': self.limit,
+            'waiting': self.waiting,
+            'running': self.running,
+            'completed': self.completed,
+            'failed': self.failed,
+            'timeouts': self.timeouts,
+            'latency_avg': sum(latencies) / count if count else 0.0,
+            'latency_p95': latencies[min(int(count * 0.95), count - 1)] if count else 0.0,
+            'latency_max': latencies[-1] if count else 0.0,
+        }
+
+
+class BlockingExecutor:
+    """
+    有界线程池执行器
+    
+    每个数据源有独立的并发上限：超出上限的调用在事件循环中排队等待，不占用线程；
+    超时后调用方立即得到 asyncio.TimeoutError，但并发名额直到线程真正结束才释放，
+    因此卡住的请求不会让线程池无限堆积。
+    """
+    
+    def __init__(
+        self,
+        max_workers: int = 32,
+        provider_limits: Optional[Dict[str, int]] = None,
+        default_limit: int = 4,
+        timeout: float = 30.0
+    ):
+        self.max_workers = max_workers
+        self.provider_limits = dict(provider_limits or {})
+        self.default_limit = default_limit
+        self.timeout = timeout
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stats: Dict[str, ProviderStats] = {}
+    
+    @property
+    def pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='blocking')
+        return self._pool
+    
+    def _provider(self, provider: str):
+        # 信号量绑定事件循环；在新的事件循环中（如 Celery 任务里的 asyncio.run）重新创建
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._semaphores.clear()
+        
+        semaphore = self._semaphores.get(provider)
+        if semaphore is None:
+            limit = self.provider_limits.get(provider, self.default_limit)
+            semaphore = self._semaphores[provider] = asyncio.Semaphore(limit)
+            self._stats.setdefault(provider, ProviderStats(limit))
+        return semaphore, self._stats[provider]
+    
+    async def run(
+        self,
+        provider: str,
+        func: Callable[..., Any],
+        *args,
+        timeout: Optional[float] = None,
+        **kwargs
+    ) -> Any:
+        """
+        在线程池中执行阻塞调用
+        
+        Args:
+            provider: 数据源名称（ccxt, yfinance, tushare...），用于并发限制和统计
+            func: 阻塞函数
+            timeout: 超时秒数（默认使用执行器的 timeout）
+        
+        Returns:
+            func 的返回值
+        
+        Raises:
+            asyncio.TimeoutError: 超时
+        """
+        semaphore, stats = self._provider(provider)
+        loop = asyncio.get_running_loop()
+        
+        stats.waiting += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            stats.waiting -= 1
+        
+        started = time.perf_counter()
+        stats.running += 1
+        future = loop.run_in_executor(self.pool, functools.partial(func, *args, **kwargs))
+        
+        def release(done: asyncio.Future):
+            stats.running -= 1
+            stats.latencies.append(time.perf_counter() - started)
+            if done.cancelled() or done.exception() is not None:
+                stats.failed += 1
+            else:
+                stats.completed += 1
+            semaphore.release()
+        
+        future.add_done_callback(release)
+        
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            stats.timeouts += 1
+            logger.warning(f"{provider} call {getattr(func, '__name__', func)} timed out")
+            raise
+    
+    def metrics(self) -> Dict[str, Any]:
+        """线程池与各数据源的排队、耗时统计"""
+        pool = self._pool
+        return {
+            'max_workers': self.max_workers,
+            'threads': len(pool._threads) if pool else 0,
+            'queue_depth': pool._work_queue.qsize() if pool else 0,
+            'providers': {name: stats.snapshot() for name, stats in self._stats.items()},
+        }
+    
+    def shutdown(self):
+        """关闭线程池（不等待仍在执行的调用）"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+# 全局阻塞调用执行器
+blocking_executor = BlockingExecutor(
+    max_workers=settings.BLOCKING_POOL_SIZE,
+    provider_limits={
+        'ccxt': settings.CCXT_MAX_CONCURRENCY,
+        'yfinance': settings.YFINANCE_MAX_CONCURRENCY,
+        'tushare': settings.TUSHARE_MAX_CONCURRENCY,
+    },
+    timeout=settings.BLOCKING_CALL_TIMEOUT
+)
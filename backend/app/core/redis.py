@@ -1,13 +1,29 @@
+import asyncio
+import json
+import time
 import redis.asyncio as redis
-from typing import Optional
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+from loguru import logger
 from app.core.config import settings
 
 
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
 class RedisClient:
     """Redis客户端封装"""
     
     def __init__(self):
         self.redis: Optional[redis.Redis] = None
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._stats: Dict[str, Dict[str, int]] = defaultdict(lambda: {
+            'hits': 0, 'stale_hits': 0, 'misses': 0, 'coalesced': 0, 'upstream_calls': 0, 'upstream_errors': 0
+        })
     
     async def connect(self):
         """连接Redis"""
@@ -35,11 +51,13 @@ class RedisClient:
             await self.connect()
         await self.redis.set(key, value, ex=expire)
     
-    async def delete(self, key: str):
-        """删除键"""
+    async def delete(self, *keys: str):
+        """删除键（可一次删除多个）"""
+        if not keys:
+            return
         if not self.redis:
             await self.connect()
-        await self.redis.delete(key)
+        await self.redis.delete(*keys)
     
     async def exists(self, key: str) -> bool:
         """检查键是否存在"""
@@ -47,6 +65,95 @@ class RedisClient:
             await self.connect()
         return await self.redis.exists(key) > 0
 
+    
+    async def _load(self, namespace: str, key: str, loader: Callable[[], Awaitable[Any]], ttl: float, stale_ttl: float) -> Any:
+        """调用数据源并写入缓存（同一个键同时只有一个调用）"""
+        stats = self._stats[namespace]
+        stats['upstream_calls'] += 1
+        try:
+            value = await loader()
+        except Exception:
+            stats['upstream_errors'] += 1
+            raise
+        if value:
+            entry = json.dumps({'fetched_at': time.time(), 'value': value}, default=_json_default)
+            try:
+                await self.set(key, entry, expire=max(int(ttl + stale_ttl), 1))
+            except Exception as e:
+                logger.warning(f"Failed to write cache {key}: {e}")
+        return value
+    
+    def _single_flight(self, namespace: str, key: str, loader: Callable[[], Awaitable[Any]], ttl: float, stale_ttl: float) -> asyncio.Task:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._load(namespace, key, loader, ttl, stale_ttl))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self._stats[namespace]['coalesced'] += 1
+        return task
+    
+    async def get_or_load(
+        self,
+        namespace: str,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: float,
+        stale_ttl: float = 0.0
+    ) -> Any:
+        """
+        读取缓存，未命中时调用数据源
+        
+        - 缓存时间在 ttl 内：直接返回；
+        - 超过 ttl 但在 ttl + stale_ttl 内：返回旧值，同时在后台刷新；
+        - 未命中：调用数据源，同一进程内同一个键的并发请求共享一次调用。
+        数据源返回空值时不缓存；Redis 不可用时直接调用数据源。
+        
+        Args:
+            namespace: 统计分组（如 ticker）
+            key: 缓存键
+            loader: 数据源（无参数的协程函数，返回可 JSON 序列化的值）
+            ttl: 新鲜期（秒）
+            stale_ttl: 过期后仍可返回旧值的时间（秒）
+        
+        Returns:
+            缓存值或数据源返回值
+        """
+        stats = self._stats[namespace]
+        try:
+            cached = await self.get(key)
+        except Exception as e:
+            logger.warning(f"Failed to read cache {key}: {e}")
+            cached = None
+        
+        if cached:
+            entry = json.loads(cached)
+            age = time.time() - entry['fetched_at']
+            if age < ttl:
+                stats['hits'] += 1
+                return entry['value']
+            if age < ttl + stale_ttl:
+                stats['stale_hits'] += 1
+                task = self._single_flight(namespace, key, loader, ttl, stale_ttl)
+                # 后台刷新失败时保留旧值，下次请求再试
+                task.add_done_callback(lambda t: t.cancelled() or t.exception())
+                return entry['value']
+        
+        stats['misses'] += 1
+        return await asyncio.shield(self._single_flight(namespace, key, loader, ttl, stale_ttl))
+    
+    def cache_metrics(self) -> Dict[str, Any]:
+        """各分组的缓存命中率与数据源调用次数"""
+        metrics = {}
+        for namespace, stats in self._stats.items():
+            requests = stats['hits'] + stats['stale_hits'] + stats['misses']
+            metrics[namespace] = {
+                **stats,
+                'requests': requests,
+                'hit_ratio': (stats['hits'] + stats['stale_hits']) / requests if requests else 0.0,
+            }
+        return metrics
+
 
 # 全局Redis客户端实例
 redis_client = RedisClient()
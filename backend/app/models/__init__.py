@@ -1,7 +1,7 @@
 from app.models.user import User
 from app.models.strategy import Strategy, Backtest
 from app.models.trade import Order, Position, Trade
-from app.models.market import Kline
+from app.models.market import Kline, KlineRollup
 
 __all__ = [
     "User",
@@ -11,4 +11,5 @@ __all__ = [
     "Position",
     "Trade",
     "Kline",
+    "KlineRollup",
 ]
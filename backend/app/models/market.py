@@ -3,14 +3,18 @@ from app.core.database import Base
 
 
 class Kline(Base):
-    """K线数据模型"""
+    """
+    K线数据模型
+    
+    按周期 LIST 分区，每个周期再按时间 RANGE 分区，分区由 app.services.kline_partitions 维护
+    """
     __tablename__ = "klines"
     
-    id = Column(Integer, primary_key=True, index=True)
-    exchange = Column(String(50), nullable=False)
-    symbol = Column(String(20), nullable=False)
-    interval = Column(String(10), nullable=False)  # 1m, 5m, 15m, 1h, 4h, 1d
-    timestamp = Column(DateTime(timezone=True), nullable=False)
+    # 分区表的主键必须包含分区键 (interval, timestamp)
+    exchange = Column(String(50), primary_key=True)
+    symbol = Column(String(20), primary_key=True)
+    interval = Column(String(10), primary_key=True)  # 1m, 5m, 15m, 1h, 4h, 1d
+    timestamp = Column(DateTime(timezone=True), primary_key=True)
     open = Column(Float, nullable=False)
     high = Column(Float, nullable=False)
     low = Column(Float, nullable=False)
@@ -18,8 +22,36 @@ class Kline(Base):
     volume = Column(Float, nullable=False)
     
     __table_args__ = (
-        Index('idx_kline_lookup', 'exchange', 'symbol', 'interval', 'timestamp'),
+        Index('idx_klines_timestamp_brin', 'timestamp', postgresql_using='brin'),
+        {'postgresql_partition_by': 'LIST (interval)'},
     )
     
     def __repr__(self):
         return f"<Kline {self.symbol} {self.interval} {self.timestamp}>"
+
+
+class KlineRollup(Base):
+    """
+    高周期K线（由 1m K线聚合）
+    
+    新的 1m K线入库后增量更新，见 app.services.resampler
+    """
+    __tablename__ = "kline_rollups"
+    
+    exchange = Column(String(50), primary_key=True)
+    symbol = Column(String(20), primary_key=True)
+    interval = Column(String(10), primary_key=True)  # 5m, 15m, 30m, 1h, 4h, 1d, 1w
+    timestamp = Column(DateTime(timezone=True), primary_key=True)  # 周期开盘时间
+    open = Column(Float, nullable=False)
+    high = Column(Float, nullable=False)
+    low = Column(Float, nullable=False)
+    close = Column(Float, nullable=False)
+    volume = Column(Float, nullable=False)
+    bar_count = Column(Integer, nullable=False)  # 聚合的 1m K线数，等于周期分钟数时为完整K线
+    
+    __table_args__ = (
+        Index('idx_kline_rollups_timestamp_brin', 'timestamp', postgresql_using='brin'),
+    )
+    
+    def __repr__(self):
+        return f"<KlineRollup {self.symbol} {self.interval} {self.timestamp}>"
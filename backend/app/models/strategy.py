@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, JSON, ForeignKey, Float, func
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, JSON, ForeignKey, Float, LargeBinary, func
+from sqlalchemy.orm import relationship, deferred
 from app.core.database import Base
 
 
@@ -31,16 +31,27 @@ class Backtest(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     strategy_id = Column(Integer, ForeignKey("strategies.id"), nullable=False)
+    exchange = Column(String(50), nullable=False, default="binance_public")
+    symbol = Column(String(20), nullable=False, default="BTC/USDT")
+    interval = Column(String(10), nullable=False, default="1h")
     start_date = Column(DateTime(timezone=True), nullable=False)
     end_date = Column(DateTime(timezone=True), nullable=False)
     initial_capital = Column(Float, default=100000.0)
+    commission = Column(Float, default=0.001)
+    status = Column(String(20), default="pending")  # pending, running, completed, failed, cancelled
+    progress = Column(Float, default=0.0)  # 0~1
+    task_id = Column(String(100))  # Celery任务ID
+    error_message = Column(Text)
     final_capital = Column(Float)
     total_return = Column(Float)
     sharpe_ratio = Column(Float)
     max_drawdown = Column(Float)
     win_rate = Column(Float)
     total_trades = Column(Integer)
-    result_data = Column(JSON)  # 详细回测结果
+    result_data = Column(JSON)  # 回测结果摘要（规模与预览曲线）
+    # 完整权益曲线与成交记录（压缩的列式二进制，见 app.services.result_store），按需加载
+    equity_curve_data = deferred(Column(LargeBinary))
+    trades_data = deferred(Column(LargeBinary))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # 关联
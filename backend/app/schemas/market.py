@@ -0,0 +1,19 @@
+from pydantic import BaseModel, Field
+from typing import Optional, List
+from datetime import datetime
+
+
+class BackfillJobRequest(BaseModel):
+    """回填任务"""
+    exchange: str
+    symbol: str
+    interval: str = "1h"
+    start_date: datetime
+    end_date: Optional[datetime] = None  # 默认到当前时间
+
+
+class BackfillRequest(BaseModel):
+    """批量回填请求模型"""
+    jobs: List[BackfillJobRequest] = Field(..., min_length=1, max_length=500)
+    max_concurrent: int = Field(2, ge=1, le=20, description="每个交易所的并发请求数")
+    requests_per_second: float = Field(5.0, gt=0, le=100, description="每个交易所每秒请求数")
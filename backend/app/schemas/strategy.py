@@ -1,6 +1,6 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Union
 
 
 class StrategyBase(BaseModel):
@@ -41,18 +41,29 @@ class StrategyResponse(StrategyBase):
 class BacktestCreate(BaseModel):
     """回测创建模型"""
     strategy_id: int
+    exchange: str = "binance_public"
+    symbol: str = "BTC/USDT"
+    interval: str = "1h"
     start_date: datetime
     end_date: datetime
     initial_capital: float = 100000.0
+    commission: float = Field(0.001, ge=0, lt=1)
 
 
 class BacktestResponse(BaseModel):
     """回测响应模型"""
     id: int
     strategy_id: int
+    exchange: str
+    symbol: str
+    interval: str
     start_date: datetime
     end_date: datetime
     initial_capital: float
+    commission: Optional[float] = None
+    status: str
+    progress: Optional[float] = None
+    error_message: Optional[str] = None
     final_capital: Optional[float] = None
     total_return: Optional[float] = None
     sharpe_ratio: Optional[float] = None
@@ -64,3 +75,63 @@ class BacktestResponse(BaseModel):
     
     class Config:
         from_attributes = True
+
+
+class OptimizationRequest(BaseModel):
+    """参数优化请求模型"""
+    strategy: str = Field("MAStrategy", description="内置策略名称")
+    exchange: str
+    symbol: str
+    interval: str = "1h"
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    param_grid: Optional[Dict[str, List[Any]]] = Field(None, description="网格搜索候选值")
+    param_ranges: Optional[Dict[str, List[Union[int, float]]]] = Field(None, description="随机搜索范围 [min, max]")
+    n_iter: int = Field(50, ge=1, le=10000)
+    target: str = Field("sharpe_ratio", pattern="^(sharpe_ratio|total_return|max_drawdown)$")
+    initial_capital: float = 100000.0
+    commission: float = 0.001
+    vectorized: Optional[bool] = Field(None, description="是否向量化回测，默认策略支持时使用")
+    top_n: int = Field(20, ge=1, le=1000)
+
+
+class WalkForwardRequest(BaseModel):
+    """滚动前推回测请求模型"""
+    strategy: str = Field("MAStrategy", description="内置策略名称")
+    exchange: str
+    symbol: str
+    interval: str = "1h"
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    param_grid: Dict[str, List[Any]] = Field(..., description="样本内网格搜索候选值")
+    train_bars: int = Field(..., ge=2, description="样本内窗口K线数")
+    test_bars: int = Field(..., ge=2, description="样本外窗口K线数")
+    step_bars: Optional[int] = Field(None, ge=1, description="每次前推的K线数，默认等于 test_bars，不能小于 test_bars")
+    anchored: bool = False
+    target: str = Field("sharpe_ratio", pattern="^(sharpe_ratio|total_return|max_drawdown)$")
+    initial_capital: float = 100000.0
+    commission: float = 0.001
+    vectorized: Optional[bool] = Field(None, description="是否向量化回测，默认策略支持时使用")
+    max_points: int = Field(1000, ge=10, le=20000, description="返回的样本外权益曲线最多点数")
+    
+    @model_validator(mode='after')
+    def check_step_bars(self):
+        """前推步长不能小于样本外窗口，否则相邻折的样本外窗口重叠"""
+        if self.step_bars is not None and self.step_bars < self.test_bars:
+            raise ValueError("step_bars must be greater than or equal to test_bars")
+        return self
+
+
+class PortfolioBacktestRequest(BaseModel):
+    """组合回测请求模型"""
+    strategy: str = Field("PortfolioMAStrategy", description="内置组合策略名称")
+    params: Dict[str, Any] = Field(default_factory=dict, description="策略参数")
+    exchange: str = "yfinance"
+    symbols: Optional[List[str]] = Field(None, description="标的列表，为空时使用 markets 中的热门股票")
+    markets: Optional[List[str]] = Field(None, description="热门股票市场代码（如 JP、UK），为空时使用全部市场")
+    interval: str = "1d"
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    initial_capital: float = 100000.0
+    commission: float = Field(0.001, ge=0, lt=1)
+    max_points: int = Field(1000, ge=10, le=20000, description="返回的权益曲线最多点数")
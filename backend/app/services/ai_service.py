@@ -2,6 +2,7 @@
 AI服务模块
 支持市场分析、策略生成、交易信号、智能问答等功能
 """
+import asyncio
 import json
 from typing import Dict, Any, List, Optional
 from datetime import datetime
@@ -50,8 +51,12 @@ class AIService:
             # 获取实时新闻和市场情绪
             if not news:
                 logger.info(f"Fetching real-time news for {symbol}")
-                news = await search_service.search_crypto_news(symbol)
-                sentiment = await search_service.get_market_sentiment(symbol)
+                headlines, crypto_news, sentiment = await asyncio.gather(
+                    search_service.search_news(symbol.split("/")[0]),
+                    search_service.search_crypto_news(symbol),
+                    search_service.get_market_sentiment(symbol)
+                )
+                news = [*crypto_news, *headlines]
                 if sentiment:
                     news.append(f"恐惧贪婪指数: {sentiment.get('fear_greed_index')} ({sentiment.get('classification')})")
             
@@ -0,0 +1,268 @@
+"""
+历史数据回填
+多交易所、多交易对并发回填：使用 ccxt 异步客户端，每个交易所独立的请求预算，
+抓取与入库通过有界队列流水线化（入库慢时抓取自动等待，内存占用有上限）
+"""
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Callable, Awaitable, TYPE_CHECKING
+
+from loguru import logger
+
+if TYPE_CHECKING:
+    import ccxt.async_support as ccxt_async
+
+
+class BackfillJob:
+    """回填任务：一个交易所上一个交易对、一个周期的时间区间"""
+    
+    __slots__ = ('exchange', 'symbol', 'interval', 'start', 'end')
+    
+    def __init__(self, exchange: str, symbol: str, interval: str, start: datetime, end: datetime):
+        self.exchange = exchange
+        self.symbol = symbol
+        self.interval = interval
+        self.start = start
+        self.end = end
+    
+    def __repr__(self):
+        return f"<BackfillJob {self.exchange} {self.symbol} {self.interval} {self.start} ~ {self.end}>"
+
+
+class RateBudget:
+    """
+    交易所请求预算
+    
+    限制同时进行的请求数，并保证相邻请求的发起间隔不小于 1 / requests_per_second，
+    同一交易所的所有回填任务共用一个预算。
+    """
+    
+    def __init__(self, max_concurrent: int = 2, requests_per_second: float = 5.0):
+        self.max_concurrent = max_concurrent
+        self.requests_per_second = requests_per_second
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._lock = asyncio.Lock()
+        self._next_slot = 0.0
+        self.requests = 0
+        self.waited = 0.0
+    
+    async def __aenter__(self):
+        await self._semaphore.acquire()
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            if wait > 0:
+                self.waited += wait
+                await asyncio.sleep(wait)
+            self._next_slot = max(now, self._next_slot) + 1.0 / self.requests_per_second
+            self.requests += 1
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        self._semaphore.release()
+
+
+def create_async_exchange(exchange_name: str) -> 'ccxt_async.Exchange':
+    """
+    创建 ccxt 异步交易所客户端（公开行情接口）
+    
+    Args:
+        exchange_name: 交易所名称，*_public 与同名交易所使用同一个 ccxt 类
+    """
+    import ccxt.async_support as ccxt_async
+    
+    exchange_id = exchange_name[:-len('_public')] if exchange_name.endswith('_public') else exchange_name
+    exchange_class = getattr(ccxt_async, exchange_id, None)
+    if exchange_class is None:
+        raise ValueError(f"Exchange {exchange_name} not found")
+    return exchange_class({'enableRateLimit': True})
+
+
+def candles_to_klines(candles: List[List[Any]]) -> List[Dict[str, Any]]:
+    """ccxt OHLCV 数组转为K线字典（与 DataCollector.fetch_ohlcv 的格式一致）"""
+    return [
+        {
+            'timestamp': datetime.fromtimestamp(candle[0] / 1000, tz=timezone.utc),
+            'open': float(candle[1]),
+            'high': float(candle[2]),
+            'low': float(candle[3]),
+            'close': float(candle[4]),
+            'volume': float(candle[5])
+        }
+        for candle in candles
+    ]
+
+
+async def save_to_database(job: BackfillJob, klines: List[Dict[str, Any]]) -> Dict[str, int]:
+    """默认入库：每批使用独立会话批量写入"""
+    from app.core.database import AsyncSessionLocal
+    from app.services.data_collector import data_collector
+    
+    async with AsyncSessionLocal() as db:
+        return await data_collector.save_klines_to_db(db, job.exchange, job.symbol, job.interval, klines)
+
+
+# 入库函数：sink(job, klines) -> {"inserted": n, "skipped": m}，写入失败时抛出异常或返回 {"error": 错误信息}
+KlineSink = Callable[[BackfillJob, List[Dict[str, Any]]], Awaitable[Dict[str, int]]]
+
+
+class BackfillOrchestrator:
+    """
+    回填调度器
+    
+    每个任务一个抓取协程，按页调用交易所的异步 fetch_ohlcv，每页放入有界队列；
+    固定数量的入库协程从队列取出并写库。同一交易所的任务共用一个客户端和一个 RateBudget。
+    
+    交易所客户端由 exchange_factory 创建，入库由 sink 完成，
+    均可替换（例如使用本地模拟交易所和内存 sink 进行测试）。
+    
+    Examples:
+        orchestrator = BackfillOrchestrator()
+        stats = await orchestrator.run([
+            BackfillJob('binance_public', 'BTC/USDT', '1m', start, end),
+            BackfillJob('okx', 'ETH/USDT', '1h', start, end),
+        ])
+    """
+    
+    def __init__(
+        self,
+        exchange_factory: Callable[[str], Any] = create_async_exchange,
+        sink: Optional[KlineSink] = None,
+        budgets: Optional[Dict[str, RateBudget]] = None,
+        max_concurrent: int = 2,
+        requests_per_second: float = 5.0,
+        page_limit: int = 1000,
+        queue_size: int = 8,
+        writers: int = 2,
+        retries: int = 3
+    ):
+        self.exchange_factory = exchange_factory
+        self.sink = sink or save_to_database
+        self.budgets: Dict[str, RateBudget] = dict(budgets or {})
+        self.max_concurrent = max_concurrent
+        self.requests_per_second = requests_per_second
+        self.page_limit = page_limit
+        self.queue_size = queue_size
+        self.writers = writers
+        self.retries = retries
+        self._exchanges: Dict[str, Any] = {}
+    
+    async def run(self, jobs: List[BackfillJob]) -> List[Dict[str, Any]]:
+        """
+        执行回填
+        
+        Args:
+            jobs: 回填任务列表
+        
+        Returns:
+            每个任务的统计（pages, fetched, inserted, skipped, error）
+        """
+        started = time.perf_counter()
+        stats = [
+            {
+                'exchange': job.exchange, 'symbol': job.symbol, 'interval': job.interval,
+                'pages': 0, 'fetched': 0, 'inserted': 0, 'skipped': 0, 'error': None
+            }
+            for job in jobs
+        ]
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        writers = [asyncio.create_task(self._write(queue, stats)) for _ in range(self.writers)]
+        
+        try:
+            await asyncio.gather(*(self._fetch(i, job, queue, stats[i]) for i, job in enumerate(jobs)))
+        finally:
+            for _ in writers:
+                await queue.put(None)
+            await asyncio.gather(*writers)
+            await self.close()
+        
+        logger.info(
+            f"Backfill finished: {len(jobs)} jobs, "
+            f"{sum(s['fetched'] for s in stats)} fetched, {sum(s['inserted'] for s in stats)} inserted, "
+            f"{sum(1 for s in stats if s['error'])} failed in {time.perf_counter() - started:.1f}s"
+        )
+        return stats
+    
+    async def close(self):
+        """关闭交易所客户端"""
+        for exchange in self._exchanges.values():
+            close = getattr(exchange, 'close', None)
+            if close:
+                try:
+                    await close()
+                except Exception as e:
+                    logger.error(f"Failed to close exchange client: {e}")
+        self._exchanges.clear()
+    
+    def _exchange(self, exchange_name: str) -> Any:
+        """获取交易所客户端（每个交易所一个）"""
+        exchange = self._exchanges.get(exchange_name)
+        if exchange is None:
+            exchange = self._exchanges[exchange_name] = self.exchange_factory(exchange_name)
+        return exchange
+    
+    def _budget(self, exchange_name: str) -> RateBudget:
+        """获取交易所的请求预算"""
+        budget = self.budgets.get(exchange_name)
+        if budget is None:
+            budget = self.budgets[exchange_name] = RateBudget(self.max_concurrent, self.requests_per_second)
+        return budget
+    
+    async def _fetch(self, index: int, job: BackfillJob, queue: asyncio.Queue, stat: Dict[str, Any]):
+        """抓取一个任务的全部K线，按页放入队列"""
+        try:
+            exchange = self._exchange(job.exchange)
+            budget = self._budget(job.exchange)
+            step_ms = exchange.parse_timeframe(job.interval) * 1000
+            since = int(job.start.timestamp() * 1000)
+            end_ms = int(job.end.timestamp() * 1000)
+            
+            while since < end_ms:
+                candles = await self._fetch_page(exchange, budget, job, since)
+                candles = [candle for candle in candles if since <= candle[0] < end_ms]
+                if not candles:
+                    break
+                
+                stat['pages'] += 1
+                stat['fetched'] += len(candles)
+                await queue.put((index, job, candles_to_klines(candles)))
+                since = candles[-1][0] + step_ms
+        
+        except Exception as e:
+            stat['error'] = str(e)
+            logger.error(f"Backfill failed for {job}: {e}")
+    
+    async def _fetch_page(self, exchange: Any, budget: RateBudget, job: BackfillJob, since: int) -> List[List[Any]]:
+        """抓取一页，网络错误时指数退避重试"""
+        import ccxt.async_support as ccxt_async
+        
+        attempt = 0
+        while True:
+            try:
+                async with budget:
+                    return await exchange.fetch_ohlcv(job.symbol, job.interval, since, self.page_limit)
+            except (ccxt_async.NetworkError, asyncio.TimeoutError) as e:
+                if attempt >= self.retries:
+                    raise
+                delay = 2 ** attempt
+                attempt += 1
+                logger.warning(f"Fetch failed for {job} ({e}), retrying in {delay}s")
+                await asyncio.sleep(delay)
+    
+    async def _write(self, queue: asyncio.Queue, stats: List[Dict[str, Any]]):
+        """入库协程：从队列取出一页K线写库，收到 None 时退出"""
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            index, job, klines = item
+            try:
+                result = await self.sink(job, klines)
+                stats[index]['inserted'] += result.get('inserted', 0)
+                stats[index]['skipped'] += result.get('skipped', 0)
+                if result.get('error'):
+                    stats[index]['error'] = result['error']
+            except Exception as e:
+                stats[index]['error'] = str(e)
+                logger.error(f"Failed to save backfill page for {job}: {e}")
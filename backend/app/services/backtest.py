@@ -1,10 +1,183 @@
+import heapq
 import pandas as pd
 import numpy as np
-from typing import Dict, Any, List
+from collections import deque
+from typing import Dict, Any, List, Optional, Iterator, Callable
 from datetime import datetime
+from loguru import logger
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.executor import blocking_executor
+from app.models.market import Kline
+from app.services.kline_reader import arrays_to_frame, fetch_kline_arrays
+from app.services.kline_store import kline_store
 from app.strategies.base import BaseStrategy
 
 
+BAR_FIELDS = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+
+
+class BacktestCancelled(Exception):
+    """回测被取消"""
+    pass
+
+
+class BarFeed:
+    """
+    数组化K线数据源
+    
+    回测开始前将 OHLCV 各列一次性提取为连续的 NumPy 数组，
+    事件循环中按下标读取，不再为每根K线构造 Series 或字典。
+    """
+    
+    def __init__(self, data: pd.DataFrame, symbol: Optional[str] = None):
+        self.symbol = symbol
+        if 'timestamp' in data.columns:
+            self.timestamp = pd.Index(data['timestamp'])
+        else:
+            self.timestamp = data.index
+        self.open = np.ascontiguousarray(data['open'].to_numpy(dtype=float))
+        self.high = np.ascontiguousarray(data['high'].to_numpy(dtype=float))
+        self.low = np.ascontiguousarray(data['low'].to_numpy(dtype=float))
+        self.close = np.ascontiguousarray(data['close'].to_numpy(dtype=float))
+        self.volume = np.ascontiguousarray(data['volume'].to_numpy(dtype=float))
+    
+    def __len__(self) -> int:
+        return len(self.close)
+    
+    def bar(self, index: int) -> Dict[str, Any]:
+        """获取指定位置的K线字典"""
+        bar = {field: getattr(self, field)[index] for field in BAR_FIELDS}
+        if self.symbol is not None:
+            bar['symbol'] = self.symbol
+        return bar
+
+
+class BarView:
+    """
+    K线视图
+    
+    引擎在整个回测中复用同一个视图对象，只移动 index；
+    支持属性访问（bar.close）和字典式访问（bar['close']）。
+    视图仅在当次回调内有效，需要保留时请调用 to_dict()。
+    """
+    
+    __slots__ = ('feed', 'index')
+    
+    def __init__(self, feed: BarFeed, index: int = 0):
+        self.feed = feed
+        self.index = index
+    
+    @property
+    def symbol(self) -> Optional[str]:
+        return self.feed.symbol
+    
+    @property
+    def timestamp(self) -> Any:
+        return self.feed.timestamp[self.index]
+    
+    @property
+    def open(self) -> float:
+        return self.feed.open[self.index]
+    
+    @property
+    def high(self) -> float:
+        return self.feed.high[self.index]
+    
+    @property
+    def low(self) -> float:
+        return self.feed.low[self.index]
+    
+    @property
+    def close(self) -> float:
+        return self.feed.close[self.index]
+    
+    @property
+    def volume(self) -> float:
+        return self.feed.volume[self.index]
+    
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.keys():
+            raise KeyError(key)
+        return getattr(self, key)
+    
+    def __contains__(self, key: str) -> bool:
+        return key in self.keys()
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key) if key in self.keys() else default
+    
+    def keys(self):
+        return BAR_FIELDS if self.feed.symbol is None else BAR_FIELDS + ('symbol',)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为独立的K线字典"""
+        return self.feed.bar(self.index)
+
+
+class OrderBook:
+    """
+    回测订单簿
+    
+    待成交订单单独存放：市价单按提交顺序排队，限价买单按价格从高到低、
+    限价卖单按价格从低到高放入堆中；成交或撤销的订单移入 history。
+    策略撤单只修改订单状态，订单出队时再移入历史记录。
+    """
+    
+    def __init__(self):
+        self.market_orders = deque()
+        self.buy_limits = []  # (-price, seq, order)
+        self.sell_limits = []  # (price, seq, order)
+        self.history = []
+        self._seq = 0
+    
+    def __len__(self) -> int:
+        return len(self.market_orders) + len(self.buy_limits) + len(self.sell_limits)
+    
+    def add(self, order: Dict[str, Any]):
+        """加入新订单"""
+        if order['status'] != 'pending':
+            self.history.append(order)
+            return
+        
+        if order['order_type'] == 'limit':
+            self._seq += 1
+            if order['side'] == 'buy':
+                heapq.heappush(self.buy_limits, (-order['price'], self._seq, order))
+            else:
+                heapq.heappush(self.sell_limits, (order['price'], self._seq, order))
+        else:
+            self.market_orders.append(order)
+    
+    def pop_market_orders(self) -> Iterator[Dict[str, Any]]:
+        """依次取出全部待成交市价单"""
+        while self.market_orders:
+            order = self.market_orders.popleft()
+            if self._is_live(order):
+                yield order
+    
+    def pop_crossed_buys(self, low: float) -> Iterator[Dict[str, Any]]:
+        """取出限价不低于本K线最低价的买单"""
+        while self.buy_limits and -self.buy_limits[0][0] >= low:
+            order = heapq.heappop(self.buy_limits)[2]
+            if self._is_live(order):
+                yield order
+    
+    def pop_crossed_sells(self, high: float) -> Iterator[Dict[str, Any]]:
+        """取出限价不高于本K线最高价的卖单"""
+        while self.sell_limits and self.sell_limits[0][0] <= high:
+            order = heapq.heappop(self.sell_limits)[2]
+            if self._is_live(order):
+                yield order
+    
+    def _is_live(self, order: Dict[str, Any]) -> bool:
+        """已被策略撤销的订单直接移入历史记录"""
+        if order['status'] == 'pending':
+            return True
+        self.history.append(order)
+        return False
+
+
 class BacktestEngine:
     """回测引擎"""
     
@@ -23,86 +196,270 @@ class BacktestEngine:
         self.capital = initial_capital
         self.positions = {}
         self.trades = []
-        self.equity_curve = []
-        
-    def run(self) -> Dict[str, Any]:
-        """运行回测"""
-        for idx, row in self.data.iterrows():
-            bar = {
-                'timestamp': row.get('timestamp', idx),
-                'open': row['open'],
-                'high': row['high'],
-                'low': row['low'],
-                'close': row['close'],
-                'volume': row['volume']
-            }
+        self.equity_curve = pd.DataFrame(columns=['timestamp', 'equity'])
+        self.order_book = OrderBook()
+        self._order_cursor = 0  # strategy.orders 中已进入订单簿的数量
+        
+        # 进度回调 progress_callback(已处理K线数, 总K线数)，每 progress_interval 根调用一次；
+        # 回调中抛出 BacktestCancelled 可中止回测
+        self.progress_callback: Optional[Callable[[int, int], None]] = None
+        self.progress_interval = 10000
+        
+        # 策略资金与回测资金保持一致
+        self.strategy.capital = initial_capital
+    
+    def run(self, warmup: int = 0) -> Dict[str, Any]:
+        """
+        运行回测（事件驱动）
+        
+        K线数据预先提取为数组，每根K线通过复用的 BarView 传给策略的
+        on_bar_view；未覆盖该方法的策略由 BaseStrategy 转换为字典后调用 on_bar。
+        返回结果中的 equity_curve 为包含 timestamp、equity 两列的DataFrame。
+        
+        Args:
+            warmup: 预热K线数，前 warmup 根只传给策略用于计算指标，期间的订单丢弃，
+                不计入权益曲线、成交和指标
+        """
+        feed = BarFeed(self.data)
+        self._warm_up(feed, warmup)
+        equity = self._run_feed(feed, start=warmup)
+        
+        self.equity_curve = pd.DataFrame({'timestamp': feed.timestamp[warmup:], 'equity': equity})
+        
+        # 计算回测结果
+        return self._calculate_metrics(equity)
+    
+    def _warm_up(self, feed: BarFeed, warmup: int):
+        """预热：前 warmup 根K线只回调策略，产生的订单不撮合"""
+        if warmup <= 0:
+            return
+        if warmup >= len(feed):
+            raise ValueError("warmup must be shorter than the data")
+        bar = BarView(feed)
+        for i in range(warmup):
+            bar.index = i
+            self.strategy.on_bar_view(bar)
+        del self.strategy.orders[:]
+    
+    def _run_feed(
+        self,
+        feed: BarFeed,
+        start: int = 0,
+        progress_offset: int = 0,
+        progress_total: Optional[int] = None
+    ) -> np.ndarray:
+        """
+        从第 start 根起逐根K线回调策略并撮合订单，返回每根K线收盘后的权益
+        
+        progress_offset / progress_total 用于分块回测：进度按整个回测而不是本块计算。
+        """
+        bar = BarView(feed)
+        count = len(feed) - start
+        total = progress_total or count
+        equity = np.empty(count)
+        
+        for n, i in enumerate(range(start, len(feed))):
+            bar.index = i
             
             # 调用策略
-            self.strategy.on_bar(bar)
+            self.strategy.on_bar_view(bar)
             
             # 处理订单
             self._process_orders(bar)
             
             # 记录权益曲线
-            equity = self._calculate_equity(bar['close'])
-            self.equity_curve.append({
-                'timestamp': bar['timestamp'],
-                'equity': equity
+            equity[n] = self._calculate_equity(feed.close[i])
+            
+            if self.progress_callback and (n + 1) % self.progress_interval == 0:
+                self.progress_callback(progress_offset + n + 1, total)
+        
+        if self.progress_callback:
+            self.progress_callback(progress_offset + count, total)
+        return equity
+    
+    def run_vectorized(self, warmup: int = 0) -> Dict[str, Any]:
+        """
+        向量化回测
+        
+        由策略的 generate_signals 一次性给出整段数据的目标持仓，
+        持仓、成交、手续费和权益曲线全部用数组运算得出。
+        成交规则与 run() 一致：信号K线的收盘价市价成交，
+        开仓使用当前现金的 position_ratio，平仓卖出全部持仓。
+        
+        Args:
+            warmup: 预热K线数（见 run），信号在全部数据上计算，只从第 warmup 根起交易
+        """
+        signals = self.strategy.generate_signals(self.data)
+        if signals is None:
+            raise ValueError(f"{type(self.strategy).__name__} does not support vectorized backtest")
+        
+        feed = BarFeed(self.data)
+        signals = np.asarray(signals, dtype=float)
+        close = feed.close
+        if len(signals) != len(close):
+            raise ValueError("Signal length does not match data length")
+        if warmup >= len(close) > 0:
+            raise ValueError("warmup must be shorter than the data")
+        signals, close, timestamps = signals[warmup:], close[warmup:], feed.timestamp[warmup:]
+        
+        ratio = self.strategy.position_ratio
+        if ratio * (1 + self.commission) > 1:
+            raise ValueError("position_ratio * (1 + commission) must not exceed 1")
+        
+        # 目标持仓：NaN 沿用上一状态，初始空仓
+        state = pd.Series(signals).ffill().fillna(0.0).to_numpy() > 0
+        prev_state = np.concatenate(([False], state[:-1]))
+        entry_idx = np.flatnonzero(state & ~prev_state)
+        exit_idx = np.flatnonzero(~state & prev_state)
+        
+        # 每次开平仓的现金变化是乘性的：C_{k+1} = C_k * growth_k
+        entry_price = close[entry_idx]
+        exit_price = close[exit_idx]
+        n_closed = len(exit_idx)
+        growth = (
+            1 - ratio * (1 + self.commission)
+            + ratio * (1 - self.commission) * exit_price / entry_price[:n_closed]
+        )
+        cash_before_entry = self.initial_capital * np.concatenate(([1.0], np.cumprod(growth)))
+        amounts = ratio * cash_before_entry[:len(entry_idx)] / entry_price
+        
+        # 逐K线展开现金与持仓
+        entries_so_far = np.cumsum(state & ~prev_state)
+        held_trade = np.maximum(entries_so_far - 1, 0)
+        cash = np.where(
+            state,
+            cash_before_entry[held_trade] * (1 - ratio * (1 + self.commission)),
+            cash_before_entry[np.minimum(entries_so_far, len(cash_before_entry) - 1)]
+        )
+        held = np.where(state, amounts[held_trade] if len(amounts) else 0.0, 0.0)
+        equity = cash + held * close
+        
+        self.trades = self._vectorized_trades(timestamps, entry_idx, exit_idx, amounts, close)
+        self.equity_curve = pd.DataFrame({'timestamp': timestamps, 'equity': equity})
+        
+        self.capital = float(cash[-1]) if len(cash) else self.initial_capital
+        final_amount = float(held[-1]) if len(held) else 0.0
+        if final_amount > 0:
+            self.positions = {'amount': final_amount, 'entry_price': float(entry_price[-1])}
+        elif n_closed:
+            self.positions = {'amount': 0.0, 'entry_price': float(entry_price[-1])}
+        
+        return self._calculate_metrics(equity)
+    
+    def _vectorized_trades(
+        self,
+        timestamps: pd.Index,
+        entry_idx: np.ndarray,
+        exit_idx: np.ndarray,
+        amounts: np.ndarray,
+        close: np.ndarray
+    ) -> List[Dict[str, Any]]:
+        """根据开平仓位置生成成交记录"""
+        fills = [('buy', i, k) for k, i in enumerate(entry_idx.tolist())]
+        fills += [('sell', j, k) for k, j in enumerate(exit_idx.tolist())]
+        fills.sort(key=lambda fill: fill[1])
+        
+        trades = []
+        for side, i, k in fills:
+            price = float(close[i])
+            amount = float(amounts[k])
+            trades.append({
+                'timestamp': timestamps[i],
+                'side': side,
+                'price': price,
+                'amount': amount,
+                'commission': price * amount * self.commission
             })
+        return trades
+    
+    def _process_orders(self, bar: BarView):
+        """
+        处理订单
         
-        # 计算回测结果
-        return self._calculate_metrics()
-    
-    def _process_orders(self, bar: Dict[str, Any]):
-        """处理订单"""
-        for order in self.strategy.orders:
-            if order['status'] == 'pending':
-                # 简化处理：市价单立即成交
-                if order['order_type'] == 'market':
-                    price = bar['close']
-                    amount = order['amount']
-                    
-                    if order['side'] == 'buy':
-                        cost = price * amount * (1 + self.commission)
-                        if self.capital >= cost:
-                            self.capital -= cost
-                            self.positions['amount'] = self.positions.get('amount', 0) + amount
-                            self.positions['entry_price'] = price
-                            
-                            trade = {
-                                'timestamp': bar['timestamp'],
-                                'side': 'buy',
-                                'price': price,
-                                'amount': amount,
-                                'commission': price * amount * self.commission
-                            }
-                            self.trades.append(trade)
-                            order['status'] = 'filled'
-                    
-                    elif order['side'] == 'sell':
-                        if self.positions.get('amount', 0) >= amount:
-                            revenue = price * amount * (1 - self.commission)
-                            self.capital += revenue
-                            self.positions['amount'] -= amount
-                            
-                            trade = {
-                                'timestamp': bar['timestamp'],
-                                'side': 'sell',
-                                'price': price,
-                                'amount': amount,
-                                'commission': price * amount * self.commission
-                            }
-                            self.trades.append(trade)
-                            order['status'] = 'filled'
+        只把策略新提交的订单加入订单簿，撮合时也只遍历活动订单：
+        市价单按收盘价成交；限价买单在最低价触及时、限价卖单在最高价触及时成交，
+        跳空越过限价时按开盘价成交。资金或持仓不足的订单直接撤销。
+        """
+        orders = self.strategy.orders
+        while self._order_cursor < len(orders):
+            self.order_book.add(orders[self._order_cursor])
+            self._order_cursor += 1
+        
+        self._match_orders(self.order_book, bar)
+    
+    def _match_orders(self, book: OrderBook, bar: BarView):
+        """用当前K线撮合订单簿中的活动订单"""
+        for order in book.pop_market_orders():
+            self._fill_order(order, bar, bar['close'])
+            book.history.append(order)
+        
+        for order in book.pop_crossed_buys(bar['low']):
+            self._fill_order(order, bar, min(order['price'], bar['open']))
+            book.history.append(order)
+        
+        for order in book.pop_crossed_sells(bar['high']):
+            self._fill_order(order, bar, max(order['price'], bar['open']))
+            book.history.append(order)
+    
+    def _position_for(self, order: Dict[str, Any]) -> Dict[str, Any]:
+        """订单对应的持仓记录"""
+        return self.positions
+    
+    def _fill_order(self, order: Dict[str, Any], bar: BarView, price: float):
+        """按指定价格成交订单，无法成交时撤销"""
+        position = self._position_for(order)
+        amount = order['amount']
+        filled = False
+        
+        if order['side'] == 'buy':
+            cost = price * amount * (1 + self.commission)
+            if self.capital >= cost:
+                self.capital -= cost
+                position['amount'] = position.get('amount', 0) + amount
+                position['entry_price'] = price
+                filled = True
+        
+        elif order['side'] == 'sell':
+            if position.get('amount', 0) >= amount:
+                revenue = price * amount * (1 - self.commission)
+                self.capital += revenue
+                position['amount'] -= amount
+                filled = True
+        
+        if not filled:
+            order['status'] = 'cancelled'
+            self.strategy.on_order(order)
+            return
+        
+        trade = {
+            'timestamp': bar['timestamp'],
+            'side': order['side'],
+            'price': price,
+            'amount': amount,
+            'commission': price * amount * self.commission
+        }
+        if order.get('symbol'):
+            trade['symbol'] = order['symbol']
+        self.trades.append(trade)
+        order['status'] = 'filled'
+        self._sync_strategy(order, trade)
+    
+    def _sync_strategy(self, order: Dict[str, Any], trade: Dict[str, Any]):
+        """成交后同步策略的资金与持仓，并触发回调"""
+        self.strategy.capital = self.capital
+        self.strategy.positions = dict(self.positions) if self.positions.get('amount', 0) > 0 else {}
+        self.strategy.trades.append(trade)
+        self.strategy.on_order(order)
+        self.strategy.on_trade(trade)
     
     def _calculate_equity(self, current_price: float) -> float:
         """计算当前权益"""
         position_value = self.positions.get('amount', 0) * current_price
         return self.capital + position_value
     
-    def _calculate_metrics(self) -> Dict[str, Any]:
+    def _calculate_metrics(self, equity: np.ndarray) -> Dict[str, Any]:
         """计算回测指标"""
-        equity_df = pd.DataFrame(self.equity_curve)
+        equity_df = pd.DataFrame({'equity': equity})
         
         if len(equity_df) == 0:
             return {}
@@ -142,3 +499,96 @@ class BacktestEngine:
             'equity_curve': self.equity_curve,
             'trades': self.trades
         }
+
+
+async def _store_is_complete(
+    db: AsyncSession,
+    table: Any,
+    exchange: str,
+    symbol: str,
+    interval: str,
+    start_time: Optional[datetime],
+    end_time: Optional[datetime],
+    limit: Optional[int]
+) -> bool:
+    """
+    本地存储读出的K线是否完整
+    
+    请求范围（未指定的边界取本地数据的首尾）需都在分区记录的已覆盖范围内（见 KlineStore.covers），
+    数据库中的真实缺口（休市、交易所停机）不影响判断；
+    未指定的边界之外只在数据库中探测是否还有K线（LIMIT 1 的索引查找，不做 COUNT 扫描）。
+    """
+    timestamps = kline_store._timestamps(table)
+    first, last = int(timestamps[0]), int(timestamps[-1])
+    # 已取满 limit 条时不需要更早的K线
+    filled = bool(limit and table.num_rows >= limit)
+    lo = first if start_time is None or filled else int(start_time.timestamp() * 1000)
+    hi = last if end_time is None else int(end_time.timestamp() * 1000)
+    if not kline_store.covers(exchange, symbol, interval, lo, hi):
+        return False
+    
+    conditions = [Kline.exchange == exchange, Kline.symbol == symbol, Kline.interval == interval]
+    probes = []
+    if start_time is None and not filled:
+        probes.append(Kline.timestamp < pd.Timestamp(first, unit='ms', tz='UTC').to_pydatetime())
+    if end_time is None:
+        probes.append(Kline.timestamp > pd.Timestamp(last, unit='ms', tz='UTC').to_pydatetime())
+    for probe in probes:
+        found = (await db.execute(select(Kline.timestamp).where(*conditions, probe).limit(1))).first()
+        if found is not None:
+            return False
+    return True
+
+
+async def load_klines_dataframe(
+    db: AsyncSession,
+    exchange: str,
+    symbol: str,
+    interval: str,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    limit: Optional[int] = None
+) -> pd.DataFrame:
+    """
+    加载回测用K线数据
+    
+    优先读取本地列式存储（内存映射，毫秒级）；本地数据完整时直接使用（见 _store_is_complete），
+    否则从数据库读取（列数组快速读取，不构造 ORM 对象），并把结果写入本地存储供下次使用。
+    
+    Args:
+        db: 数据库会话
+        exchange: 交易所名称
+        symbol: 交易对
+        interval: 时间间隔
+        start_time: 开始时间
+        end_time: 结束时间
+        limit: 只返回最后 limit 条
+    
+    Returns:
+        按时间升序的 DataFrame（timestamp, open, high, low, close, volume）
+    """
+    if kline_store.enabled:
+        table = kline_store.read_table(exchange, symbol, interval, start_time, end_time)
+        if table is not None:
+            if limit and table.num_rows > limit:
+                table = table.slice(table.num_rows - limit)
+            if await _store_is_complete(db, table, exchange, symbol, interval, start_time, end_time, limit):
+                return table.to_pandas()
+    
+    arrays = await fetch_kline_arrays(db, exchange, symbol, interval, start_time, end_time, limit=limit)
+    data = arrays_to_frame(arrays)
+    
+    if kline_store.enabled and not data.empty:
+        # 本次查询范围内数据库的K线已全部取回（取 limit 条时从返回的第一根起），记为已覆盖
+        timestamps = arrays['timestamp']
+        covered = (
+            int(start_time.timestamp() * 1000) if start_time is not None and not limit else int(timestamps[0]),
+            int(end_time.timestamp() * 1000) if end_time is not None else int(timestamps[-1])
+        )
+        try:
+            await blocking_executor.run(
+                'kline_store', kline_store.write_arrays, exchange, symbol, interval, arrays, covered
+            )
+        except Exception as e:
+            logger.error(f"Failed to warm local kline store: {e}")
+    return data
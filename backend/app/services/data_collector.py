@@ -2,104 +2,140 @@
 数据采集服务
 支持多个数据源：CCXT（加密货币）、Yahoo Finance（股票）、Tushare（A股）
 """
-import ccxt
+import asyncio
+import time
 import pandas as pd
-from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Any, Optional, TYPE_CHECKING
 from loguru import logger
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import text
 
 from app.models.market import Kline
 from app.core.config import settings
+from app.core.executor import blocking_executor
+from app.core.redis import RedisClient, redis_client
+from app.services.backfill import BackfillJob, BackfillOrchestrator
+from app.services.kline_store import kline_store
+
+if TYPE_CHECKING:
+    import ccxt
+
+
+# K线批量写入：各列以数组参数传入，unnest 展开成行，与唯一索引冲突的行跳过
+KLINE_BULK_INSERT = text(f"""
+    INSERT INTO {Kline.__tablename__}
+        (exchange, symbol, interval, timestamp, open, high, low, close, volume)
+    SELECT :exchange, :symbol, :interval, t.*
+    FROM unnest(
+        CAST(:timestamps AS TIMESTAMPTZ[]),
+        CAST(:opens AS FLOAT8[]),
+        CAST(:highs AS FLOAT8[]),
+        CAST(:lows AS FLOAT8[]),
+        CAST(:closes AS FLOAT8[]),
+        CAST(:volumes AS FLOAT8[])
+    ) AS t
+    ON CONFLICT (exchange, symbol, interval, timestamp) DO NOTHING
+""")
+
+# K线统一列（股票数据规范化后与加密货币K线一致）
+OHLCV_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
 
 
 class DataCollector:
     """数据采集器基类 - 支持多个加密货币交易所"""
     
     def __init__(self):
-        self.exchanges = {}
-        self._init_exchanges()
+        self.exchanges: Dict[str, 'ccxt.Exchange'] = {}  # 已创建的交易所客户端
+        self.exchange_configs = self._exchange_configs()
     
-    def _init_exchanges(self):
-        """初始化交易所连接"""
-        try:
-            # ========== 主流加密货币交易所 ==========
-            
-            # Binance（币安）- 全球最大
-            if settings.BINANCE_API_KEY and settings.BINANCE_API_SECRET:
-                self.exchanges['binance'] = ccxt.binance({
+    @staticmethod
+    def _exchange_configs() -> Dict[str, Dict[str, Any]]:
+        """
+        可用的交易所配置：{名称: {'class': ccxt 类名, 'params': 参数, 'sandbox': 是否测试网, 'label': 名称}}
+        
+        只读取配置，不导入 ccxt、不创建客户端；客户端在首次使用时由 get_exchange 创建
+        """
+        configs = {}
+        
+        # ========== 主流加密货币交易所 ==========
+        
+        # Binance（币安）- 全球最大
+        if settings.BINANCE_API_KEY and settings.BINANCE_API_SECRET:
+            configs['binance'] = {
+                'class': 'binance',
+                'params': {
                     'apiKey': settings.BINANCE_API_KEY,
                     'secret': settings.BINANCE_API_SECRET,
                     'enableRateLimit': True,
                     'options': {'defaultType': 'spot'},
-                })
-                if settings.BINANCE_TESTNET:
-                    self.exchanges['binance'].set_sandbox_mode(True)
-                logger.info("Binance exchange initialized")
-            
-            # OKX（欧易）
-            if settings.OKX_API_KEY and settings.OKX_API_SECRET:
-                self.exchanges['okx'] = ccxt.okx({
+                },
+                'sandbox': settings.BINANCE_TESTNET,
+                'label': 'Binance exchange',
+            }
+        
+        # OKX（欧易）
+        if settings.OKX_API_KEY and settings.OKX_API_SECRET:
+            configs['okx'] = {
+                'class': 'okx',
+                'params': {
                     'apiKey': settings.OKX_API_KEY,
                     'secret': settings.OKX_API_SECRET,
                     'password': settings.OKX_PASSPHRASE,
                     'enableRateLimit': True,
-                })
-                if settings.OKX_TESTNET:
-                    self.exchanges['okx'].set_sandbox_mode(True)
-                logger.info("OKX exchange initialized")
-            
-            # ========== 免费公开数据交易所（无需API密钥）==========
-            
-            # Binance 公开数据
-            self.exchanges['binance_public'] = ccxt.binance({
-                'enableRateLimit': True,
-            })
-            logger.info("Binance public API initialized")
-            
-            # Coinbase（美国最大合规交易所）
-            self.exchanges['coinbase'] = ccxt.coinbase({
-                'enableRateLimit': True,
-            })
-            logger.info("Coinbase public API initialized")
-            
-            # Kraken（欧洲老牌交易所）
-            self.exchanges['kraken'] = ccxt.kraken({
-                'enableRateLimit': True,
-            })
-            logger.info("Kraken public API initialized")
-            
-            # Bybit（衍生品交易所）
-            self.exchanges['bybit'] = ccxt.bybit({
-                'enableRateLimit': True,
-            })
-            logger.info("Bybit public API initialized")
-            
-            # Huobi（火币）
-            self.exchanges['huobi'] = ccxt.huobi({
-                'enableRateLimit': True,
-            })
-            logger.info("Huobi public API initialized")
-            
-            # Gate.io
-            self.exchanges['gateio'] = ccxt.gateio({
-                'enableRateLimit': True,
-            })
-            logger.info("Gate.io public API initialized")
-            
-            # KuCoin
-            self.exchanges['kucoin'] = ccxt.kucoin({
-                'enableRateLimit': True,
-            })
-            logger.info("KuCoin public API initialized")
-            
+                },
+                'sandbox': settings.OKX_TESTNET,
+                'label': 'OKX exchange',
+            }
+        
+        # ========== 免费公开数据交易所（无需API密钥）==========
+        
+        public_exchanges = [
+            ('binance_public', 'binance', 'Binance public API'),  # Binance 公开数据
+            ('coinbase', 'coinbase', 'Coinbase public API'),  # Coinbase（美国最大合规交易所）
+            ('kraken', 'kraken', 'Kraken public API'),  # Kraken（欧洲老牌交易所）
+            ('bybit', 'bybit', 'Bybit public API'),  # Bybit（衍生品交易所）
+            ('huobi', 'huobi', 'Huobi public API'),  # Huobi（火币）
+            ('gateio', 'gateio', 'Gate.io public API'),  # Gate.io
+            ('kucoin', 'kucoin', 'KuCoin public API'),  # KuCoin
+        ]
+        for name, class_name, label in public_exchanges:
+            configs[name] = {'class': class_name, 'params': {'enableRateLimit': True}, 'sandbox': False, 'label': label}
+        
+        return configs
+    
+    @property
+    def exchange_names(self) -> List[str]:
+        """已配置的交易所名称（不创建客户端）"""
+        return list(self.exchange_configs)
+    
+    def _create_exchange(self, exchange_name: str) -> Optional['ccxt.Exchange']:
+        """创建交易所客户端（首次使用时才导入 ccxt）"""
+        import ccxt
+        
+        config = self.exchange_configs[exchange_name]
+        try:
+            exchange = getattr(ccxt, config['class'])(dict(config['params']))
+            if config['sandbox']:
+                exchange.set_sandbox_mode(True)
         except Exception as e:
-            logger.error(f"Failed to initialize exchanges: {e}")
+            logger.error(f"Failed to initialize exchange {exchange_name}: {e}")
+            return None
+        logger.info(f"{config['label']} initialized")
+        return exchange
     
-    def get_exchange(self, exchange_name: str) -> Optional[ccxt.Exchange]:
-        """获取交易所实例"""
-        return self.exchanges.get(exchange_name) or self.exchanges.get(f'{exchange_name}_public')
+    def get_exchange(self, exchange_name: str) -> Optional['ccxt.Exchange']:
+        """获取交易所实例（首次获取时创建并缓存）"""
+        if exchange_name not in self.exchange_configs:
+            exchange_name = f'{exchange_name}_public'
+            if exchange_name not in self.exchange_configs:
+                return None
+        exchange = self.exchanges.get(exchange_name)
+        if exchange is None:
+            exchange = self._create_exchange(exchange_name)
+            if exchange is not None:
+                self.exchanges[exchange_name] = exchange
+        return exchange
     
     async def fetch_ohlcv(
         self,
@@ -133,7 +169,7 @@ class DataCollector:
                 since_ts = int(since.timestamp() * 1000)
             
             # 获取OHLCV数据
-            ohlcv = exchange.fetch_ohlcv(symbol, timeframe, since_ts, limit)
+            ohlcv = await blocking_executor.run('ccxt', exchange.fetch_ohlcv, symbol, timeframe, since_ts, limit)
             
             # 转换为字典格式
             result = []
@@ -158,6 +194,9 @@ class DataCollector:
         """
         获取实时行情
         
+        经 Redis 缓存（TICKER_CACHE_TTL 秒内直接返回，之后 TICKER_CACHE_STALE_TTL 秒内先返回旧值并后台刷新），
+        并发的未命中请求共享一次交易所调用。
+        
         Args:
             exchange_name: 交易所名称
             symbol: 交易对
@@ -166,47 +205,60 @@ class DataCollector:
             行情数据
         """
         try:
-            exchange = self.get_exchange(exchange_name)
-            if not exchange:
-                raise ValueError(f"Exchange {exchange_name} not found")
-            
-            ticker = exchange.fetch_ticker(symbol)
-            
-            return {
-                'symbol': symbol,
-                'last': ticker.get('last'),
-                'bid': ticker.get('bid'),
-                'ask': ticker.get('ask'),
-                'high': ticker.get('high'),
-                'low': ticker.get('low'),
-                'volume': ticker.get('baseVolume'),
-                'timestamp': datetime.fromtimestamp(ticker['timestamp'] / 1000) if ticker.get('timestamp') else datetime.now()
-            }
+            return await redis_client.get_or_load(
+                'ticker',
+                f"ticker:{exchange_name}:{symbol}",
+                lambda: self._fetch_ticker(exchange_name, symbol),
+                ttl=settings.TICKER_CACHE_TTL,
+                stale_ttl=settings.TICKER_CACHE_STALE_TTL
+            )
             
         except Exception as e:
             logger.error(f"Failed to fetch ticker: {e}")
             return {}
     
-    async def fetch_all_symbols(self, exchange_name: str) -> List[str]:
+    async def _fetch_ticker(self, exchange_name: str, symbol: str) -> Dict[str, Any]:
+        """从交易所获取实时行情（不经缓存）"""
+        exchange = self.get_exchange(exchange_name)
+        if not exchange:
+            raise ValueError(f"Exchange {exchange_name} not found")
+        
+        ticker = await blocking_executor.run('ccxt', exchange.fetch_ticker, symbol)
+        
+        return {
+            'symbol': symbol,
+            'last': ticker.get('last'),
+            'bid': ticker.get('bid'),
+            'ask': ticker.get('ask'),
+            'high': ticker.get('high'),
+            'low': ticker.get('low'),
+            'volume': ticker.get('baseVolume'),
+            'percentage': ticker.get('percentage'),
+            'timestamp': (datetime.fromtimestamp(ticker['timestamp'] / 1000) if ticker.get('timestamp') else datetime.now()).isoformat()
+        }
+    
+    async def fetch_all_symbols(
+        self,
+        exchange_name: str,
+        quote: Optional[str] = 'USDT',
+        market_type: Optional[str] = None
+    ) -> List[str]:
         """
-        获取所有交易对
+        获取所有交易对（读取交易对注册表，不逐次请求交易所）
         
         Args:
             exchange_name: 交易所名称
+            quote: 计价货币（None 表示不限）
+            market_type: 市场类型（spot, swap, future...，None 表示不限）
         
         Returns:
             交易对列表
         """
+        from app.services.symbol_registry import symbol_registry
+        
         try:
-            exchange = self.get_exchange(exchange_name)
-            if not exchange:
-                raise ValueError(f"Exchange {exchange_name} not found")
-            
-            markets = exchange.load_markets()
-            symbols = [symbol for symbol in markets.keys() if '/USDT' in symbol]
-            
-            logger.info(f"Fetched {len(symbols)} symbols from {exchange_name}")
-            return symbols
+            index = await symbol_registry.get(exchange_name)
+            return index.filter(quote=quote, market_type=market_type)
             
         except Exception as e:
             logger.error(f"Failed to fetch symbols: {e}")
@@ -218,51 +270,128 @@ class DataCollector:
         exchange_name: str,
         symbol: str,
         interval: str,
-        klines: List[Dict[str, Any]]
-    ):
+        klines: List[Dict[str, Any]],
+        batch_size: Optional[int] = None,
+        redis: Optional[RedisClient] = None
+    ) -> Dict[str, int]:
         """
         保存K线数据到数据库
         
+        按批执行 INSERT ... SELECT FROM unnest(...) ON CONFLICT DO NOTHING，
+        每批一次往返，已存在的K线（唯一索引 exchange, symbol, interval, timestamp）直接跳过。
+        
         Args:
             db: 数据库会话
             exchange_name: 交易所名称
             symbol: 交易对
             interval: 时间间隔
             klines: K线数据列表
+            batch_size: 每批行数（默认 settings.KLINE_INSERT_BATCH_SIZE）
+            redis: 使K线缓存失效时使用的 Redis 客户端（默认全局客户端，Celery 任务中传入任务自己的客户端）
+        
+        Returns:
+            {"inserted": 新写入条数, "skipped": 已存在而跳过的条数}；写入失败时（已回滚）
+            另含 "error": 错误信息
         """
+        batch_size = batch_size or settings.KLINE_INSERT_BATCH_SIZE
+        inserted = 0
+        started = time.perf_counter()
+        
         try:
-            for kline_data in klines:
-                # 检查是否已存在
-                result = await db.execute(
-                    select(Kline).where(
-                        Kline.exchange == exchange_name,
-                        Kline.symbol == symbol,
-                        Kline.interval == interval,
-                        Kline.timestamp == kline_data['timestamp']
-                    )
-                )
-                existing = result.scalar_one_or_none()
-                
-                if not existing:
-                    kline = Kline(
-                        exchange=exchange_name,
-                        symbol=symbol,
-                        interval=interval,
-                        timestamp=kline_data['timestamp'],
-                        open=kline_data['open'],
-                        high=kline_data['high'],
-                        low=kline_data['low'],
-                        close=kline_data['close'],
-                        volume=kline_data['volume']
-                    )
-                    db.add(kline)
+            for start in range(0, len(klines), batch_size):
+                batch = klines[start:start + batch_size]
+                result = await db.execute(KLINE_BULK_INSERT, {
+                    'exchange': exchange_name,
+                    'symbol': symbol,
+                    'interval': interval,
+                    'timestamps': [k['timestamp'] for k in batch],
+                    'opens': [float(k['open']) for k in batch],
+                    'highs': [float(k['high']) for k in batch],
+                    'lows': [float(k['low']) for k in batch],
+                    'closes': [float(k['close']) for k in batch],
+                    'volumes': [float(k['volume']) for k in batch],
+                })
+                inserted += max(result.rowcount, 0)
             
             await db.commit()
-            logger.info(f"Saved {len(klines)} klines to database")
+            await self.save_klines_to_store(exchange_name, symbol, interval, klines)
+            if interval == '1m' and inserted:
+                await self.update_rollups(db, exchange_name, symbol, klines)
+            if inserted:
+                await self.invalidate_cache(exchange_name, symbol, interval, klines, redis)
+            
+            elapsed = time.perf_counter() - started
+            skipped = len(klines) - inserted
+            rate = len(klines) / elapsed if elapsed > 0 else 0
+            logger.info(
+                f"Saved klines for {exchange_name} {symbol} {interval}: "
+                f"{inserted} inserted, {skipped} skipped ({rate:.0f} rows/s)"
+            )
+            return {'inserted': inserted, 'skipped': skipped}
             
         except Exception as e:
             logger.error(f"Failed to save klines to database: {e}")
             await db.rollback()
+            return {'inserted': 0, 'skipped': 0, 'error': str(e)}
+    
+    async def save_klines_to_store(
+        self,
+        exchange_name: str,
+        symbol: str,
+        interval: str,
+        klines: List[Dict[str, Any]]
+    ) -> int:
+        """
+        写入本地K线列式存储（在线程池中执行；失败只记录日志，不影响数据库写入）
+        
+        klines 为交易所返回的连续K线，首尾之间记为已覆盖（见 KlineStore.covers）
+        
+        Returns:
+            新增条数
+        """
+        if not kline_store.enabled or not klines:
+            return 0
+        try:
+            return await blocking_executor.run(
+                'kline_store', kline_store.write, exchange_name, symbol, interval, klines, True
+            )
+        except Exception as e:
+            logger.error(f"Failed to save klines to local store: {e}")
+            return 0
+    
+    async def update_rollups(
+        self,
+        db: AsyncSession,
+        exchange_name: str,
+        symbol: str,
+        klines: List[Dict[str, Any]]
+    ) -> Dict[str, int]:
+        """新的 1m K线入库后增量更新高周期K线（失败只记录日志）"""
+        from app.services.resampler import update_rollups
+        
+        timestamps = [k['timestamp'] for k in klines]
+        try:
+            return await update_rollups(db, exchange_name, symbol, min(timestamps), max(timestamps))
+        except Exception as e:
+            logger.error(f"Failed to update kline rollups for {exchange_name} {symbol}: {e}")
+            await db.rollback()
+            return {}
+    
+    async def invalidate_cache(
+        self,
+        exchange_name: str,
+        symbol: str,
+        interval: str,
+        klines: List[Dict[str, Any]],
+        redis: Optional[RedisClient] = None
+    ):
+        """新K线入库后使K线区间缓存中相关的窗口失效"""
+        from app.services.kline_cache import kline_cache
+        
+        timestamps = [k['timestamp'] for k in klines]
+        await kline_cache.invalidate(
+            exchange_name, symbol, interval, min(timestamps), max(timestamps), redis=redis
+        )
     
     async def collect_historical_data(
         self,
@@ -271,54 +400,35 @@ class DataCollector:
         symbol: str,
         interval: str,
         days: int = 30
-    ):
+    ) -> Dict[str, Any]:
         """
         采集历史数据
         
+        通过 BackfillOrchestrator 使用异步交易所客户端分页抓取，抓取与入库流水线执行，
+        不阻塞事件循环。
+        
         Args:
             db: 数据库会话
             exchange_name: 交易所名称
             symbol: 交易对
             interval: 时间间隔
             days: 采集天数
+        
+        Returns:
+            回填统计（pages, fetched, inserted, skipped, error）
         """
-        try:
-            end_time = datetime.now()
-            start_time = end_time - timedelta(days=days)
-            
-            logger.info(f"Collecting historical data for {symbol} from {start_time} to {end_time}")
-            
-            # 分批获取数据（每次最多500条）
-            current_time = start_time
-            all_klines = []
-            
-            while current_time < end_time:
-                klines = await self.fetch_ohlcv(
-                    exchange_name=exchange_name,
-                    symbol=symbol,
-                    timeframe=interval,
-                    since=current_time,
-                    limit=500
-                )
-                
-                if not klines:
-                    break
-                
-                all_klines.extend(klines)
-                
-                # 更新时间
-                if klines:
-                    current_time = klines[-1]['timestamp'] + timedelta(seconds=1)
-                else:
-                    break
-            
-            # 保存到数据库
-            if all_klines:
-                await self.save_klines_to_db(db, exchange_name, symbol, interval, all_klines)
-                logger.info(f"Collected {len(all_klines)} historical klines for {symbol}")
-            
-        except Exception as e:
-            logger.error(f"Failed to collect historical data: {e}")
+        end_time = datetime.now(timezone.utc)
+        start_time = end_time - timedelta(days=days)
+        logger.info(f"Collecting historical data for {symbol} from {start_time} to {end_time}")
+        
+        # 只有一个入库协程，可以安全地复用调用方的会话
+        async def save(job: BackfillJob, klines: List[Dict[str, Any]]) -> Dict[str, int]:
+            return await self.save_klines_to_db(db, exchange_name, symbol, interval, klines)
+        
+        orchestrator = BackfillOrchestrator(sink=save, writers=1)
+        stats = await orchestrator.run([BackfillJob(exchange_name, symbol, interval, start_time, end_time)])
+        logger.info(f"Collected {stats[0]['fetched']} historical klines for {symbol}")
+        return stats[0]
 
 
 class YahooFinanceCollector:
@@ -449,13 +559,20 @@ class YahooFinanceCollector:
     }
     
     def __init__(self):
-        try:
-            import yfinance as yf
-            self.yf = yf
-            logger.info("Yahoo Finance initialized - supports global markets")
-        except ImportError:
-            logger.warning("yfinance not installed. Run: pip install yfinance")
-            self.yf = None
+        self._yf = None
+    
+    @property
+    def yf(self):
+        """yfinance 模块（首次使用时导入，未安装时为 None）"""
+        if self._yf is None:
+            try:
+                import yfinance as yf
+                self._yf = yf
+                logger.info("Yahoo Finance initialized - supports global markets")
+            except ImportError:
+                logger.warning("yfinance not installed. Run: pip install yfinance")
+                self._yf = False
+        return self._yf or None
     
     def format_symbol(self, symbol: str, market: str = 'US') -> str:
         """
@@ -473,6 +590,10 @@ class YahooFinanceCollector:
             return f"{symbol}{suffix}"
         return symbol
     
+    def _history(self, symbol: str, start_date: datetime, end_date: datetime, interval: str) -> pd.DataFrame:
+        """单个股票的历史数据（阻塞调用，在线程池中执行）"""
+        return self.yf.Ticker(symbol).history(start=start_date, end=end_date, interval=interval)
+    
     async def fetch_stock_data(
         self,
         symbol: str,
@@ -516,11 +637,8 @@ class YahooFinanceCollector:
             # 格式化股票代码
             formatted_symbol = self.format_symbol(symbol, market)
             
-            ticker = self.yf.Ticker(formatted_symbol)
-            df = ticker.history(
-                start=start_date,
-                end=end_date,
-                interval=interval
+            df = await blocking_executor.run(
+                'yfinance', self._history, formatted_symbol, start_date, end_date, interval
             )
             
             logger.info(f"Fetched {len(df)} rows for {formatted_symbol} ({market}) from Yahoo Finance")
@@ -530,30 +648,111 @@ class YahooFinanceCollector:
             logger.error(f"Failed to fetch stock data for {symbol}: {e}")
             return pd.DataFrame()
     
+    def _download(
+        self,
+        tickers: List[str],
+        start_date: datetime,
+        end_date: datetime,
+        interval: str
+    ) -> pd.DataFrame:
+        """一次请求多个股票（阻塞调用，在线程池中执行），返回按股票分组的宽表"""
+        return self.yf.download(
+            tickers,
+            start=start_date,
+            end=end_date,
+            interval=interval,
+            group_by='ticker',
+            auto_adjust=True,  # 与 Ticker.history 的默认口径一致
+            threads=True,
+            progress=False
+        )
+    
+    @staticmethod
+    def normalize_ohlcv(df: pd.DataFrame) -> pd.DataFrame:
+        """yfinance 数据转为与加密货币K线一致的列（timestamp, open, high, low, close, volume）"""
+        df = df.dropna(how='all')
+        if df.empty:
+            return pd.DataFrame(columns=OHLCV_COLUMNS)
+        df = df.reset_index()
+        df.columns = [str(column).lower() for column in df.columns]
+        df = df.rename(columns={'date': 'timestamp', 'datetime': 'timestamp'})
+        return df[OHLCV_COLUMNS].reset_index(drop=True)
+    
+    @staticmethod
+    def split_download(frame: pd.DataFrame, tickers: List[str]) -> Dict[str, pd.DataFrame]:
+        """将 group_by='ticker' 的宽表拆分为每个股票一个 DataFrame（无数据的股票不返回）"""
+        if frame is None or frame.empty:
+            return {}
+        
+        if not isinstance(frame.columns, pd.MultiIndex):
+            # 只请求一个股票时返回单层列
+            parts = {tickers[0]: frame} if len(tickers) == 1 else {}
+        else:
+            available = set(frame.columns.get_level_values(0))
+            parts = {ticker: frame[ticker] for ticker in tickers if ticker in available}
+        
+        result = {}
+        for ticker, part in parts.items():
+            df = YahooFinanceCollector.normalize_ohlcv(part)
+            if not df.empty:
+                result[ticker] = df
+        return result
+    
     async def fetch_multiple_stocks(
         self,
         symbols: List[str],
         start_date: datetime,
         end_date: datetime,
-        market: str = 'US'
+        market: str = 'US',
+        interval: str = '1d',
+        batch_size: Optional[int] = None
     ) -> Dict[str, pd.DataFrame]:
         """
         批量获取多个股票数据
         
+        每批股票合并为一次 yf.download 请求，各批并发执行（并发数受 yfinance 数据源上限控制），
+        返回的宽表按股票拆分，列统一为 timestamp, open, high, low, close, volume。
+        
         Args:
             symbols: 股票代码列表
             start_date: 开始日期
             end_date: 结束日期
             market: 市场代码
+            interval: 时间间隔
+            batch_size: 每批股票数（默认 settings.YFINANCE_BATCH_SIZE）
         
         Returns:
-            字典，key为股票代码，value为DataFrame
+            字典，key为股票代码，value为DataFrame（无数据或请求失败的股票不包含在内）
         """
+        if not self.yf or not symbols:
+            return {}
+        
+        started = time.perf_counter()
+        batch_size = batch_size or settings.YFINANCE_BATCH_SIZE
+        formatted = {self.format_symbol(symbol, market): symbol for symbol in symbols}
+        tickers = list(formatted)
+        batches = [tickers[i:i + batch_size] for i in range(0, len(tickers), batch_size)]
+        
+        async def fetch_batch(batch: List[str]) -> Dict[str, pd.DataFrame]:
+            try:
+                frame = await blocking_executor.run(
+                    'yfinance', self._download, batch, start_date, end_date, interval,
+                    timeout=settings.YFINANCE_BATCH_TIMEOUT
+                )
+                return self.split_download(frame, batch)
+            except Exception as e:
+                logger.error(f"Failed to fetch batch of {len(batch)} stocks ({batch[0]}...): {e}")
+                return {}
+        
         result = {}
-        for symbol in symbols:
-            df = await self.fetch_stock_data(symbol, start_date, end_date, market=market)
-            if not df.empty:
-                result[symbol] = df
+        for frames in await asyncio.gather(*(fetch_batch(batch) for batch in batches)):
+            for ticker, df in frames.items():
+                result[formatted[ticker]] = df
+        
+        logger.info(
+            f"Fetched {len(result)}/{len(symbols)} stocks ({market}) in {len(batches)} batches "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
         return result
     
     async def get_stock_info(self, symbol: str, market: str = 'US') -> Dict[str, Any]:
@@ -572,8 +771,7 @@ class YahooFinanceCollector:
         
         try:
             formatted_symbol = self.format_symbol(symbol, market)
-            ticker = self.yf.Ticker(formatted_symbol)
-            info = ticker.info
+            info = await blocking_executor.run('yfinance', lambda: self.yf.Ticker(formatted_symbol).info)
             
             return {
                 'symbol': formatted_symbol,
@@ -593,19 +791,24 @@ class TushareCollector:
     """Tushare数据采集器（A股）"""
     
     def __init__(self, token: str = None):
-        try:
-            import tushare as ts
-            self.ts = ts
-            if token:
-                ts.set_token(token)
-                self.pro = ts.pro_api()
-            else:
+        self.token = token
+        self._pro = None
+    
+    @property
+    def pro(self):
+        """Tushare Pro 接口（首次使用时导入并创建，未安装或没有 token 时为 None）"""
+        if self._pro is None:
+            self._pro = False
+            if not self.token:
                 logger.warning("Tushare token not provided")
-                self.pro = None
-        except ImportError:
-            logger.warning("tushare not installed. Run: pip install tushare")
-            self.ts = None
-            self.pro = None
+                return None
+            try:
+                import tushare as ts
+                ts.set_token(self.token)
+                self._pro = ts.pro_api()
+            except ImportError:
+                logger.warning("tushare not installed. Run: pip install tushare")
+        return self._pro or None
     
     async def fetch_stock_daily(
         self,
@@ -629,7 +832,8 @@ class TushareCollector:
             return pd.DataFrame()
         
         try:
-            df = self.pro.daily(
+            df = await blocking_executor.run(
+                'tushare', self.pro.daily,
                 ts_code=ts_code,
                 start_date=start_date,
                 end_date=end_date
@@ -309,6 +309,24 @@ GLOBAL_POPULAR_STOCKS = {
     },
 }
 
+
+def popular_stock_symbols(markets=None):
+    """
+    热门股票代码列表（组合回测的标的池）
+    
+    Args:
+        markets: 市场代码列表（如 ['JP', 'UK']），为空时返回所有市场
+    
+    Returns:
+        股票代码列表，按市场和列表顺序排列
+    """
+    codes = markets or list(GLOBAL_POPULAR_STOCKS)
+    unknown = [code for code in codes if code not in GLOBAL_POPULAR_STOCKS]
+    if unknown:
+        raise ValueError(f"Unknown markets: {', '.join(unknown)}")
+    return [symbol for code in codes for symbol in GLOBAL_POPULAR_STOCKS[code]['stocks']]
+
+
 # 按地区分组
 MARKETS_BY_REGION = {
     '亚洲': ['JP', 'KS', 'IN', 'TW', 'TH', 'MY', 'ID', 'PH', 'VN', 'HK', 'CN', 'SZ', 'SG'],
@@ -0,0 +1,242 @@
+"""
+K线区间缓存
+把K线按周期对齐的固定长度窗口切分，已收盘的K线打包为紧凑的二进制数组缓存在 Redis 中；
+请求时只有缓存水位之后的K线（通常只是仍在形成中的最后一根）从数据库读取，
+采集入库时按写入的时间范围使相关窗口失效
+"""
+import base64
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.redis import RedisClient, redis_client
+from app.services.resampler import BASE_INTERVAL, WEEK_OFFSET_MS, bucket_start, load_klines
+from app.services.kline_sync import interval_to_timedelta
+
+
+BAR_DTYPE = np.dtype([
+    ('timestamp', '<i8'),
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('volume', '<f8'),
+])
+
+KLINE_COLUMNS = list(BAR_DTYPE.names)
+
+
+def _to_ms(value: datetime) -> int:
+    return int(value.timestamp() * 1000)
+
+
+def frame_to_bars(df: pd.DataFrame) -> np.ndarray:
+    """K线 DataFrame 转为结构化数组（timestamp 为 UTC 毫秒）"""
+    bars = np.empty(len(df), dtype=BAR_DTYPE)
+    if len(df):
+        bars['timestamp'] = pd.DatetimeIndex(pd.to_datetime(df['timestamp'], utc=True)).as_unit('ms').asi8
+        for column in KLINE_COLUMNS[1:]:
+            bars[column] = df[column].to_numpy(dtype=np.float64)
+    return bars
+
+
+def bars_to_frame(bars: np.ndarray) -> pd.DataFrame:
+    """结构化数组转为K线 DataFrame（timestamp 为 UTC 时间）"""
+    return pd.DataFrame({
+        'timestamp': pd.to_datetime(bars['timestamp'], unit='ms', utc=True),
+        **{column: bars[column] for column in KLINE_COLUMNS[1:]},
+    })
+
+
+def pack_window(bars: np.ndarray, watermark: int) -> str:
+    """打包窗口：'水位|base64(结构化数组)'，水位之前的K线都已收盘并包含在数组中"""
+    return f"{watermark}|{base64.b64encode(bars.tobytes()).decode('ascii')}"
+
+
+def unpack_window(value: str) -> Tuple[np.ndarray, int]:
+    watermark, payload = value.split('|', 1)
+    return np.frombuffer(base64.b64decode(payload), dtype=BAR_DTYPE), int(watermark)
+
+
+class KlineCache:
+    """
+    K线区间缓存
+    
+    缓存键为 (交易所, 交易对, 周期, 窗口起点)，每个窗口固定 window_bars 根K线、按周期边界对齐，
+    不同请求区间落在相同窗口上时共享缓存。窗口中只保存已收盘的K线和水位（缓存时的收盘边界）：
+    - 完全收盘的窗口不再变化，直到入库路径因回填/修正使其失效；
+    - 包含当前K线的窗口在后续请求中只补读水位之后的K线，然后更新缓存。
+    只缓存 1m 与物化周期（KLINE_ROLLUP_INTERVALS），其他周期直接读取。
+    
+    Examples:
+        df = await kline_cache.get_klines(db, 'binance_public', 'BTC/USDT', '1h', limit=500)
+        await kline_cache.invalidate('binance_public', 'BTC/USDT', '1m', start, end)
+    """
+    
+    def __init__(
+        self,
+        redis: Optional[RedisClient] = None,
+        window_bars: Optional[int] = None,
+        ttl: Optional[int] = None
+    ):
+        self.redis = redis or redis_client
+        self.window_bars = window_bars or settings.KLINE_CACHE_WINDOW_BARS
+        self.ttl = ttl or settings.KLINE_CACHE_TTL
+    
+    @staticmethod
+    def cacheable(interval: str) -> bool:
+        return interval == BASE_INTERVAL or interval in settings.KLINE_ROLLUP_INTERVALS
+    
+    @staticmethod
+    def window_key(exchange: str, symbol: str, interval: str, window_start: int) -> str:
+        return f"kline:cache:{exchange}:{symbol}:{interval}:{window_start}"
+    
+    def _window_ms(self, interval: str) -> int:
+        return int(interval_to_timedelta(interval).total_seconds() * 1000) * self.window_bars
+    
+    def window_starts(self, interval: str, start_ms: int, end_ms: int) -> List[int]:
+        """与 [start_ms, end_ms] 相交的窗口起点"""
+        size = self._window_ms(interval)
+        offset = WEEK_OFFSET_MS if interval.endswith('w') else 0
+        first = (start_ms - offset) // size * size + offset
+        return list(range(first, end_ms + 1, size))
+    
+    async def _read_window(
+        self,
+        db: AsyncSession,
+        exchange: str,
+        symbol: str,
+        interval: str,
+        window_start: int,
+        closed_until: int
+    ) -> np.ndarray:
+        """读取一个窗口中 closed_until 之前的K线，缓存未命中或水位落后时补读数据库"""
+        key = self.window_key(exchange, symbol, interval, window_start)
+        window_end = min(window_start + self._window_ms(interval), closed_until)
+        
+        bars, watermark = np.empty(0, dtype=BAR_DTYPE), window_start
+        try:
+            cached = await self.redis.get(key)
+            if cached:
+                bars, watermark = unpack_window(cached)
+        except Exception as e:
+            logger.warning(f"Failed to read kline cache: {e}")
+        
+        if watermark >= window_end:
+            return bars
+        
+        fresh = frame_to_bars(await load_klines(
+            db, exchange, symbol, interval,
+            pd.Timestamp(watermark, unit='ms', tz='UTC').to_pydatetime(),
+            pd.Timestamp(window_end - 1, unit='ms', tz='UTC').to_pydatetime()
+        ))
+        fresh = fresh[(fresh['timestamp'] >= watermark) & (fresh['timestamp'] < window_end)]
+        bars = np.concatenate((bars, fresh)) if len(bars) else fresh
+        
+        try:
+            await self.redis.set(key, pack_window(bars, window_end), expire=self.ttl)
+        except Exception as e:
+            logger.warning(f"Failed to write kline cache: {e}")
+        return bars
+    
+    async def get_klines(
+        self,
+        db: AsyncSession,
+        exchange: str,
+        symbol: str,
+        interval: str,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        limit: Optional[int] = None
+    ) -> pd.DataFrame:
+        """
+        读取K线（已收盘部分走缓存，仍在形成的K线实时读取）
+        
+        Args:
+            db: 数据库会话
+            exchange: 交易所名称
+            symbol: 交易对
+            interval: 时间间隔
+            start_time: 开始时间
+            end_time: 结束时间
+            limit: 只返回最后 limit 条（未指定 start_time 时为最后 limit 条已入库的K线）
+        
+        Returns:
+            按时间升序的 DataFrame（timestamp, open, high, low, close, volume）
+        """
+        if not self.cacheable(interval) or (start_time is None and not limit):
+            return await load_klines(db, exchange, symbol, interval, start_time, end_time, limit=limit)
+        
+        now_ms = _to_ms(datetime.now().astimezone())
+        open_ms = int(bucket_start(np.int64(now_ms), interval))  # 当前K线的开盘时间
+        end_ms = min(_to_ms(end_time), now_ms) if end_time else now_ms
+        if start_time is not None:
+            start_ms = _to_ms(start_time)
+        else:
+            step = int(interval_to_timedelta(interval).total_seconds() * 1000)
+            start_ms = int(bucket_start(np.int64(end_ms), interval)) - (limit - 1) * step
+        
+        pieces = []
+        closed_end = min(end_ms, open_ms - 1)
+        if start_ms <= closed_end:
+            for window_start in self.window_starts(interval, start_ms, closed_end):
+                pieces.append(await self._read_window(db, exchange, symbol, interval, window_start, open_ms))
+        
+        if end_ms >= open_ms:
+            live = await load_klines(
+                db, exchange, symbol, interval,
+                pd.Timestamp(open_ms, unit='ms', tz='UTC').to_pydatetime(),
+                end_time
+            )
+            pieces.append(frame_to_bars(live))
+        
+        bars = np.concatenate(pieces) if pieces else np.empty(0, dtype=BAR_DTYPE)
+        bars = bars[(bars['timestamp'] >= start_ms) & (bars['timestamp'] <= end_ms)]
+        if limit:
+            bars = bars[-limit:]
+        if start_time is None and len(bars) < limit:
+            # 只按条数查询时，区间由当前时间倒推；序列停止更新或有空洞时不足 limit 条，
+            # 退回直接读取最后 limit 条已入库的K线
+            return await load_klines(db, exchange, symbol, interval, None, end_time, limit=limit)
+        return bars_to_frame(bars)
+    
+    async def invalidate(
+        self,
+        exchange: str,
+        symbol: str,
+        interval: str,
+        start: datetime,
+        end: datetime,
+        redis: Optional[RedisClient] = None
+    ):
+        """
+        入库后使相关窗口失效
+        
+        1m K线同时影响由它聚合的所有物化周期。
+        
+        Args:
+            redis: 使用的 Redis 客户端（默认全局客户端）；Celery 任务每次运行一个新的事件循环，
+                需要传入本次任务创建的客户端，全局客户端的连接属于之前的事件循环
+        """
+        intervals = [interval]
+        if interval == BASE_INTERVAL:
+            intervals += settings.KLINE_ROLLUP_INTERVALS
+        start_ms, end_ms = _to_ms(start), _to_ms(end)
+        keys = [
+            self.window_key(exchange, symbol, iv, window_start)
+            for iv in intervals if self.cacheable(iv)
+            for window_start in self.window_starts(iv, start_ms, end_ms)
+        ]
+        try:
+            await (redis or self.redis).delete(*keys)
+        except Exception as e:
+            logger.warning(f"Failed to invalidate kline cache: {e}")
+
+
+# 全局K线缓存实例
+kline_cache = KlineCache()
@@ -0,0 +1,250 @@
+"""
+K线表分区维护
+klines 按周期 LIST 分区（klines_1m, klines_1h, ...，其他周期进入 klines_other），
+每个周期再按时间 RANGE 分区（高频周期按月、低频周期按年），另有一个默认分区接收尚未建分区的时段。
+维护任务负责提前创建未来的分区、把默认分区中的数据迁入对应的时间分区，并按周期执行保留策略
+"""
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, Optional
+
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.core.config import settings
+from app.models.market import Kline
+
+
+TABLE = Kline.__tablename__
+
+# 独立分区的周期及其时间分区粒度；其余周期写入 klines_other
+PARTITION_PERIODS = {
+    '1m': 'month',
+    '5m': 'month',
+    '15m': 'year',
+    '30m': 'year',
+    '1h': 'year',
+    '4h': 'year',
+    '1d': 'year',
+    '1w': 'year',
+}
+
+# 维护任务的事务级咨询锁，多个进程同时执行时串行化
+MAINTENANCE_LOCK = 'klines_partition_maintenance'
+
+PARTITION_SUFFIX = re.compile(r'_p(\d{4})(\d{2})?$')
+
+
+def period_start(moment: datetime, period: str) -> datetime:
+    """moment 所在分区的起始时间（UTC）"""
+    if period == 'month':
+        return datetime(moment.year, moment.month, 1, tzinfo=timezone.utc)
+    return datetime(moment.year, 1, 1, tzinfo=timezone.utc)
+
+
+def next_period(start: datetime, period: str) -> datetime:
+    if period == 'month':
+        return start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+    return start.replace(year=start.year + 1)
+
+
+def interval_table(interval: str) -> str:
+    return f"{TABLE}_{interval}"
+
+
+def partition_name(interval: str, start: datetime, period: str) -> str:
+    """时间分区表名：klines_1m_p202401（按月）、klines_1h_p2024（按年）"""
+    suffix = f"{start.year:04d}{start.month:02d}" if period == 'month' else f"{start.year:04d}"
+    return f"{interval_table(interval)}_p{suffix}"
+
+
+def partition_end(name: str, period: str) -> Optional[datetime]:
+    """由分区表名解析分区的结束时间（不含）"""
+    match = PARTITION_SUFFIX.search(name)
+    if not match:
+        return None
+    start = datetime(int(match.group(1)), int(match.group(2) or 1), 1, tzinfo=timezone.utc)
+    return next_period(start, period)
+
+
+def _bound(moment: datetime) -> str:
+    return moment.strftime('%Y-%m-%d %H:%M:%S+00')
+
+
+async def _relkind(conn: AsyncConnection, name: str) -> Optional[str]:
+    result = await conn.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:name)"), {'name': name}
+    )
+    return result.scalar()
+
+
+async def _partitions(conn: AsyncConnection) -> List[str]:
+    """klines 分区树中的所有表名"""
+    result = await conn.execute(text(
+        "SELECT relid::regclass::text FROM pg_partition_tree(:root) WHERE relid::regclass::text <> :root"
+    ), {'root': TABLE})
+    return [row[0] for row in result.all()]
+
+
+async def _create_partition(
+    conn: AsyncConnection,
+    interval: str,
+    start: datetime,
+    period: str
+) -> str:
+    """
+    创建一个时间分区
+    
+    若该时段已有数据落在默认分区中，先建同结构的表、把这些行迁入，再 ATTACH 到周期分区，
+    否则直接 CREATE TABLE ... PARTITION OF。
+    """
+    parent = interval_table(interval)
+    default = f"{parent}_default"
+    name = partition_name(interval, start, period)
+    end = next_period(start, period)
+    lo, hi = _bound(start), _bound(end)
+    
+    has_rows = await conn.execute(text(
+        f"SELECT EXISTS (SELECT 1 FROM {default} WHERE timestamp >= :start AND timestamp < :end)"
+    ), {'start': start, 'end': end})
+    if has_rows.scalar():
+        await conn.execute(text(f"CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+        await conn.execute(text(
+            f"WITH moved AS (DELETE FROM {default} WHERE timestamp >= :start AND timestamp < :end RETURNING *) "
+            f"INSERT INTO {name} SELECT * FROM moved"
+        ), {'start': start, 'end': end})
+        await conn.execute(text(f"ALTER TABLE {parent} ATTACH PARTITION {name} FOR VALUES FROM ('{lo}') TO ('{hi}')"))
+    else:
+        await conn.execute(text(f"CREATE TABLE {name} PARTITION OF {parent} FOR VALUES FROM ('{lo}') TO ('{hi}')"))
+    return name
+
+
+async def ensure_partitions(
+    conn: AsyncConnection,
+    now: Optional[datetime] = None,
+    ahead: Optional[int] = None
+) -> List[str]:
+    """
+    创建缺失的分区
+    
+    每个周期：周期分区及其默认分区；从当前到未来 ahead 个时段的时间分区；
+    默认分区中已有数据（例如历史回填）所在时段的时间分区（数据随之迁入）。
+    
+    Args:
+        conn: 数据库连接（在事务中）
+        now: 当前时间
+        ahead: 提前创建的时段数（默认 settings.KLINE_PARTITION_PREMAKE）
+    
+    Returns:
+        新建的表名
+    """
+    if await _relkind(conn, TABLE) != 'p':
+        logger.warning(f"Table {TABLE} is not partitioned, run database/migrations/001_partition_klines.sql")
+        return []
+    
+    now = now or datetime.now(timezone.utc)
+    ahead = settings.KLINE_PARTITION_PREMAKE if ahead is None else ahead
+    existing = set(await _partitions(conn))
+    created = []
+    
+    for interval, period in PARTITION_PERIODS.items():
+        parent = interval_table(interval)
+        default = f"{parent}_default"
+        if parent not in existing:
+            await conn.execute(text(
+                f"CREATE TABLE {parent} PARTITION OF {TABLE} FOR VALUES IN ('{interval}') PARTITION BY RANGE (timestamp)"
+            ))
+            await conn.execute(text(f"CREATE TABLE {default} PARTITION OF {parent} DEFAULT"))
+            created += [parent, default]
+        
+        starts = []
+        start = period_start(now, period)
+        for _ in range(ahead + 1):
+            starts.append(start)
+            start = next_period(start, period)
+        
+        span = (await conn.execute(text(f"SELECT min(timestamp), max(timestamp) FROM {default}"))).one()
+        if span[0] is not None:
+            first, last = (value if value.tzinfo else value.replace(tzinfo=timezone.utc) for value in span)
+            start = period_start(first, period)
+            while start <= last:
+                starts.append(start)
+                start = next_period(start, period)
+        
+        for start in sorted(set(starts)):
+            if partition_name(interval, start, period) not in existing:
+                created.append(await _create_partition(conn, interval, start, period))
+    
+    other = f"{TABLE}_other"
+    if other not in existing:
+        await conn.execute(text(f"CREATE TABLE {other} PARTITION OF {TABLE} DEFAULT"))
+        created.append(other)
+    
+    if created:
+        logger.info(f"Created kline partitions: {', '.join(created)}")
+    return created
+
+
+async def apply_retention(conn: AsyncConnection, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    执行保留策略（settings.KLINE_RETENTION_DAYS，未配置的周期永久保留）
+    
+    整个时段都已过期的时间分区直接 DROP（不产生死元组，无需 VACUUM）；
+    默认分区和 klines_other 中的过期行按时间删除。
+    
+    Returns:
+        {"dropped": 删除的分区表名, "deleted": 删除的行数}
+    """
+    now = now or datetime.now(timezone.utc)
+    existing = await _partitions(conn)
+    dropped, deleted = [], 0
+    
+    for interval, days in settings.KLINE_RETENTION_DAYS.items():
+        cutoff = now - timedelta(days=days)
+        period = PARTITION_PERIODS.get(interval)
+        if period is None:
+            result = await conn.execute(text(
+                f"DELETE FROM {TABLE}_other WHERE interval = :interval AND timestamp < :cutoff"
+            ), {'interval': interval, 'cutoff': cutoff})
+            deleted += max(result.rowcount, 0)
+            continue
+        
+        prefix = f"{interval_table(interval)}_p"
+        for name in existing:
+            if not name.startswith(prefix):
+                continue
+            end = partition_end(name, period)
+            if end is not None and end <= cutoff:
+                await conn.execute(text(f"DROP TABLE {name}"))
+                dropped.append(name)
+        
+        result = await conn.execute(text(
+            f"DELETE FROM {interval_table(interval)}_default WHERE timestamp < :cutoff"
+        ), {'cutoff': cutoff})
+        deleted += max(result.rowcount, 0)
+    
+    if dropped or deleted:
+        logger.info(f"Kline retention: dropped {len(dropped)} partitions, deleted {deleted} rows")
+    return {'dropped': dropped, 'deleted': deleted}
+
+
+async def maintain_partitions(conn: AsyncConnection, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    分区维护：先执行保留策略，再创建缺失的分区（启动时和每日定时任务调用）
+    
+    Args:
+        conn: 数据库连接（在事务中，例如 engine.begin()）
+        now: 当前时间
+    
+    Returns:
+        {"created": [...], "dropped": [...], "deleted": n}
+    """
+    if await _relkind(conn, TABLE) != 'p':
+        logger.warning(f"Table {TABLE} is not partitioned, skipping partition maintenance")
+        return {'created': [], 'dropped': [], 'deleted': 0}
+    
+    await conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:key))"), {'key': MAINTENANCE_LOCK})
+    retention = await apply_retention(conn, now)
+    created = await ensure_partitions(conn, now)
+    return {'created': created, **retention}
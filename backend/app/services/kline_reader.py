@@ -0,0 +1,248 @@
+"""
+K线快速读取
+只读场景（行情接口、回测加载）不构造 ORM 对象或 Row 元组：通过 asyncpg 以 COPY 二进制格式
+取回 OHLCV 六列，直接按固定行布局解析为 NumPy 数组
+"""
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, table, column
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.market import Kline
+
+
+OHLCV_COLUMNS = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+
+# COPY 二进制格式：11 字节签名 + 4 字节标志 + 4 字节扩展区长度（后跟扩展区），末尾 2 字节 -1
+COPY_SIGNATURE = b'PGCOPY\n\xff\r\n\x00'
+COPY_TRAILER_SIZE = 2
+
+# 每行：字段数(int16)，每个字段长度(int32) + 值（timestamptz 为 2000-01-01 起的微秒 int64，其余为 float8），大端序
+ROW_DTYPE = np.dtype(
+    [('fields', '>i2'), ('timestamp_len', '>i4'), ('timestamp', '>i8')]
+    + [field for name in OHLCV_COLUMNS[1:] for field in ((f'{name}_len', '>i4'), (name, '>f8'))]
+)
+
+# 多标的读取时每行前面多一个标的序号（int4，标的在请求列表中的位置）
+MULTI_ROW_DTYPE = np.dtype(
+    [('fields', '>i2'), ('symbol_index_len', '>i4'), ('symbol_index', '>i4')] + ROW_DTYPE.descr[1:]
+)
+
+PG_EPOCH_MS = 946684800000  # 2000-01-01 00:00:00 UTC
+
+
+def parse_copy_binary(payload: bytes, row_dtype: np.dtype = ROW_DTYPE) -> Dict[str, np.ndarray]:
+    """
+    解析 COPY ... (FORMAT binary) 的输出
+    
+    Args:
+        payload: COPY 输出
+        row_dtype: 行布局（ROW_DTYPE 或 MULTI_ROW_DTYPE）
+    
+    Returns:
+        {'timestamp': 毫秒 int64, 'open'...'volume': float64}，MULTI_ROW_DTYPE 另有 'symbol_index': int64
+    """
+    if not payload.startswith(COPY_SIGNATURE):
+        raise ValueError("Invalid COPY binary header")
+    extension = int.from_bytes(payload[15:19], 'big')
+    offset = 19 + extension
+    body = len(payload) - offset - COPY_TRAILER_SIZE
+    if body < 0 or body % row_dtype.itemsize:
+        raise ValueError(f"Unexpected COPY binary payload size: {len(payload)}")
+    
+    rows = np.frombuffer(payload, dtype=row_dtype, count=body // row_dtype.itemsize, offset=offset)
+    field_count = sum(1 for name in row_dtype.names if name.endswith('_len'))
+    if len(rows) and (rows['fields'] != field_count).any():
+        raise ValueError("Unexpected field count in COPY binary payload")
+    
+    arrays = {'timestamp': rows['timestamp'].astype(np.int64) // 1000 + PG_EPOCH_MS}
+    if 'symbol_index' in row_dtype.names:
+        arrays['symbol_index'] = rows['symbol_index'].astype(np.int64)
+    for name in OHLCV_COLUMNS[1:]:
+        arrays[name] = rows[name].astype(np.float64)
+    return arrays
+
+
+def arrays_to_frame(arrays: Dict[str, np.ndarray]) -> pd.DataFrame:
+    """OHLCV 数组转为 DataFrame（timestamp 为 UTC 时间）"""
+    return pd.DataFrame({
+        'timestamp': pd.to_datetime(arrays['timestamp'], unit='ms', utc=True),
+        **{name: arrays[name] for name in OHLCV_COLUMNS[1:]},
+    })
+
+
+def _build_query(
+    table_name: str,
+    start_time: Optional[datetime],
+    end_time: Optional[datetime],
+    limit: Optional[int]
+) -> str:
+    conditions = ['exchange = $1', 'symbol = $2', 'interval = $3']
+    if start_time:
+        conditions.append(f'timestamp >= ${len(conditions) + 1}')
+    if end_time:
+        conditions.append(f'timestamp <= ${len(conditions) + 1}')
+    query = (
+        f"SELECT timestamp, open::float8, high::float8, low::float8, close::float8, volume::float8 "
+        f"FROM {table_name} WHERE {' AND '.join(conditions)}"
+    )
+    if limit:
+        return f"SELECT * FROM ({query} ORDER BY timestamp DESC LIMIT {int(limit)}) AS t ORDER BY timestamp"
+    return f"{query} ORDER BY timestamp"
+
+
+async def fetch_kline_arrays(
+    db: AsyncSession,
+    exchange: str,
+    symbol: str,
+    interval: str,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    limit: Optional[int] = None,
+    table_name: str = Kline.__tablename__
+) -> Dict[str, np.ndarray]:
+    """
+    读取K线为列数组
+    
+    asyncpg 连接上用 COPY 二进制格式一次取回结果并整体解析；其他驱动退回 Core 列查询。
+    
+    Args:
+        db: 数据库会话
+        exchange: 交易所名称
+        symbol: 交易对
+        interval: 时间间隔
+        start_time: 开始时间（含）
+        end_time: 结束时间（含）
+        limit: 只返回最后 limit 条
+        table_name: 表名（klines 或 kline_rollups，两者的 OHLCV 列相同）
+    
+    Returns:
+        按时间升序的 {'timestamp': 毫秒 int64, 'open'...'volume': float64}
+    """
+    conn = await db.connection()
+    if conn.dialect.driver != 'asyncpg':
+        return await _fetch_core(db, exchange, symbol, interval, start_time, end_time, limit, table_name)
+    
+    args = [exchange, symbol, interval] + [value for value in (start_time, end_time) if value]
+    chunks: List[bytes] = []
+    
+    async def collect(chunk: bytes):
+        chunks.append(bytes(chunk))
+    
+    raw = await conn.get_raw_connection()
+    await raw.driver_connection.copy_from_query(
+        _build_query(table_name, start_time, end_time, limit), *args, output=collect, format='binary'
+    )
+    return parse_copy_binary(b''.join(chunks))
+
+
+async def _fetch_core(
+    db: AsyncSession,
+    exchange: str,
+    symbol: str,
+    interval: str,
+    start_time: Optional[datetime],
+    end_time: Optional[datetime],
+    limit: Optional[int],
+    table_name: str
+) -> Dict[str, np.ndarray]:
+    klines = table(table_name, *(column(name) for name in ('exchange', 'symbol', 'interval', *OHLCV_COLUMNS)))
+    query = select(*(klines.c[name] for name in OHLCV_COLUMNS)).where(
+        klines.c.exchange == exchange,
+        klines.c.symbol == symbol,
+        klines.c.interval == interval
+    )
+    if start_time:
+        query = query.where(klines.c.timestamp >= start_time)
+    if end_time:
+        query = query.where(klines.c.timestamp <= end_time)
+    if limit:
+        query = query.order_by(klines.c.timestamp.desc()).limit(limit)
+    else:
+        query = query.order_by(klines.c.timestamp)
+    
+    rows = (await db.execute(query)).all()
+    if limit:
+        rows = rows[::-1]
+    timestamps = pd.DatetimeIndex(pd.to_datetime([row[0] for row in rows], utc=True)).as_unit('ms').asi8
+    arrays = {'timestamp': timestamps.astype(np.int64, copy=False)}
+    for index, name in enumerate(OHLCV_COLUMNS[1:], start=1):
+        arrays[name] = np.fromiter((row[index] for row in rows), np.float64, len(rows))
+    return arrays
+
+
+async def fetch_multi_kline_arrays(
+    db: AsyncSession,
+    exchange: str,
+    symbols: List[str],
+    interval: str,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None
+) -> Dict[str, Dict[str, np.ndarray]]:
+    """
+    一次查询读取多个标的的K线
+    
+    asyncpg 连接上用 symbol = ANY(...) 一条 COPY 二进制查询取回全部标的（每行带标的序号），
+    按 (symbol, timestamp) 排序后切分；其他驱动退回逐个标的的 Core 列查询。
+    
+    Args:
+        db: 数据库会话
+        exchange: 交易所名称
+        symbols: 标的列表
+        interval: 时间间隔
+        start_time: 开始时间（含）
+        end_time: 结束时间（含）
+    
+    Returns:
+        {symbol: 按时间升序的列数组}，没有K线的标的不包含在内
+    """
+    symbols = list(dict.fromkeys(symbols))
+    if not symbols:
+        return {}
+    conn = await db.connection()
+    if conn.dialect.driver != 'asyncpg':
+        result = {}
+        for symbol in symbols:
+            arrays = await _fetch_core(
+                db, exchange, symbol, interval, start_time, end_time, None, Kline.__tablename__
+            )
+            if len(arrays['timestamp']):
+                result[symbol] = arrays
+        return result
+    
+    conditions = ['exchange = $1', 'symbol = ANY($2::text[])', 'interval = $3']
+    args = [exchange, symbols, interval]
+    for operator, value in (('>=', start_time), ('<=', end_time)):
+        if value:
+            args.append(value)
+            conditions.append(f'timestamp {operator} ${len(args)}')
+    query = (
+        f"SELECT array_position($2::text[], symbol)::int4, timestamp, open::float8, high::float8, "
+        f"low::float8, close::float8, volume::float8 "
+        f"FROM {Kline.__tablename__} WHERE {' AND '.join(conditions)} ORDER BY symbol, timestamp"
+    )
+    chunks: List[bytes] = []
+    
+    async def collect(chunk: bytes):
+        chunks.append(bytes(chunk))
+    
+    raw = await conn.get_raw_connection()
+    await raw.driver_connection.copy_from_query(query, *args, output=collect, format='binary')
+    arrays = parse_copy_binary(b''.join(chunks), MULTI_ROW_DTYPE)
+    return split_by_symbol(arrays, symbols)
+
+
+def split_by_symbol(arrays: Dict[str, np.ndarray], symbols: List[str]) -> Dict[str, Dict[str, np.ndarray]]:
+    """按 symbol_index（1 起，同一标的的行连续）切分多标的列数组，切片不复制数据"""
+    positions = arrays['symbol_index']
+    bounds = np.flatnonzero(np.diff(positions)) + 1
+    result = {}
+    for lo, hi in zip(np.concatenate(([0], bounds)), np.concatenate((bounds, [len(positions)]))):
+        if hi > lo:
+            result[symbols[positions[lo] - 1]] = {
+                name: values[lo:hi] for name, values in arrays.items() if name != 'symbol_index'
+            }
+    return result
@@ -0,0 +1,339 @@
+"""
+本地K线列式存储
+按 交易所/交易对/周期/月份 分区保存为未压缩的 Arrow IPC 文件，
+读取时内存映射、按列零拷贝访问，时间范围条件先裁剪分区、再在有序时间列上二分截取
+"""
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from dateutil import tz
+from loguru import logger
+
+from app.core.config import settings
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+
+PRICE_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+# 分区文件元数据中记录已与数据库核对过的时间范围（毫秒，闭区间）的键
+COVERAGE_KEY = b'covered'
+
+
+def _to_ms(value: Any) -> int:
+    """datetime / pd.Timestamp 转为毫秒时间戳（无时区的时间按本地时间处理，与采集器一致）"""
+    if isinstance(value, pd.Timestamp):
+        value = value.to_pydatetime()
+    return int(value.timestamp() * 1000)
+
+
+def _month_start(ms: int) -> Tuple[int, int]:
+    moment = pd.Timestamp(ms, unit='ms', tz='UTC')
+    return moment.year, moment.month
+
+
+def _month_bounds(year: int, month: int) -> Tuple[int, int]:
+    """UTC 月份的毫秒范围（闭区间）"""
+    start = pd.Timestamp(year=year, month=month, day=1, tz='UTC')
+    end = start + pd.offsets.MonthBegin(1)
+    return int(start.value // 10 ** 6), int(end.value // 10 ** 6) - 1
+
+
+def _merge_ranges(ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """合并重叠或相邻的闭区间"""
+    merged: List[Tuple[int, int]] = []
+    for lo, hi in sorted(ranges):
+        if merged and lo <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], hi))
+        else:
+            merged.append((lo, hi))
+    return merged
+
+
+def _months(start_ms: int, end_ms: int) -> List[Tuple[int, int]]:
+    """[start_ms, end_ms] 覆盖的 UTC 月份"""
+    year, month = _month_start(start_ms)
+    last = _month_start(end_ms)
+    months = []
+    while (year, month) <= last:
+        months.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+class KlineStore:
+    """
+    K线列式存储
+    
+    目录结构：{root}/{exchange}/{symbol}/{interval}/{YYYY-MM}.arrow，交易对中的 "/" 替换为 "-"。
+    每个分区文件按时间升序、时间戳唯一；写入时与已有分区合并去重后整体替换（先写临时文件再 rename），
+    正在读取旧文件的内存映射不受影响。
+    
+    分区元数据记录已覆盖的时间范围：这些范围内数据库中的每根K线都在分区中（从数据库读取的区间、
+    交易所返回的连续K线区间），范围内没有K线的时段即真实缺口；covers() 据此判断本地数据是否完整。
+    
+    Examples:
+        kline_store.write('binance_public', 'BTC/USDT', '1m', klines)
+        df = kline_store.read('binance_public', 'BTC/USDT', '1m', start, end)
+    """
+    
+    def __init__(self, root: str = None, enabled: bool = True):
+        self.root = root or settings.KLINE_STORE_PATH
+        self.enabled = enabled and pa is not None
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        if enabled and pa is None:
+            logger.warning("pyarrow not installed, local kline store disabled. Run: pip install pyarrow")
+    
+    @staticmethod
+    def _schema() -> 'pa.Schema':
+        return pa.schema(
+            [('timestamp', pa.timestamp('ms', tz='UTC'))] + [(column, pa.float64()) for column in PRICE_COLUMNS]
+        )
+    
+    def partition_dir(self, exchange: str, symbol: str, interval: str) -> str:
+        return os.path.join(self.root, exchange, symbol.replace('/', '-'), interval)
+    
+    def partition_path(self, exchange: str, symbol: str, interval: str, year: int, month: int) -> str:
+        return os.path.join(self.partition_dir(exchange, symbol, interval), f"{year:04d}-{month:02d}.arrow")
+    
+    def _lock(self, path: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(path, threading.Lock())
+    
+    @staticmethod
+    def _open(path: str) -> Optional['pa.Table']:
+        """内存映射打开分区文件（表中的列直接引用映射的内存，不复制）"""
+        if not os.path.exists(path):
+            return None
+        return pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+    
+    @staticmethod
+    def _timestamps(table: 'pa.Table') -> np.ndarray:
+        """时间列的毫秒 int64 视图"""
+        column = table.column('timestamp')
+        if column.num_chunks == 1:
+            return column.chunk(0).to_numpy(zero_copy_only=False).view(np.int64)
+        return column.to_numpy().view(np.int64)
+    
+    @staticmethod
+    def _coverage(table: 'pa.Table') -> List[Tuple[int, int]]:
+        """分区元数据中的已覆盖范围"""
+        raw = (table.schema.metadata or {}).get(COVERAGE_KEY)
+        return [tuple(item) for item in json.loads(raw)] if raw else []
+    
+    def write(
+        self,
+        exchange: str,
+        symbol: str,
+        interval: str,
+        klines: List[Dict[str, Any]],
+        complete: bool = False
+    ) -> int:
+        """
+        写入K线（阻塞调用）
+        
+        Args:
+            exchange: 交易所名称
+            symbol: 交易对
+            interval: 时间间隔
+            klines: K线字典列表（timestamp, open, high, low, close, volume）
+            complete: klines 是否为交易所返回的连续区间（首尾之间的K线没有遗漏），是则记为已覆盖
+        
+        Returns:
+            新增条数（已存在的时间戳保留原值，与数据库的 ON CONFLICT DO NOTHING 一致）
+        """
+        if not self.enabled or not klines:
+            return 0
+        arrays = {'timestamp': np.fromiter((_to_ms(k['timestamp']) for k in klines), np.int64, len(klines))}
+        for column in PRICE_COLUMNS:
+            arrays[column] = np.fromiter((float(k[column]) for k in klines), np.float64, len(klines))
+        covered = (int(arrays['timestamp'].min()), int(arrays['timestamp'].max())) if complete else None
+        return self.write_arrays(exchange, symbol, interval, arrays, covered)
+    
+    def write_frame(self, exchange: str, symbol: str, interval: str, df: pd.DataFrame) -> int:
+        """写入 DataFrame（timestamp, open, high, low, close, volume），见 write"""
+        if not self.enabled or df.empty:
+            return 0
+        timestamps = pd.to_datetime(df['timestamp'])
+        if timestamps.dt.tz is None:
+            timestamps = timestamps.dt.tz_localize(tz.tzlocal())
+        arrays = {'timestamp': pd.DatetimeIndex(timestamps).as_unit('ms').asi8.astype(np.int64, copy=False)}
+        for column in PRICE_COLUMNS:
+            arrays[column] = df[column].to_numpy(dtype=np.float64)
+        return self.write_arrays(exchange, symbol, interval, arrays)
+    
+    def write_arrays(
+        self,
+        exchange: str,
+        symbol: str,
+        interval: str,
+        arrays: Dict[str, np.ndarray],
+        covered: Optional[Tuple[int, int]] = None
+    ) -> int:
+        """
+        按月拆分后逐个分区合并写入；arrays 的 timestamp 为毫秒 int64
+        
+        covered 为已与数据库核对的时间范围（毫秒，闭区间），如从数据库读取 arrays 时的查询范围；
+        范围内没有数据的月份也会写入空分区以记录覆盖范围。
+        """
+        # 1970-01 起的月份序号
+        months = arrays['timestamp'].astype('datetime64[ms]').astype('datetime64[M]').astype(np.int64)
+        targets = {(1970 + year, index + 1) for year, index in (divmod(int(month), 12) for month in np.unique(months))}
+        if covered:
+            targets.update(_months(*covered))
+        added = 0
+        for year, month in sorted(targets):
+            mask = months == (year - 1970) * 12 + month - 1
+            month_range = None
+            if covered:
+                lo, hi = _month_bounds(year, month)
+                if covered[0] <= hi and covered[1] >= lo:
+                    month_range = (max(covered[0], lo), min(covered[1], hi))
+            path = self.partition_path(exchange, symbol, interval, year, month)
+            added += self._merge(path, {name: values[mask] for name, values in arrays.items()}, month_range)
+        return added
+    
+    def _merge(self, path: str, arrays: Dict[str, np.ndarray], covered: Optional[Tuple[int, int]] = None) -> int:
+        with self._lock(path):
+            existing = self._open(path)
+            coverage = self._coverage(existing) if existing is not None else []
+            if existing is not None:
+                old = {'timestamp': self._timestamps(existing)}
+                for column in PRICE_COLUMNS:
+                    old[column] = existing.column(column).to_numpy()
+                arrays = {name: np.concatenate((old[name], arrays[name])) for name in arrays}
+            merged_coverage = _merge_ranges(coverage + [covered]) if covered else coverage
+            
+            # 去重保留首次出现（已有数据在前），np.unique 同时完成排序
+            _, first = np.unique(arrays['timestamp'], return_index=True)
+            added = len(first) - (existing.num_rows if existing is not None else 0)
+            if added == 0 and merged_coverage == coverage:
+                return 0
+            
+            schema = self._schema()
+            if merged_coverage:
+                schema = schema.with_metadata({COVERAGE_KEY: json.dumps(merged_coverage).encode()})
+            table = pa.table(
+                [pa.array(arrays['timestamp'][first], type=pa.int64()).cast(schema.field('timestamp').type)]
+                + [pa.array(arrays[column][first]) for column in PRICE_COLUMNS],
+                schema=schema
+            )
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with pa.OSFile(tmp_path, 'wb') as sink:
+                with pa.ipc.new_file(sink, schema) as writer:
+                    writer.write_table(table)
+            os.replace(tmp_path, path)
+            return added
+    
+    def read_table(
+        self,
+        exchange: str,
+        symbol: str,
+        interval: str,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None
+    ) -> Optional['pa.Table']:
+        """
+        读取K线为 Arrow 表（零拷贝，列引用内存映射的文件）
+        
+        只打开时间范围覆盖的月份分区，在每个分区的时间列上二分查找截取，
+        不读取范围外的数据页。
+        
+        Returns:
+            按时间升序的 pa.Table；无数据时返回 None
+        """
+        if not self.enabled:
+            return None
+        
+        if start_time is None or end_time is None:
+            # 未指定边界时按目录中的分区确定
+            directory = self.partition_dir(exchange, symbol, interval)
+            if not os.path.isdir(directory):
+                return None
+            names = sorted(name for name in os.listdir(directory) if name.endswith('.arrow'))
+            if not names:
+                return None
+            first = pd.Timestamp(names[0][:-len('.arrow')] + '-01', tz='UTC')
+            last = pd.Timestamp(names[-1][:-len('.arrow')] + '-01', tz='UTC') + pd.offsets.MonthEnd(1)
+        
+        start_ms = _to_ms(start_time) if start_time is not None else int(first.value // 10 ** 6)
+        end_ms = _to_ms(end_time) if end_time is not None else int(last.value // 10 ** 6) + 86400000 - 1
+        if start_ms > end_ms:
+            return None
+        
+        pieces = []
+        for year, month in _months(start_ms, end_ms):
+            table = self._open(self.partition_path(exchange, symbol, interval, year, month))
+            if table is None:
+                continue
+            timestamps = self._timestamps(table)
+            lo = int(np.searchsorted(timestamps, start_ms, side='left'))
+            hi = int(np.searchsorted(timestamps, end_ms, side='right'))
+            if hi > lo:
+                pieces.append(table.slice(lo, hi - lo))
+        
+        if not pieces:
+            return None
+        return pa.concat_tables(pieces)
+    
+    def covers(self, exchange: str, symbol: str, interval: str, start_ms: int, end_ms: int) -> bool:
+        """[start_ms, end_ms] 是否都在分区记录的已覆盖范围内（本地数据与数据库一致）"""
+        if not self.enabled or start_ms > end_ms:
+            return self.enabled
+        for year, month in _months(start_ms, end_ms):
+            table = self._open(self.partition_path(exchange, symbol, interval, year, month))
+            if table is None:
+                return False
+            lo, hi = _month_bounds(year, month)
+            need_lo, need_hi = max(start_ms, lo), min(end_ms, hi)
+            if not any(a <= need_lo and need_hi <= b for a, b in self._coverage(table)):
+                return False
+        return True
+    
+    def read(
+        self,
+        exchange: str,
+        symbol: str,
+        interval: str,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        limit: Optional[int] = None
+    ) -> pd.DataFrame:
+        """
+        读取K线为 DataFrame
+        
+        Args:
+            exchange: 交易所名称
+            symbol: 交易对
+            interval: 时间间隔
+            start_time: 开始时间（含）
+            end_time: 结束时间（含）
+            limit: 只返回最后 limit 条
+        
+        Returns:
+            按时间升序的 DataFrame（timestamp 为 UTC 时间, open, high, low, close, volume）
+        """
+        try:
+            table = self.read_table(exchange, symbol, interval, start_time, end_time)
+        except Exception as e:
+            logger.error(f"Failed to read klines from local store: {e}")
+            return pd.DataFrame(columns=['timestamp', *PRICE_COLUMNS])
+        if table is None:
+            return pd.DataFrame(columns=['timestamp', *PRICE_COLUMNS])
+        if limit and table.num_rows > limit:
+            table = table.slice(table.num_rows - limit)
+        return table.to_pandas()
+
+
+# 全局K线存储实例
+kline_store = KlineStore(enabled=settings.KLINE_STORE_ENABLED)
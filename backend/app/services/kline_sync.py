@@ -0,0 +1,276 @@
+"""
+增量K线同步
+按 (交易所, 交易对, 周期) 记录已确认完整的时间段（覆盖图，保存在 Redis），
+同步时只在未覆盖的区间内查找数据库缺口，只抓取缺失的K线
+"""
+import json
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import select, func, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.redis import RedisClient, redis_client
+from app.models.market import Kline
+from app.services.backfill import BackfillJob, BackfillOrchestrator
+from app.services.data_collector import data_collector
+
+
+# 覆盖图在 Redis 中的保留时间（秒）
+COVERAGE_TTL = 30 * 86400
+
+INTERVAL_UNITS = {
+    's': 1,
+    'm': 60,
+    'h': 3600,
+    'd': 86400,
+    'w': 604800,
+}
+
+
+def interval_to_timedelta(interval: str) -> timedelta:
+    """K线周期转为时间长度（1m, 15m, 1h, 4h, 1d, 1w）"""
+    match = re.fullmatch(r'(\d+)([smhdw])', interval)
+    if not match:
+        raise ValueError(f"Unsupported interval: {interval}")
+    return timedelta(seconds=int(match.group(1)) * INTERVAL_UNITS[match.group(2)])
+
+
+def _to_ms(value: datetime) -> int:
+    return int(value.timestamp() * 1000)
+
+
+def _from_ms(value: int) -> datetime:
+    return datetime.fromtimestamp(value / 1000, tz=timezone.utc)
+
+
+class CoverageMap:
+    """
+    覆盖图
+    
+    有序、互不重叠的 [开始, 结束) 毫秒区间列表，表示这些时间段内的K线已完整入库
+    （或交易所在该时段本就没有数据）。
+    """
+    
+    def __init__(self, ranges: Optional[List[Tuple[int, int]]] = None):
+        self.ranges: List[List[int]] = []
+        for start, end in ranges or []:
+            self.add(start, end)
+    
+    def add(self, start: int, end: int):
+        """加入区间并与相邻/重叠区间合并"""
+        if end <= start:
+            return
+        merged = []
+        placed = False
+        for lo, hi in self.ranges:
+            if hi < start:
+                merged.append([lo, hi])
+            elif end < lo:
+                if not placed:
+                    merged.append([start, end])
+                    placed = True
+                merged.append([lo, hi])
+            else:
+                start, end = min(lo, start), max(hi, end)
+        if not placed:
+            merged.append([start, end])
+        self.ranges = merged
+    
+    def missing(self, start: int, end: int) -> List[Tuple[int, int]]:
+        """[start, end) 中未被覆盖的区间"""
+        gaps = []
+        cursor = start
+        for lo, hi in self.ranges:
+            if hi <= cursor:
+                continue
+            if lo >= end:
+                break
+            if lo > cursor:
+                gaps.append((cursor, lo))
+            cursor = max(cursor, hi)
+        if cursor < end:
+            gaps.append((cursor, end))
+        return gaps
+    
+    def to_json(self) -> str:
+        return json.dumps(self.ranges)
+    
+    @classmethod
+    def from_json(cls, raw: Optional[str]) -> 'CoverageMap':
+        return cls([tuple(r) for r in json.loads(raw)] if raw else [])
+
+
+async def find_gaps(
+    db: AsyncSession,
+    exchange: str,
+    symbol: str,
+    interval: str,
+    start: datetime,
+    end: datetime
+) -> List[Tuple[datetime, datetime]]:
+    """
+    查找数据库中 [start, end) 内缺失的K线区间
+    
+    用窗口函数 lag 比较相邻两根K线的时间差，只返回间隔大于一个周期的位置，
+    走 (exchange, symbol, interval, timestamp) 索引，不读取K线内容。
+    
+    Returns:
+        缺失区间列表 [(开始, 结束), ...]
+    """
+    step = interval_to_timedelta(interval)
+    conditions = (
+        Kline.exchange == exchange,
+        Kline.symbol == symbol,
+        Kline.interval == interval,
+        Kline.timestamp >= start,
+        Kline.timestamp < end,
+    )
+    
+    ordered = select(
+        Kline.timestamp.label('ts'),
+        func.lag(Kline.timestamp).over(order_by=Kline.timestamp).label('prev_ts')
+    ).where(*conditions).subquery()
+    breaks = await db.execute(
+        select(ordered.c.prev_ts, ordered.c.ts).where(
+            or_(ordered.c.prev_ts.is_(None), ordered.c.ts - ordered.c.prev_ts > step)
+        ).order_by(ordered.c.ts)
+    )
+    rows = breaks.all()
+    if not rows:
+        return [(start, end)]
+    
+    last = (await db.execute(select(func.max(Kline.timestamp)).where(*conditions))).scalar()
+    
+    start_ms, end_ms, step_ms = _to_ms(start), _to_ms(end), int(step.total_seconds() * 1000)
+    gaps = []
+    for prev_ts, ts in rows:
+        if prev_ts is None:
+            # 区间内的第一根K线
+            if _to_ms(ts) - start_ms >= step_ms:
+                gaps.append((start_ms, _to_ms(ts)))
+        else:
+            gaps.append((_to_ms(prev_ts) + step_ms, _to_ms(ts)))
+    if _to_ms(last) + step_ms < end_ms:
+        gaps.append((_to_ms(last) + step_ms, end_ms))
+    
+    return [(_from_ms(lo), _from_ms(hi)) for lo, hi in gaps]
+
+
+class KlineSync:
+    """
+    增量K线同步
+    
+    1. 读取覆盖图，得到请求范围内尚未确认完整的区间（重复同步时通常只剩最新的一小段）；
+    2. 在这些区间内查找数据库缺口；
+    3. 只为缺口创建回填任务；
+    4. 把这些区间记入覆盖图，抓取或入库失败的缺口除外（下次同步重试）。
+    
+    只同步已收盘的K线：结束时间对齐到当前正在形成的K线的开盘时间。
+    """
+    
+    def __init__(self, redis: Optional[RedisClient] = None, **orchestrator_options):
+        self.redis = redis or redis_client
+        self.orchestrator_options = orchestrator_options
+    
+    @staticmethod
+    def coverage_key(exchange: str, symbol: str, interval: str) -> str:
+        return f"kline:coverage:{exchange}:{symbol}:{interval}"
+    
+    async def load_coverage(self, exchange: str, symbol: str, interval: str) -> CoverageMap:
+        """读取覆盖图（Redis 不可用时视为空）"""
+        try:
+            return CoverageMap.from_json(await self.redis.get(self.coverage_key(exchange, symbol, interval)))
+        except Exception as e:
+            logger.warning(f"Failed to load kline coverage: {e}")
+            return CoverageMap()
+    
+    async def save_coverage(self, exchange: str, symbol: str, interval: str, coverage: CoverageMap):
+        try:
+            await self.redis.set(
+                self.coverage_key(exchange, symbol, interval), coverage.to_json(), expire=COVERAGE_TTL
+            )
+        except Exception as e:
+            logger.warning(f"Failed to save kline coverage: {e}")
+    
+    async def sync(
+        self,
+        db: AsyncSession,
+        exchange: str,
+        symbol: str,
+        interval: str,
+        start: datetime,
+        end: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """
+        同步 [start, end) 内缺失的K线
+        
+        Args:
+            db: 数据库会话
+            exchange: 交易所名称
+            symbol: 交易对
+            interval: 时间间隔
+            start: 开始时间
+            end: 结束时间（默认当前时间）
+        
+        Returns:
+            同步统计（uncovered 未覆盖区间数, gaps 缺口数, fetched, inserted, skipped, error）
+        """
+        step_ms = int(interval_to_timedelta(interval).total_seconds() * 1000)
+        now_ms = _to_ms(datetime.now(timezone.utc))
+        end_ms = min(_to_ms(end) if end else now_ms, now_ms // step_ms * step_ms)
+        start_ms = _to_ms(start)
+        stats: Dict[str, Any] = {
+            'exchange': exchange, 'symbol': symbol, 'interval': interval,
+            'uncovered': 0, 'gaps': 0, 'fetched': 0, 'inserted': 0, 'skipped': 0, 'error': None
+        }
+        if start_ms >= end_ms:
+            return stats
+        
+        coverage = await self.load_coverage(exchange, symbol, interval)
+        uncovered = coverage.missing(start_ms, end_ms)
+        stats['uncovered'] = len(uncovered)
+        if not uncovered:
+            return stats
+        
+        gaps = []
+        for lo, hi in uncovered:
+            gaps.extend(await find_gaps(db, exchange, symbol, interval, _from_ms(lo), _from_ms(hi)))
+        stats['gaps'] = len(gaps)
+        
+        failed = CoverageMap()
+        if gaps:
+            async def save(job: BackfillJob, klines: List[Dict[str, Any]]) -> Dict[str, int]:
+                return await data_collector.save_klines_to_db(
+                    db, exchange, symbol, interval, klines, redis=self.redis
+                )
+            
+            orchestrator = BackfillOrchestrator(sink=save, writers=1, **self.orchestrator_options)
+            results = await orchestrator.run([
+                BackfillJob(exchange, symbol, interval, gap_start, gap_end) for gap_start, gap_end in gaps
+            ])
+            for key in ('fetched', 'inserted', 'skipped'):
+                stats[key] = sum(result[key] for result in results)
+            for (gap_start, gap_end), result in zip(gaps, results):
+                if result['error']:
+                    stats['error'] = stats['error'] or result['error']
+                    failed.add(_to_ms(gap_start), _to_ms(gap_end))
+        
+        # 失败的缺口不记入覆盖图
+        for lo, hi in uncovered:
+            for covered_lo, covered_hi in failed.missing(lo, hi):
+                coverage.add(covered_lo, covered_hi)
+        await self.save_coverage(exchange, symbol, interval, coverage)
+        
+        logger.info(
+            f"Synced {exchange} {symbol} {interval}: {len(uncovered)} uncovered ranges, "
+            f"{len(gaps)} gaps, {stats['inserted']} inserted"
+            + (f", failed: {stats['error']}" if stats['error'] else "")
+        )
+        return stats
+    
+    async def invalidate(self, exchange: str, symbol: str, interval: str):
+        """清除覆盖图（数据被删除或需要重新校验时调用）"""
+        await self.redis.delete(self.coverage_key(exchange, symbol, interval))
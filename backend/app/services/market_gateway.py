@@ -0,0 +1,262 @@
+"""
+实时行情网关
+每个 (交易所, 交易对) 只维持一个上游 WebSocket 订阅（ccxt.pro），行情归一化后写入共享的环形缓冲区，
+再分发给任意数量的浏览器 WebSocket/SSE 客户端；客户端按各自的速度读取，慢客户端只会跳过中间的行情，
+不会在服务端堆积消息，也不会拖慢上游和其他客户端
+"""
+import asyncio
+import time
+from typing import Dict, Any, List, Optional, Set, Tuple, AsyncIterator
+
+from loguru import logger
+
+from app.core.config import settings
+
+
+StreamKey = Tuple[str, str]
+
+
+def normalize_ticker(exchange: str, ticker: Dict[str, Any]) -> Dict[str, Any]:
+    """ccxt 行情转为统一格式（与 /market/ticker 的字段一致）"""
+    return {
+        'exchange': exchange,
+        'symbol': ticker.get('symbol'),
+        'last_price': float(ticker.get('last') or 0.0),
+        'bid': float(ticker.get('bid') or 0.0),
+        'ask': float(ticker.get('ask') or 0.0),
+        'volume_24h': float(ticker.get('baseVolume') or 0.0),
+        'change_24h': float(ticker.get('percentage') or 0.0),
+        'timestamp': int(ticker.get('timestamp') or time.time() * 1000),
+    }
+
+
+class TickRing:
+    """
+    单个交易对的行情环形缓冲区
+    
+    写入时递增序号，读取方各自保存游标（已读到的序号）；落后超过容量的部分被覆盖，
+    读取时返回被跳过的条数。写入后唤醒所有等待中的读取方。
+    """
+    
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.seq = 0
+        self._items: List[Optional[Dict[str, Any]]] = [None] * capacity
+        self._waiters: Set[asyncio.Event] = set()
+    
+    def append(self, tick: Dict[str, Any]):
+        self._items[self.seq % self.capacity] = tick
+        self.seq += 1
+        for waiter in self._waiters:
+            waiter.set()
+    
+    def latest(self) -> Optional[Dict[str, Any]]:
+        return self._items[(self.seq - 1) % self.capacity] if self.seq else None
+    
+    def since(self, cursor: int, limit: Optional[int] = None) -> Tuple[List[Dict[str, Any]], int, int]:
+        """
+        读取游标之后的行情
+        
+        Returns:
+            (行情列表, 新游标, 跳过的条数)
+        """
+        start = max(cursor, self.seq - self.capacity)
+        if limit:
+            start = max(start, self.seq - limit)
+        ticks = [self._items[i % self.capacity] for i in range(start, self.seq)]
+        return ticks, self.seq, start - cursor
+    
+    def add_waiter(self, waiter: asyncio.Event):
+        self._waiters.add(waiter)
+    
+    def remove_waiter(self, waiter: asyncio.Event):
+        self._waiters.discard(waiter)
+
+
+class CcxtProFeed:
+    """ccxt.pro 行情源：每个交易所一个客户端实例，同一交易所的多个交易对复用连接"""
+    
+    def __init__(self):
+        self._clients: Dict[str, Any] = {}
+    
+    def _client(self, exchange: str):
+        try:
+            import ccxt.pro as ccxtpro
+        except ImportError:
+            raise RuntimeError("ccxt.pro not available. Run: pip install ccxt")
+        exchange_id = exchange[:-len('_public')] if exchange.endswith('_public') else exchange
+        if exchange_id not in self._clients:
+            exchange_class = getattr(ccxtpro, exchange_id, None)
+            if exchange_class is None:
+                raise ValueError(f"Unsupported exchange for streaming: {exchange}")
+            self._clients[exchange_id] = exchange_class({'enableRateLimit': True})
+        return self._clients[exchange_id]
+    
+    async def watch_ticker(self, exchange: str, symbol: str) -> Dict[str, Any]:
+        """等待下一条行情（ccxt 原始格式）"""
+        return await self._client(exchange).watch_ticker(symbol)
+    
+    async def close(self):
+        for client in self._clients.values():
+            try:
+                await client.close()
+            except Exception as e:
+                logger.warning(f"Failed to close streaming client {client.id}: {e}")
+        self._clients.clear()
+
+
+class MarketDataGateway:
+    """
+    行情网关
+    
+    - 上游：第一个客户端订阅某交易对时启动一个读取任务，之后的客户端共享；最后一个客户端离开后
+      再保留 idle_timeout 秒（页面刷新等短暂断开不重建上游订阅），仍无人订阅则停止；
+      上游出错时按指数退避重连。
+    - 下游：stream() 为每个客户端生成行情批次，客户端处理完一批才读取下一批；
+      期间到达的行情在环形缓冲区中累积，每批每个交易对最多 max_batch // 交易对数 条（至少 1 条）
+      最新行情，更早的跳过。
+    
+    Examples:
+        async for ticks in market_gateway.stream('binance_public', ['BTC/USDT', 'ETH/USDT']):
+            await websocket.send_json(ticks)
+    """
+    
+    def __init__(
+        self,
+        feed=None,
+        buffer_size: Optional[int] = None,
+        max_batch: Optional[int] = None,
+        idle_timeout: Optional[float] = None
+    ):
+        self.feed = feed or CcxtProFeed()
+        self.buffer_size = buffer_size or settings.MARKET_GATEWAY_BUFFER_SIZE
+        self.max_batch = max_batch or settings.MARKET_GATEWAY_MAX_BATCH
+        self.idle_timeout = settings.MARKET_GATEWAY_IDLE_TIMEOUT if idle_timeout is None else idle_timeout
+        self._rings: Dict[StreamKey, TickRing] = {}
+        self._tasks: Dict[StreamKey, asyncio.Task] = {}
+        self._subscribers: Dict[StreamKey, int] = {}
+        self._stop_handles: Dict[StreamKey, asyncio.TimerHandle] = {}
+        self._upstream_messages = 0
+    
+    def ring(self, exchange: str, symbol: str) -> Optional[TickRing]:
+        return self._rings.get((exchange, symbol))
+    
+    def latest(self, exchange: str, symbol: str) -> Optional[Dict[str, Any]]:
+        """交易对的最新行情（没有活跃订阅时返回 None）"""
+        ring = self._rings.get((exchange, symbol))
+        return ring.latest() if ring else None
+    
+    def _subscribe(self, key: StreamKey) -> TickRing:
+        self._subscribers[key] = self._subscribers.get(key, 0) + 1
+        handle = self._stop_handles.pop(key, None)
+        if handle:
+            handle.cancel()
+        if key not in self._rings:
+            self._rings[key] = TickRing(self.buffer_size)
+        if key not in self._tasks or self._tasks[key].done():
+            self._tasks[key] = asyncio.create_task(self._run_upstream(key))
+            logger.info(f"Started upstream ticker stream {key[0]} {key[1]}")
+        return self._rings[key]
+    
+    def _unsubscribe(self, key: StreamKey):
+        self._subscribers[key] -= 1
+        if self._subscribers[key] > 0:
+            return
+        del self._subscribers[key]
+        if self.idle_timeout > 0:
+            self._stop_handles[key] = asyncio.get_running_loop().call_later(self.idle_timeout, self._stop, key)
+        else:
+            self._stop(key)
+    
+    def _stop(self, key: StreamKey):
+        self._stop_handles.pop(key, None)
+        if self._subscribers.get(key):
+            return
+        task = self._tasks.pop(key, None)
+        if task:
+            task.cancel()
+        self._rings.pop(key, None)
+        logger.info(f"Stopped upstream ticker stream {key[0]} {key[1]}")
+    
+    async def _run_upstream(self, key: StreamKey):
+        exchange, symbol = key
+        delay = 1.0
+        while True:
+            try:
+                raw = await self.feed.watch_ticker(exchange, symbol)
+                self._upstream_messages += 1
+                self._rings[key].append(normalize_ticker(exchange, raw))
+                delay = 1.0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ticker stream {exchange} {symbol} failed, retrying in {delay:.0f}s: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60.0)
+    
+    async def stream(self, exchange: str, symbols: List[str]) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        订阅行情
+        
+        第一批为各交易对的最新行情（如有），之后每批为上次读取以来的新行情。
+        
+        Args:
+            exchange: 交易所名称
+            symbols: 交易对列表
+        
+        Yields:
+            行情列表
+        """
+        keys = [(exchange, symbol) for symbol in dict.fromkeys(symbols)]
+        waiter = asyncio.Event()
+        cursors: Dict[StreamKey, int] = {}
+        rings: Dict[StreamKey, TickRing] = {}
+        try:
+            for key in keys:
+                rings[key] = self._subscribe(key)
+                rings[key].add_waiter(waiter)
+                cursors[key] = max(rings[key].seq - 1, 0)
+            
+            # 每个交易对单独限额，保证每批都包含有新行情的交易对的最新一条
+            per_symbol = max(self.max_batch // len(keys), 1) if keys else self.max_batch
+            while True:
+                waiter.clear()
+                batch = []
+                for key, ring in rings.items():
+                    ticks, cursors[key], _ = ring.since(cursors[key], per_symbol)
+                    batch.extend(ticks)
+                if batch:
+                    yield batch
+                else:
+                    await waiter.wait()
+        finally:
+            for key, ring in rings.items():
+                ring.remove_waiter(waiter)
+                self._unsubscribe(key)
+    
+    def metrics(self) -> Dict[str, Any]:
+        """网关状态：上游订阅数、各交易对的客户端数、累计上游消息数"""
+        return {
+            'upstream_streams': len(self._tasks),
+            'upstream_messages': self._upstream_messages,
+            'subscribers': {f"{exchange}:{symbol}": count for (exchange, symbol), count in self._subscribers.items()},
+        }
+    
+    async def close(self):
+        """停止所有上游订阅（应用关闭时调用）"""
+        for handle in self._stop_handles.values():
+            handle.cancel()
+        self._stop_handles.clear()
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+        self._rings.clear()
+        close = getattr(self.feed, 'close', None)
+        if close:
+            await close()
+
+
+# 全局行情网关实例
+market_gateway = MarketDataGateway()
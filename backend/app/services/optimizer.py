@@ -0,0 +1,347 @@
+"""
+参数优化服务
+基于 BacktestEngine 的网格搜索 / 随机搜索，多进程并行回测
+"""
+import itertools
+import math
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, Any, List, Optional, Tuple, Type
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from app.services.backtest import BacktestEngine
+from app.strategies.base import BaseStrategy
+from app.strategies.indicators import indicator_cache
+
+
+# 优化目标：max_drawdown 为负数，越接近0越好，因此三者都按降序排列
+OPTIMIZATION_TARGETS = ('sharpe_ratio', 'total_return', 'max_drawdown')
+
+# 汇总表中保留的回测指标
+RESULT_METRICS = (
+    'final_capital', 'total_return', 'sharpe_ratio',
+    'max_drawdown', 'win_rate', 'total_trades'
+)
+
+OHLCV_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+
+class SharedBars:
+    """
+    共享内存中的K线数据
+    
+    时间戳（int64纳秒）与 OHLCV（float64）按行存放在同一块共享内存中，
+    工作进程按 spec 挂载后直接构造 DataFrame，不再为每个任务序列化数据。
+    """
+    
+    def __init__(self, data: pd.DataFrame):
+        timestamps = pd.Index(data['timestamp']) if 'timestamp' in data.columns else data.index
+        self.length = len(data)
+        self.tz = None
+        self.is_datetime = isinstance(timestamps, pd.DatetimeIndex)
+        if self.is_datetime:
+            self.tz = str(timestamps.tz) if timestamps.tz is not None else None
+        
+        rows = 1 + len(OHLCV_COLUMNS)
+        self.shm = shared_memory.SharedMemory(create=True, size=max(rows * self.length * 8, 1))
+        block = np.ndarray((rows, self.length), dtype=np.float64, buffer=self.shm.buf)
+        if self.is_datetime:
+            block[0].view(np.int64)[:] = timestamps.as_unit('ns').asi8
+        else:
+            block[0].view(np.int64)[:] = np.arange(self.length)
+        for row, column in enumerate(OHLCV_COLUMNS, start=1):
+            block[row] = data[column].to_numpy(dtype=float)
+    
+    @property
+    def spec(self) -> Tuple[str, int, bool, Optional[str]]:
+        """工作进程挂载所需的描述信息"""
+        return self.shm.name, self.length, self.is_datetime, self.tz
+    
+    def close(self):
+        """释放共享内存"""
+        self.shm.close()
+        self.shm.unlink()
+
+
+def attach_shared_bars(spec: Tuple[str, int, bool, Optional[str]]) -> Tuple[shared_memory.SharedMemory, pd.DataFrame]:
+    """挂载共享内存并构造 DataFrame（OHLCV 列直接引用共享内存）"""
+    name, length, is_datetime, tz = spec
+    shm = shared_memory.SharedMemory(name=name)
+    rows = 1 + len(OHLCV_COLUMNS)
+    block = np.ndarray((rows, length), dtype=np.float64, buffer=shm.buf)
+    
+    ts = block[0].view(np.int64)
+    if is_datetime:
+        timestamps = pd.DatetimeIndex(ts.view('datetime64[ns]'))
+        if tz:
+            timestamps = timestamps.tz_localize('UTC').tz_convert(tz)
+    else:
+        timestamps = pd.RangeIndex(length)
+    
+    columns = {column: block[row] for row, column in enumerate(OHLCV_COLUMNS, start=1)}
+    data = pd.DataFrame(columns, copy=False)
+    data.insert(0, 'timestamp', timestamps)
+    return shm, data
+
+
+# 工作进程内的共享数据（进程初始化时挂载一次）
+_worker_shm: Optional[shared_memory.SharedMemory] = None
+_worker_data: Optional[pd.DataFrame] = None
+
+
+def _init_worker(spec: Tuple[str, int, bool, Optional[str]]):
+    """工作进程初始化：挂载共享K线数据"""
+    global _worker_shm, _worker_data
+    _worker_shm, _worker_data = attach_shared_bars(spec)
+
+
+def _run_backtest(
+    strategy_class: Type[BaseStrategy],
+    params: Dict[str, Any],
+    data: pd.DataFrame,
+    initial_capital: float,
+    commission: float,
+    vectorized: bool
+) -> Dict[str, Any]:
+    """运行单组参数的回测，只返回汇总指标和本次的指标缓存命中数"""
+    hits, misses, evictions = indicator_cache.hits, indicator_cache.misses, indicator_cache.evictions
+    try:
+        strategy = strategy_class(dict(params))
+        engine = BacktestEngine(strategy, data, initial_capital=initial_capital, commission=commission)
+        result = engine.run_vectorized() if vectorized else engine.run()
+        metrics = {key: result.get(key) for key in RESULT_METRICS}
+        metrics['error'] = None
+    except Exception as e:
+        metrics = {key: None for key in RESULT_METRICS}
+        metrics['error'] = str(e)
+    cache = {
+        'hits': indicator_cache.hits - hits,
+        'misses': indicator_cache.misses - misses,
+        'evictions': indicator_cache.evictions - evictions,
+    }
+    return {'params': params, **metrics, 'cache': cache}
+
+
+def _run_task(task: Tuple[Type[BaseStrategy], Dict[str, Any], float, float, bool]) -> Dict[str, Any]:
+    """工作进程任务入口"""
+    strategy_class, params, initial_capital, commission, vectorized = task
+    return _run_backtest(strategy_class, params, _worker_data, initial_capital, commission, vectorized)
+
+
+def process_pool_context() -> multiprocessing.context.BaseContext:
+    """
+    进程池的启动方式
+    
+    优化在 API 进程的线程中发起，fork 会复制其他线程持有的锁和已打开的数据库/Redis 连接，
+    因此使用 forkserver（不支持时用 spawn），工作进程从干净的进程启动。
+    """
+    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return multiprocessing.get_context(method)
+
+
+def grid_size(param_grid: Dict[str, List[Any]]) -> int:
+    """参数网格的组合数（不展开）"""
+    return math.prod(len(list(values)) for values in param_grid.values())
+
+
+def expand_grid(param_grid: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """参数网格展开为参数组合列表（笛卡尔积）"""
+    names = list(param_grid.keys())
+    return [
+        dict(zip(names, values))
+        for values in itertools.product(*(list(param_grid[name]) for name in names))
+    ]
+
+
+def rank_results(results: List[Dict[str, Any]], target: str = 'sharpe_ratio') -> pd.DataFrame:
+    """
+    将回测结果整理为按目标排序的表格
+    
+    Args:
+        results: 每组参数的回测结果
+        target: 排序目标（sharpe_ratio/total_return/max_drawdown）
+    
+    Returns:
+        DataFrame，每行一组参数，最优在前
+    """
+    if target not in OPTIMIZATION_TARGETS:
+        raise ValueError(f"Unsupported optimization target: {target}")
+    
+    rows = [
+        {**result['params'], **{k: v for k, v in result.items() if k not in ('params', 'cache')}}
+        for result in results
+    ]
+    table = pd.DataFrame(rows)
+    if table.empty:
+        return table
+    
+    table = table.sort_values(target, ascending=False, na_position='last', kind='stable')
+    table = table.reset_index(drop=True)
+    table.insert(0, 'rank', np.arange(1, len(table) + 1))
+    return table
+
+
+class ParameterOptimizer:
+    """
+    参数优化器
+    
+    每组参数一个回测任务，通过 ProcessPoolExecutor 分发到全部CPU核心；
+    K线数据放入共享内存，各工作进程只在启动时挂载一次。
+    
+    Examples:
+        optimizer = ParameterOptimizer(MAStrategy, df)
+        table = optimizer.grid_search(
+            {'short_period': range(5, 30, 5), 'long_period': range(20, 120, 10)},
+            target='sharpe_ratio'
+        )
+    """
+    
+    def __init__(
+        self,
+        strategy_class: Type[BaseStrategy],
+        data: pd.DataFrame,
+        initial_capital: float = 100000.0,
+        commission: float = 0.001,
+        vectorized: Optional[bool] = None,
+        max_workers: Optional[int] = None
+    ):
+        self.strategy_class = strategy_class
+        self.data = data
+        self.initial_capital = initial_capital
+        self.commission = commission
+        # 默认：策略实现了 generate_signals 时用向量化回测（指标经 indicator_cache 复用）
+        self.vectorized = strategy_class.supports_vectorized() if vectorized is None else vectorized
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.report: Dict[str, Any] = {}
+    
+    def grid_search(
+        self,
+        param_grid: Dict[str, List[Any]],
+        target: str = 'sharpe_ratio'
+    ) -> pd.DataFrame:
+        """
+        网格搜索
+        
+        Args:
+            param_grid: 参数候选值 {"param_name": [v1, v2, ...]}
+            target: 优化目标（sharpe_ratio/total_return/max_drawdown）
+        
+        Returns:
+            按目标排序的结果表
+        """
+        return self.run(expand_grid(param_grid), target)
+    
+    def random_search(
+        self,
+        param_ranges: Dict[str, Tuple[float, float]],
+        n_iter: int = 50,
+        target: str = 'sharpe_ratio',
+        seed: Optional[int] = None
+    ) -> pd.DataFrame:
+        """
+        随机搜索
+        
+        Args:
+            param_ranges: 参数范围 {"param_name": (min, max)}，上下限均为整数时按整数采样
+            n_iter: 采样次数
+            target: 优化目标
+            seed: 随机种子
+        
+        Returns:
+            按目标排序的结果表
+        """
+        rng = random.Random(seed)
+        param_sets = []
+        for _ in range(n_iter):
+            params = {}
+            for name, (low, high) in param_ranges.items():
+                if isinstance(low, int) and isinstance(high, int):
+                    params[name] = rng.randint(low, high)
+                else:
+                    params[name] = rng.uniform(low, high)
+            param_sets.append(params)
+        return self.run(param_sets, target)
+    
+    def run(self, param_sets: List[Dict[str, Any]], target: str = 'sharpe_ratio') -> pd.DataFrame:
+        """
+        并行回测给定的参数组合
+        
+        Args:
+            param_sets: 参数组合列表
+            target: 优化目标
+        
+        Returns:
+            按目标排序的结果表；扫描汇总（含指标缓存命中统计）保存在 self.report
+        """
+        if target not in OPTIMIZATION_TARGETS:
+            raise ValueError(f"Unsupported optimization target: {target}")
+        
+        started = time.perf_counter()
+        logger.info(
+            f"Optimizing {self.strategy_class.__name__}: {len(param_sets)} parameter sets, "
+            f"{self.max_workers} workers"
+        )
+        
+        if self.max_workers == 1 or len(param_sets) <= 1:
+            results = [
+                _run_backtest(
+                    self.strategy_class, params, self.data,
+                    self.initial_capital, self.commission, self.vectorized
+                )
+                for params in param_sets
+            ]
+        else:
+            results = self._run_parallel(param_sets)
+        
+        self.report = self._build_report(results, time.perf_counter() - started)
+        logger.info(f"Optimization finished: {self.report}")
+        
+        table = rank_results(results, target)
+        table.attrs['report'] = self.report
+        return table
+    
+    def _run_parallel(self, param_sets: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """在进程池中回测，K线数据通过共享内存传给工作进程"""
+        tasks = [
+            (self.strategy_class, params, self.initial_capital, self.commission, self.vectorized)
+            for params in param_sets
+        ]
+        chunksize = max(1, len(tasks) // (self.max_workers * 4))
+        
+        shared = SharedBars(self.data)
+        try:
+            with ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=process_pool_context(),
+                initializer=_init_worker,
+                initargs=(shared.spec,)
+            ) as executor:
+                results = list(executor.map(_run_task, tasks, chunksize=chunksize))
+        finally:
+            shared.close()
+        return results
+    
+    def _build_report(self, results: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+        """汇总扫描耗时、失败数和指标缓存命中统计"""
+        hits = sum(result['cache']['hits'] for result in results)
+        misses = sum(result['cache']['misses'] for result in results)
+        evictions = sum(result['cache']['evictions'] for result in results)
+        return {
+            'param_sets': len(results),
+            'failed': sum(1 for result in results if result['error']),
+            'workers': self.max_workers,
+            'elapsed_seconds': round(elapsed, 3),
+            'indicator_cache': {
+                'hits': hits,
+                'misses': misses,
+                'evictions': evictions,
+                'hit_ratio': hits / (hits + misses) if hits + misses else 0.0,
+            },
+        }
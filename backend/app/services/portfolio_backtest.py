@@ -0,0 +1,211 @@
+"""
+组合回测
+多个标的共用一条时间线和一份现金，各标的独立持仓
+"""
+import heapq
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Iterator, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.services.backtest import BacktestEngine, BarFeed, BarView, OrderBook
+from app.services.kline_reader import arrays_to_frame, fetch_multi_kline_arrays
+from app.strategies.base import BaseStrategy
+
+
+def timeline_keys(feed: BarFeed) -> np.ndarray:
+    """K线时间戳转为可比较的 int64（纳秒）"""
+    if isinstance(feed.timestamp, pd.DatetimeIndex):
+        return feed.timestamp.as_unit('ns').asi8
+    return np.asarray(feed.timestamp, dtype=np.int64)
+
+
+def merge_timelines(keys: List[np.ndarray]) -> Iterator[Tuple[int, int, int]]:
+    """
+    k 路堆归并
+    
+    每个标的的时间戳数组各自有序，堆中只保存每个标的的下一根K线，
+    按时间先后依次产出 (时间戳, 标的序号, 行号)；同一时间按标的序号排序。
+    
+    Args:
+        keys: 各标的的 int64 时间戳数组
+    
+    Yields:
+        (时间戳, 标的序号, 行号)
+    """
+    heap = [(int(k[0]), s, 0) for s, k in enumerate(keys) if len(k)]
+    heapq.heapify(heap)
+    while heap:
+        ts, s, i = heap[0]
+        yield ts, s, i
+        i += 1
+        if i < len(keys[s]):
+            heapq.heapreplace(heap, (int(keys[s][i]), s, i))
+        else:
+            heapq.heappop(heap)
+
+
+class PortfolioBacktestEngine(BacktestEngine):
+    """
+    组合回测引擎
+    
+    各标的的K线保存在各自的 BarFeed 数组中，通过 k 路堆归并合成一条时间线，
+    依次以 BarView 回调策略的 on_bar_view（bar.symbol 为当前标的）。
+    订单按 symbol 进入各自的订单簿，只在该标的的K线上撮合；
+    持仓按标的记录，现金共用，每个时间点按各标的最新收盘价计算一次权益。
+    
+    只有事件驱动模式（run）：开仓金额取决于当时所有标的共用的现金，无法按标的独立向量化求解。
+    """
+    
+    def __init__(
+        self,
+        strategy: BaseStrategy,
+        data: Dict[str, pd.DataFrame],
+        initial_capital: float = 100000.0,
+        commission: float = 0.001  # 手续费率
+    ):
+        super().__init__(strategy, data, initial_capital, commission)
+        self.symbols = list(data.keys())
+        self.symbol_index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.feeds = [BarFeed(df, symbol=symbol) for symbol, df in data.items()]
+        self.order_books: Dict[str, OrderBook] = {}
+        
+        # 各标的持仓数量与最新收盘价（按标的序号），用于计算权益
+        self._amounts = np.zeros(len(self.symbols))
+        self._last_close = np.zeros(len(self.symbols))
+    
+    def run(self) -> Dict[str, Any]:
+        """
+        运行组合回测
+        
+        返回结果中的 equity_curve 每个时间点一行，trades 带有 symbol 字段。
+        """
+        keys = [timeline_keys(feed) for feed in self.feeds]
+        views = [BarView(feed) for feed in self.feeds]
+        total_bars = sum(len(feed) for feed in self.feeds)
+        equity_ts = np.empty(total_bars, dtype=np.int64)
+        equity = np.empty(total_bars)
+        points = 0
+        current_ts = None
+        
+        for ts, s, i in merge_timelines(keys):
+            if ts != current_ts:
+                if current_ts is not None:
+                    equity_ts[points] = current_ts
+                    equity[points] = self._portfolio_equity()
+                    points += 1
+                current_ts = ts
+            
+            bar = views[s]
+            bar.index = i
+            self._last_close[s] = self.feeds[s].close[i]
+            
+            # 调用策略
+            self.strategy.on_bar_view(bar)
+            
+            # 处理订单
+            self._process_orders(bar)
+        
+        if current_ts is not None:
+            equity_ts[points] = current_ts
+            equity[points] = self._portfolio_equity()
+            points += 1
+        
+        equity = equity[:points]
+        self.equity_curve = pd.DataFrame({
+            'timestamp': self._to_timestamps(equity_ts[:points]),
+            'equity': equity
+        })
+        return self._calculate_metrics(equity)
+    
+    def run_vectorized(self, warmup: int = 0) -> Dict[str, Any]:
+        """向量化回测只支持单标的（BacktestEngine），组合回测请使用 run()"""
+        raise ValueError("Vectorized backtest is single-symbol only; use PortfolioBacktestEngine.run()")
+    
+    def _portfolio_equity(self) -> float:
+        """现金 + 各标的持仓市值"""
+        return self.capital + float(np.dot(self._amounts, self._last_close))
+    
+    def _to_timestamps(self, keys: np.ndarray) -> pd.Index:
+        """将 int64 时间戳还原为与输入数据一致的时间类型"""
+        sample = next((feed.timestamp for feed in self.feeds if len(feed)), None)
+        if isinstance(sample, pd.DatetimeIndex):
+            timestamps = pd.DatetimeIndex(keys.view('datetime64[ns]'))
+            if sample.tz is not None:
+                timestamps = timestamps.tz_localize('UTC').tz_convert(sample.tz)
+            return timestamps
+        return pd.Index(keys)
+    
+    def _process_orders(self, bar: BarView):
+        """
+        处理订单
+        
+        未指定 symbol 的订单归属当前K线的标的；只撮合当前标的的订单簿。
+        """
+        orders = self.strategy.orders
+        while self._order_cursor < len(orders):
+            order = orders[self._order_cursor]
+            if not order.get('symbol'):
+                order['symbol'] = bar.symbol
+            self._book(order['symbol']).add(order)
+            self._order_cursor += 1
+        
+        book = self.order_books.get(bar.symbol)
+        if book:
+            self._match_orders(book, bar)
+    
+    def _book(self, symbol: str) -> OrderBook:
+        """获取标的的订单簿"""
+        if symbol not in self.symbol_index:
+            raise ValueError(f"Symbol {symbol} is not in the portfolio")
+        book = self.order_books.get(symbol)
+        if book is None:
+            book = self.order_books[symbol] = OrderBook()
+        return book
+    
+    def _position_for(self, order: Dict[str, Any]) -> Dict[str, Any]:
+        """订单对应标的的持仓记录"""
+        return self.positions.setdefault(order['symbol'], {})
+    
+    def _sync_strategy(self, order: Dict[str, Any], trade: Dict[str, Any]):
+        """成交后同步资金与该标的的持仓，并触发回调"""
+        symbol = order['symbol']
+        position = self.positions[symbol]
+        self._amounts[self.symbol_index[symbol]] = position.get('amount', 0)
+        
+        self.strategy.capital = self.capital
+        if position.get('amount', 0) > 0:
+            self.strategy.positions[symbol] = dict(position)
+        else:
+            self.strategy.positions.pop(symbol, None)
+        self.strategy.trades.append(trade)
+        self.strategy.on_order(order)
+        self.strategy.on_trade(trade)
+
+
+async def load_portfolio_klines(
+    db: AsyncSession,
+    exchange: str,
+    symbols: List[str],
+    interval: str,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None
+) -> Dict[str, pd.DataFrame]:
+    """
+    加载多个标的的K线（一次查询取回全部标的的列数组，不构造 ORM 对象或 Row 元组）
+    
+    Args:
+        db: 数据库会话
+        exchange: 交易所名称
+        symbols: 标的列表
+        interval: 时间间隔
+        start_time: 开始时间
+        end_time: 结束时间
+    
+    Returns:
+        {symbol: DataFrame}，每个 DataFrame 按时间升序；没有K线的标的不包含在内
+    """
+    arrays = await fetch_multi_kline_arrays(db, exchange, symbols, interval, start_time, end_time)
+    return {symbol: arrays_to_frame(columns) for symbol, columns in arrays.items()}
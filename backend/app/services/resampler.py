@@ -0,0 +1,289 @@
+"""
+K线重采样
+由 1m K线聚合出高周期K线（开=首、高=最大、低=最小、收=末、量=求和），
+常用周期物化在 kline_rollups 表中，新的 1m K线入库后增量更新；其他周期查询时即时聚合
+"""
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.market import KlineRollup
+from app.services.backtest import load_klines_dataframe
+from app.services.kline_reader import arrays_to_frame, fetch_kline_arrays
+from app.services.kline_sync import interval_to_timedelta
+
+
+BASE_INTERVAL = '1m'
+
+# 周线从周一 00:00 UTC 开始（1970-01-01 是周四）
+WEEK_OFFSET_MS = 4 * 86400 * 1000
+
+ROLLUP_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume', 'bar_count']
+
+# 聚合结果写入：未完成的K线会被后续的 1m K线更新，内容不变的行跳过，不产生新版本
+ROLLUP_UPSERT = text(f"""
+    INSERT INTO {KlineRollup.__tablename__}
+        (exchange, symbol, interval, timestamp, open, high, low, close, volume, bar_count)
+    SELECT :exchange, :symbol, :interval, t.*
+    FROM unnest(
+        CAST(:timestamps AS TIMESTAMPTZ[]),
+        CAST(:opens AS FLOAT8[]),
+        CAST(:highs AS FLOAT8[]),
+        CAST(:lows AS FLOAT8[]),
+        CAST(:closes AS FLOAT8[]),
+        CAST(:volumes AS FLOAT8[]),
+        CAST(:bar_counts AS INTEGER[])
+    ) AS t
+    ON CONFLICT (exchange, symbol, interval, timestamp) DO UPDATE SET
+        open = EXCLUDED.open,
+        high = EXCLUDED.high,
+        low = EXCLUDED.low,
+        close = EXCLUDED.close,
+        volume = EXCLUDED.volume,
+        bar_count = EXCLUDED.bar_count
+    WHERE (kline_rollups.open, kline_rollups.high, kline_rollups.low, kline_rollups.close,
+           kline_rollups.volume, kline_rollups.bar_count)
+        IS DISTINCT FROM
+          (EXCLUDED.open, EXCLUDED.high, EXCLUDED.low, EXCLUDED.close, EXCLUDED.volume, EXCLUDED.bar_count)
+""")
+
+
+def _interval_ms(interval: str) -> int:
+    return int(interval_to_timedelta(interval).total_seconds() * 1000)
+
+
+def _offset_ms(interval: str) -> int:
+    return WEEK_OFFSET_MS if interval.endswith('w') else 0
+
+
+def bucket_start(ms: np.ndarray, interval: str) -> np.ndarray:
+    """毫秒时间戳所在周期的开盘时间（按 UTC 对齐，周线对齐到周一）"""
+    step, offset = _interval_ms(interval), _offset_ms(interval)
+    return (ms - offset) // step * step + offset
+
+
+def _to_ms(value: datetime) -> int:
+    """毫秒时间戳（无时区的时间按本地时间处理，与采集器一致）"""
+    return int(value.timestamp() * 1000)
+
+
+def resample_ohlcv(df: pd.DataFrame, interval: str) -> pd.DataFrame:
+    """
+    聚合K线
+    
+    Args:
+        df: 按时间升序的K线（timestamp, open, high, low, close, volume），通常为 1m；
+            带 bar_count 列时（已聚合的K线）按其求和
+        interval: 目标周期（5m, 1h, 4h, 1d, 1w, 以及 2h, 3d 等任意整数倍周期）
+    
+    Returns:
+        DataFrame（timestamp 为 UTC 开盘时间, open, high, low, close, volume, bar_count）
+    """
+    if df.empty:
+        return pd.DataFrame(columns=ROLLUP_COLUMNS)
+    
+    ms = pd.DatetimeIndex(pd.to_datetime(df['timestamp'], utc=True)).as_unit('ms').asi8
+    buckets = bucket_start(ms, interval)
+    # 时间升序时同一周期的K线连续，每段的起始下标即 reduceat 的分段点
+    starts = np.flatnonzero(np.diff(buckets, prepend=buckets[0] - 1))
+    ends = np.append(starts[1:], len(buckets)) - 1
+    
+    return pd.DataFrame({
+        'timestamp': pd.to_datetime(buckets[starts], unit='ms', utc=True),
+        'open': df['open'].to_numpy(dtype=np.float64)[starts],
+        'high': np.maximum.reduceat(df['high'].to_numpy(dtype=np.float64), starts),
+        'low': np.minimum.reduceat(df['low'].to_numpy(dtype=np.float64), starts),
+        'close': df['close'].to_numpy(dtype=np.float64)[ends],
+        'volume': np.add.reduceat(df['volume'].to_numpy(dtype=np.float64), starts),
+        'bar_count': (
+            np.add.reduceat(df['bar_count'].to_numpy(dtype=np.int64), starts) if 'bar_count' in df
+            else np.diff(np.append(starts, len(buckets)))
+        ),
+    })
+
+
+def merge_native_klines(
+    rollups: pd.DataFrame,
+    native: pd.DataFrame,
+    limit: Optional[int] = None
+) -> pd.DataFrame:
+    """
+    合并物化K线与从交易所采集的同周期K线
+    
+    物化K线只覆盖有 1m 数据的时段（实时同步通常只有最近几小时），其余时段使用采集的K线；
+    同一时间两者都有时，1m 覆盖范围内（物化的第一根之后）用物化结果，
+    第一根可能只由部分 1m K线聚合而成，与更早的时段一样用采集的K线。
+    """
+    if rollups.empty or native.empty:
+        data = native if rollups.empty else rollups
+    else:
+        rollups = rollups.assign(timestamp=pd.to_datetime(rollups['timestamp'], utc=True))
+        native = native.assign(timestamp=pd.to_datetime(native['timestamp'], utc=True))
+        covered_from = rollups['timestamp'].iloc[0]
+        native = native[(native['timestamp'] <= covered_from) | ~native['timestamp'].isin(rollups['timestamp'])]
+        rollups = rollups[~rollups['timestamp'].isin(native['timestamp'])]
+        data = pd.concat([native, rollups], ignore_index=True).sort_values('timestamp', kind='stable')
+    if limit:
+        data = data.iloc[-limit:]
+    return data.reset_index(drop=True)
+
+
+def _source_interval(interval: str, candidates: List[str]) -> str:
+    """
+    聚合 interval 时使用的来源周期：candidates 中周期能整除 interval、且开盘时间对齐
+    （每个 interval 周期恰好由整数个来源周期组成）的最大周期，都不满足时为 1m
+    """
+    step, offset = _interval_ms(interval), _offset_ms(interval)
+    nested = [
+        candidate for candidate in candidates
+        if step % _interval_ms(candidate) == 0
+        and (offset - _offset_ms(candidate)) % _interval_ms(candidate) == 0
+    ]
+    return max(nested, key=_interval_ms) if nested else BASE_INTERVAL
+
+
+async def _read_rollups(
+    db: AsyncSession,
+    exchange: str,
+    symbol: str,
+    interval: str,
+    lo: int,
+    hi: int
+) -> pd.DataFrame:
+    """读取 [lo, hi)（毫秒）内的物化K线（含 bar_count）"""
+    query = select(
+        KlineRollup.timestamp, KlineRollup.open, KlineRollup.high, KlineRollup.low,
+        KlineRollup.close, KlineRollup.volume, KlineRollup.bar_count
+    ).where(
+        KlineRollup.exchange == exchange,
+        KlineRollup.symbol == symbol,
+        KlineRollup.interval == interval,
+        KlineRollup.timestamp >= pd.Timestamp(lo, unit='ms', tz='UTC').to_pydatetime(),
+        KlineRollup.timestamp < pd.Timestamp(hi, unit='ms', tz='UTC').to_pydatetime()
+    ).order_by(KlineRollup.timestamp)
+    return pd.DataFrame((await db.execute(query)).all(), columns=ROLLUP_COLUMNS)
+
+
+async def update_rollups(
+    db: AsyncSession,
+    exchange: str,
+    symbol: str,
+    start: datetime,
+    end: datetime,
+    intervals: Optional[List[str]] = None
+) -> Dict[str, int]:
+    """
+    增量更新物化的高周期K线
+    
+    按周期从小到大逐级更新，每个周期只重算 [start, end] 所在的周期：
+    最小的周期读取这些周期内的 1m K线，更大的周期读取已更新的最大可整除周期
+    （如 15m 读 5m，1w 读 1d）的物化K线再聚合（bar_count 相加），
+    新增一根 1m K线时每个周期只读写常数行。
+    
+    Args:
+        db: 数据库会话
+        exchange: 交易所名称
+        symbol: 交易对
+        start: 新 1m K线的最早时间
+        end: 新 1m K线的最晚时间
+        intervals: 要更新的周期（默认 settings.KLINE_ROLLUP_INTERVALS）
+    
+    Returns:
+        {周期: 写入/更新的K线数}
+    """
+    intervals = sorted(intervals or settings.KLINE_ROLLUP_INTERVALS, key=_interval_ms)
+    start_ms, end_ms = _to_ms(start), _to_ms(end)
+    written = {}
+    for position, interval in enumerate(intervals):
+        lo = int(bucket_start(np.int64(start_ms), interval))
+        hi = int(bucket_start(np.int64(end_ms), interval)) + _interval_ms(interval)
+        source = _source_interval(interval, intervals[:position])
+        if source == BASE_INTERVAL:
+            bars = arrays_to_frame(await fetch_kline_arrays(
+                db, exchange, symbol, BASE_INTERVAL,
+                pd.Timestamp(lo, unit='ms', tz='UTC').to_pydatetime(),
+                pd.Timestamp(hi - 1, unit='ms', tz='UTC').to_pydatetime()
+            ))
+        else:
+            bars = await _read_rollups(db, exchange, symbol, source, lo, hi)
+        rollup = resample_ohlcv(bars, interval)
+        if rollup.empty:
+            continue
+        result = await db.execute(ROLLUP_UPSERT, {
+            'exchange': exchange,
+            'symbol': symbol,
+            'interval': interval,
+            'timestamps': list(rollup['timestamp'].dt.to_pydatetime()),
+            'opens': rollup['open'].tolist(),
+            'highs': rollup['high'].tolist(),
+            'lows': rollup['low'].tolist(),
+            'closes': rollup['close'].tolist(),
+            'volumes': rollup['volume'].tolist(),
+            'bar_counts': rollup['bar_count'].astype(int).tolist(),
+        })
+        written[interval] = max(result.rowcount, 0)
+    await db.commit()
+    return written
+
+
+async def load_klines(
+    db: AsyncSession,
+    exchange: str,
+    symbol: str,
+    interval: str,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    limit: Optional[int] = None
+) -> pd.DataFrame:
+    """
+    读取任意周期的K线
+    
+    1. 1m：直接读取；
+    2. 物化的周期：读取 kline_rollups，未被 1m 覆盖的时段用从交易所采集入库的该周期K线补全；
+    3. 其他 1m 整数倍周期（如 2h, 3d）：读取 1m 即时聚合；
+    以上都没有数据时，回退到从交易所采集入库的该周期K线。
+    
+    Returns:
+        按时间升序的 DataFrame（timestamp, open, high, low, close, volume）
+    """
+    columns = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+    data = pd.DataFrame(columns=columns)
+    
+    if interval == BASE_INTERVAL:
+        return await load_klines_dataframe(db, exchange, symbol, interval, start_time, end_time, limit=limit)
+    
+    if interval in settings.KLINE_ROLLUP_INTERVALS:
+        data = arrays_to_frame(await fetch_kline_arrays(
+            db, exchange, symbol, interval, start_time, end_time,
+            limit=limit, table_name=KlineRollup.__tablename__
+        ))
+        if not data.empty and start_time is not None:
+            # 物化K线从请求区间内的第一个周期开始，无需补全
+            first_bucket = int(bucket_start(np.int64(_to_ms(start_time) - 1), interval)) + _interval_ms(interval)
+            if data['timestamp'].iloc[0] <= pd.Timestamp(first_bucket, unit='ms', tz='UTC'):
+                return data
+        native = await load_klines_dataframe(db, exchange, symbol, interval, start_time, end_time, limit=limit)
+        return merge_native_klines(data, native, limit)
+    
+    else:
+        try:
+            step = interval_to_timedelta(interval)
+        except ValueError:
+            step = None
+        if step is not None and step.total_seconds() % 60 == 0:
+            if limit and start_time is None:
+                # 只需要最后 limit 根：按周期长度推算 1m 的起始时间，多读一根用于补齐第一根
+                start_time = (end_time or datetime.now(timezone.utc)) - step * (limit + 1)
+            bars = await load_klines_dataframe(db, exchange, symbol, BASE_INTERVAL, start_time, end_time)
+            data = resample_ohlcv(bars, interval)[columns]
+            if limit:
+                data = data.iloc[-limit:].reset_index(drop=True)
+    
+    if data.empty:
+        return await load_klines_dataframe(db, exchange, symbol, interval, start_time, end_time, limit=limit)
+    return data
@@ -0,0 +1,301 @@
+"""
+回测结果存储
+权益曲线和成交记录按列存为压缩的二进制数组（numpy npz），
+数据库 JSON 中只保留摘要；读取时支持按时间范围截取和降采样
+"""
+import io
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+# 成交方向编码
+SIDE_CODES = {'buy': 1, 'sell': -1}
+SIDE_NAMES = {1: 'buy', -1: 'sell'}
+
+TRADE_FLOAT_COLUMNS = ('price', 'amount', 'commission')
+
+
+def _timestamps_ns(values: Any) -> np.ndarray:
+    """时间戳转为 UTC 纳秒 int64 数组"""
+    index = pd.DatetimeIndex(pd.to_datetime(values, utc=True)).as_unit('ns')
+    return index.asi8.astype(np.int64, copy=False)
+
+
+def _to_ns(value: Optional[datetime]) -> Optional[int]:
+    """单个时间转为 UTC 纳秒"""
+    if value is None:
+        return None
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is None:
+        ts = ts.tz_localize('UTC')
+    return int(ts.value)
+
+
+def _dump(arrays: Dict[str, np.ndarray], delta_encoded: bool = False) -> bytes:
+    """
+    压缩保存；时间戳按差分存储，等间隔K线压缩后几乎不占空间
+    
+    delta_encoded 为 True 时 timestamp 已是差分值（如流式回测暂存的数组），不再差分；
+    数组可以是 memmap，numpy 按块读取并压缩。
+    """
+    arrays = dict(arrays)
+    if not delta_encoded:
+        arrays['timestamp'] = np.diff(arrays['timestamp'], prepend=np.int64(0))
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def _load(blob: bytes) -> Dict[str, np.ndarray]:
+    with np.load(io.BytesIO(blob), allow_pickle=False) as archive:
+        arrays = {name: archive[name] for name in archive.files}
+    arrays['timestamp'] = np.cumsum(arrays['timestamp'], dtype=np.int64)
+    return arrays
+
+
+def encode_equity_curve(timestamps: Any, equity: Any) -> Dict[str, np.ndarray]:
+    """权益曲线转为存储用的列数组（timestamp: int64 纳秒，equity: float64）"""
+    return {
+        'timestamp': _timestamps_ns(timestamps),
+        'equity': np.asarray(equity, dtype=np.float64),
+    }
+
+
+def pack_equity_curve(equity_curve: pd.DataFrame) -> bytes:
+    """
+    打包权益曲线
+    
+    Args:
+        equity_curve: 包含 timestamp, equity 两列的 DataFrame
+    
+    Returns:
+        压缩后的二进制数据（timestamp: int64 纳秒，equity: float64）
+    """
+    return _dump(encode_equity_curve(equity_curve['timestamp'], equity_curve['equity']))
+
+
+def pack_delta_encoded(arrays: Dict[str, np.ndarray]) -> bytes:
+    """打包 timestamp 已差分的列数组（与 pack_equity_curve/pack_trades 的格式相同）"""
+    return _dump(arrays, delta_encoded=True)
+
+
+def unpack_equity_curve(blob: bytes) -> Tuple[np.ndarray, np.ndarray]:
+    """解包权益曲线，返回 (timestamp 纳秒数组, equity 数组)"""
+    arrays = _load(blob)
+    return arrays['timestamp'], arrays['equity']
+
+
+def encode_trades(trades: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    """
+    成交记录转为存储用的列数组
+    
+    Args:
+        trades: BacktestEngine 产生的成交列表
+    
+    Returns:
+        方向编码为 int8，标的（若有）为字符串数组
+    """
+    frame = pd.DataFrame(trades, columns=['timestamp', 'side', *TRADE_FLOAT_COLUMNS, 'symbol'])
+    arrays = {
+        'timestamp': _timestamps_ns(frame['timestamp']) if len(frame) else np.empty(0, dtype=np.int64),
+        'side': frame['side'].map(SIDE_CODES).fillna(0).to_numpy(dtype=np.int8),
+    }
+    for column in TRADE_FLOAT_COLUMNS:
+        arrays[column] = frame[column].to_numpy(dtype=np.float64)
+    if frame['symbol'].notna().any():
+        arrays['symbol'] = frame['symbol'].fillna('').to_numpy(dtype=str)
+    return arrays
+
+
+def pack_trades(trades: List[Dict[str, Any]]) -> bytes:
+    """
+    打包成交记录
+    
+    Args:
+        trades: BacktestEngine 产生的成交列表
+    
+    Returns:
+        压缩后的二进制数据（列见 encode_trades）
+    """
+    return _dump(encode_trades(trades))
+
+
+def unpack_trades(blob: bytes) -> Dict[str, np.ndarray]:
+    """解包成交记录，返回按列的数组字典"""
+    return _load(blob)
+
+
+def _range_slice(timestamps: np.ndarray, start: Optional[datetime], end: Optional[datetime]) -> slice:
+    """时间范围对应的下标区间（时间戳有序，二分查找）"""
+    start_ns, end_ns = _to_ns(start), _to_ns(end)
+    lo = 0 if start_ns is None else int(np.searchsorted(timestamps, start_ns, side='left'))
+    hi = len(timestamps) if end_ns is None else int(np.searchsorted(timestamps, end_ns, side='right'))
+    return slice(lo, max(lo, hi))
+
+
+def downsample_indices(values: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    降采样
+    
+    将序列等分为 (max_points - 2) // 2 个桶，每个桶保留最小值和最大值所在的点，
+    再加上首尾两点，保证降采样后的曲线不丢失回撤的谷底和峰值。
+    
+    Args:
+        values: 原始序列
+        max_points: 最多保留的点数
+    
+    Returns:
+        保留点的下标（升序）
+    """
+    n = len(values)
+    if n <= max_points:
+        return np.arange(n)
+    
+    buckets = max((max_points - 2) // 2, 1)
+    size = -(-n // buckets)  # 向上取整
+    padded = np.full(buckets * size, np.nan)
+    padded[:n] = values
+    padded = padded.reshape(buckets, size)
+    valid = ~np.isnan(padded).all(axis=1)
+    filled_min = np.where(np.isnan(padded), np.inf, padded)
+    filled_max = np.where(np.isnan(padded), -np.inf, padded)
+    
+    offsets = np.arange(buckets) * size
+    lows = offsets + filled_min.argmin(axis=1)
+    highs = offsets + filled_max.argmax(axis=1)
+    indices = np.concatenate((lows[valid], highs[valid], [0, n - 1]))
+    return np.unique(indices[indices < n])
+
+
+def read_equity_curve(
+    blob: bytes,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    max_points: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    读取权益曲线
+    
+    Args:
+        blob: pack_equity_curve 的结果
+        start: 开始时间
+        end: 结束时间
+        max_points: 最多返回的点数（超出时降采样）
+    
+    Returns:
+        {"timestamps": [...], "equity": [...], "total_points": 区间内点数, "downsampled": bool}
+    """
+    timestamps, equity = unpack_equity_curve(blob)
+    window = _range_slice(timestamps, start, end)
+    timestamps, equity = timestamps[window], equity[window]
+    
+    total = len(equity)
+    if max_points and total > max_points:
+        keep = downsample_indices(equity, max_points)
+        timestamps, equity = timestamps[keep], equity[keep]
+    
+    return {
+        'timestamps': pd.to_datetime(timestamps, utc=True).strftime('%Y-%m-%dT%H:%M:%SZ').tolist(),
+        'equity': equity.tolist(),
+        'total_points': total,
+        'downsampled': len(equity) < total,
+    }
+
+
+def read_trades(
+    blob: bytes,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    offset: int = 0,
+    limit: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    读取成交记录
+    
+    Args:
+        blob: pack_trades 的结果
+        start: 开始时间
+        end: 结束时间
+        offset: 区间内的偏移
+        limit: 返回条数
+    
+    Returns:
+        {"trades": [...], "total": 区间内成交数}
+    """
+    arrays = unpack_trades(blob)
+    window = _range_slice(arrays['timestamp'], start, end)
+    total = window.stop - window.start
+    lo = window.start + offset
+    hi = window.stop if limit is None else min(window.stop, lo + limit)
+    
+    rows = slice(lo, max(lo, hi))
+    timestamps = pd.to_datetime(arrays['timestamp'][rows], utc=True).strftime('%Y-%m-%dT%H:%M:%SZ')
+    trades = []
+    for i, ts in zip(range(rows.start, rows.stop), timestamps):
+        trade = {
+            'timestamp': ts,
+            'side': SIDE_NAMES.get(int(arrays['side'][i])),
+            **{column: float(arrays[column][i]) for column in TRADE_FLOAT_COLUMNS},
+        }
+        if 'symbol' in arrays:
+            trade['symbol'] = str(arrays['symbol'][i]) or None
+        trades.append(trade)
+    
+    return {'trades': trades, 'total': total}
+
+
+def summarize_result(
+    result: Dict[str, Any],
+    bars: int,
+    preview_points: int = 200
+) -> Dict[str, Any]:
+    """
+    回测结果摘要（写入 Backtest.result_data）
+    
+    只保留规模信息和一条降采样后的预览曲线，完整数据在二进制列中。
+    """
+    equity_curve = result.get('equity_curve')
+    if equity_curve is None or not len(equity_curve):
+        return summarize_arrays(bars, 0, len(result.get('trades') or []), None, None, preview_points)
+    return summarize_arrays(
+        bars, len(equity_curve), len(result.get('trades') or []),
+        _timestamps_ns(equity_curve['timestamp']), equity_curve['equity'].to_numpy(dtype=np.float64),
+        preview_points
+    )
+
+
+def summarize_arrays(
+    bars: int,
+    equity_points: int,
+    trades: int,
+    timestamps: Optional[np.ndarray],
+    equity: Optional[np.ndarray],
+    preview_points: int = 200
+) -> Dict[str, Any]:
+    """
+    回测结果摘要（权益曲线不在内存中时使用，见 summarize_result）
+    
+    Args:
+        bars: K线数
+        equity_points: 权益曲线点数
+        trades: 成交数
+        timestamps: 预览候选点的时间（纳秒），可以是完整曲线，也可以是已按块降采样的点
+        equity: 预览候选点的权益
+        preview_points: 预览曲线最多点数
+    """
+    summary: Dict[str, Any] = {
+        'format': 'npz',
+        'bars': bars,
+        'equity_points': equity_points,
+        'trades': trades,
+    }
+    if equity is not None and len(equity):
+        keep = downsample_indices(equity, preview_points)
+        summary['preview'] = {
+            'timestamps': pd.to_datetime(timestamps[keep], utc=True).strftime('%Y-%m-%dT%H:%M:%SZ').tolist(),
+            'equity': equity[keep].tolist(),
+        }
+    return summary
@@ -2,16 +2,52 @@
 实时搜索服务 - 获取最新市场信息
 """
 import aiohttp
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from loguru import logger
+from app.core.config import settings
+from app.core.redis import redis_client
 
 
 class SearchService:
-    """实时搜索服务"""
+    """
+    实时搜索服务
+    
+    所有请求共用一个长连接会话（连接池按主机限流、keep-alive、DNS 缓存），由应用生命周期创建和关闭；
+    结果按类型缓存（settings.SEARCH_CACHE_TTL），请求失败的结果不缓存。
+    """
     
     def __init__(self):
+        self.session: Optional[aiohttp.ClientSession] = None
+    
+    async def start(self):
+        """创建连接池会话（应用启动时调用）"""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit_per_host=settings.SEARCH_HTTP_LIMIT_PER_HOST,
+                ttl_dns_cache=300,
+                keepalive_timeout=60
+            )
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=settings.SEARCH_HTTP_TIMEOUT)
+            )
+    
+    async def close(self):
+        """关闭会话（应用关闭时调用）"""
+        if self.session and not self.session.closed:
+            await self.session.close()
         self.session = None
     
+    async def _get_json(self, url: str, params: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """GET 请求并解析 JSON，非 200 响应返回 None"""
+        if self.session is None or self.session.closed:
+            await self.start()
+        async with self.session.get(url, params=params) as response:
+            if response.status != 200:
+                logger.warning(f"GET {url} returned {response.status}")
+                return None
+            return await response.json()
+    
     async def search_news(self, query: str, limit: int = 5) -> List[str]:
         """
         搜索最新新闻
@@ -21,31 +57,32 @@ class SearchService:
             limit: 返回数量
         
         Returns:
-            新闻列表
+            新闻列表（未配置 NEWSAPI_KEY 时为空）
         """
-        try:
+        if not settings.NEWSAPI_KEY:
+            return []
+        
+        async def fetch() -> List[str]:
             # 使用免费的新闻API
-            url = "https://newsapi.org/v2/everything"
-            params = {
+            data = await self._get_json("https://newsapi.org/v2/everything", {
                 "q": query,
                 "sortBy": "publishedAt",
                 "pageSize": limit,
                 "language": "zh",
-                "apiKey": "your-newsapi-key"  # 需要申请
-            }
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, params=params) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        articles = data.get("articles", [])
-                        return [
-                            f"{article['title']} - {article['publishedAt']}"
-                            for article in articles
-                        ]
-            
-            return []
-            
+                "apiKey": settings.NEWSAPI_KEY
+            })
+            if not data:
+                return []
+            return [
+                f"{article['title']} - {article['publishedAt']}"
+                for article in data.get("articles", [])
+            ]
+        
+        try:
+            return await redis_client.get_or_load(
+                'search', f"search:news:{query}:{limit}", fetch, ttl=settings.SEARCH_CACHE_TTL['news']
+            )
+        
         except Exception as e:
             logger.error(f"Search news failed: {e}")
             return []
@@ -56,34 +93,35 @@ class SearchService:
         
         使用CoinGecko等免费API
         """
-        try:
-            # CoinGecko API（免费，无需密钥）
-            coin_id = symbol.split("/")[0].lower()
-            url = f"https://api.coingecko.com/api/v3/coins/{coin_id}"
+        # CoinGecko API（免费，无需密钥）
+        coin_id = symbol.split("/")[0].lower()
+        
+        async def fetch() -> List[str]:
+            data = await self._get_json(f"https://api.coingecko.com/api/v3/coins/{coin_id}")
+            if not data:
+                return []
             
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        
-                        news = []
-                        
-                        # 获取市场情绪
-                        sentiment = data.get("sentiment_votes_up_percentage", 0)
-                        news.append(f"市场情绪：{sentiment}%看涨")
-                        
-                        # 获取价格变化
-                        price_change = data.get("market_data", {}).get("price_change_percentage_24h", 0)
-                        news.append(f"24小时涨跌：{price_change:.2f}%")
-                        
-                        # 获取市值排名
-                        rank = data.get("market_cap_rank", 0)
-                        news.append(f"市值排名：第{rank}位")
-                        
-                        return news
+            news = []
             
-            return []
+            # 获取市场情绪
+            sentiment = data.get("sentiment_votes_up_percentage", 0)
+            news.append(f"市场情绪：{sentiment}%看涨")
+            
+            # 获取价格变化
+            price_change = data.get("market_data", {}).get("price_change_percentage_24h", 0)
+            news.append(f"24小时涨跌：{price_change:.2f}%")
+            
+            # 获取市值排名
+            rank = data.get("market_cap_rank", 0)
+            news.append(f"市值排名：第{rank}位")
             
+            return news
+        
+        try:
+            return await redis_client.get_or_load(
+                'search', f"search:crypto_news:{coin_id}", fetch, ttl=settings.SEARCH_CACHE_TTL['crypto_news']
+            )
+        
         except Exception as e:
             logger.error(f"Search crypto news failed: {e}")
             return []
@@ -92,26 +130,26 @@ class SearchService:
         """
         获取市场情绪指标
         
-        使用Fear & Greed Index等
+        使用Fear & Greed Index等（每日更新一次，与交易对无关）
         """
-        try:
+        async def fetch() -> Dict[str, Any]:
             # Alternative.me Fear & Greed Index（免费）
-            url = "https://api.alternative.me/fng/"
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        fng_data = data.get("data", [{}])[0]
-                        
-                        return {
-                            "fear_greed_index": fng_data.get("value"),
-                            "classification": fng_data.get("value_classification"),
-                            "timestamp": fng_data.get("timestamp")
-                        }
-            
-            return {}
+            data = await self._get_json("https://api.alternative.me/fng/")
+            if not data:
+                return {}
+            fng_data = data.get("data", [{}])[0]
             
+            return {
+                "fear_greed_index": fng_data.get("value"),
+                "classification": fng_data.get("value_classification"),
+                "timestamp": fng_data.get("timestamp")
+            }
+        
+        try:
+            return await redis_client.get_or_load(
+                'search', "search:sentiment:fng", fetch, ttl=settings.SEARCH_CACHE_TTL['sentiment']
+            )
+        
         except Exception as e:
             logger.error(f"Get market sentiment failed: {e}")
             return {}
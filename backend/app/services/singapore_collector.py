@@ -6,6 +6,8 @@ from datetime import datetime
 from typing import List, Dict, Any
 from loguru import logger
 
+from app.core.executor import blocking_executor
+
 
 class SingaporeStockCollector:
     """
@@ -38,14 +40,21 @@ class SingaporeStockCollector:
     ]
     
     def __init__(self):
-        """初始化新加坡股市采集器"""
-        try:
-            import yfinance as yf
-            self.yf = yf
-            logger.info("Singapore Stock Collector initialized")
-        except ImportError:
-            logger.warning("yfinance not installed")
-            self.yf = None
+        """初始化新加坡股市采集器（yfinance 在首次使用时导入）"""
+        self._yf = None
+    
+    @property
+    def yf(self):
+        """yfinance 模块（未安装时为 None）"""
+        if self._yf is None:
+            try:
+                import yfinance as yf
+                self._yf = yf
+                logger.info("Singapore Stock Collector initialized")
+            except ImportError:
+                logger.warning("yfinance not installed")
+                self._yf = False
+        return self._yf or None
     
     async def fetch_stock_data(
         self,
@@ -74,11 +83,9 @@ class SingaporeStockCollector:
             if not symbol.endswith('.SI'):
                 symbol = f"{symbol}.SI"
             
-            ticker = self.yf.Ticker(symbol)
-            df = ticker.history(
-                start=start_date,
-                end=end_date,
-                interval=interval
+            df = await blocking_executor.run(
+                'yfinance',
+                lambda: self.yf.Ticker(symbol).history(start=start_date, end=end_date, interval=interval)
             )
             
             logger.info(f"Fetched {len(df)} rows for {symbol} (Singapore)")
@@ -0,0 +1,406 @@
+"""
+流式回测
+从数据库分块读取K线（服务端游标），权益曲线和成交记录边算边写出，内存占用不随回测长度增长
+"""
+import math
+import os
+import shutil
+import tempfile
+from collections import deque
+from datetime import datetime
+from typing import Dict, Any, List, Optional, AsyncIterator, Union
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.market import Kline
+from app.services.backtest import BacktestEngine, BarFeed, BAR_FIELDS
+from app.services.result_store import (
+    downsample_indices, encode_equity_curve, encode_trades, pack_delta_encoded, summarize_arrays
+)
+from app.strategies.base import BaseStrategy
+
+
+async def stream_kline_chunks(
+    db: AsyncSession,
+    exchange: str,
+    symbol: str,
+    interval: str,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    chunk_size: int = 50000
+) -> AsyncIterator[pd.DataFrame]:
+    """
+    分块读取K线
+    
+    按 idx_kline_lookup (exchange, symbol, interval, timestamp) 顺序扫描，
+    通过服务端游标每次只取 chunk_size 行。
+    
+    Args:
+        db: 数据库会话
+        exchange: 交易所名称
+        symbol: 交易对
+        interval: 时间间隔
+        start_time: 开始时间
+        end_time: 结束时间
+        chunk_size: 每块行数
+    
+    Yields:
+        按时间升序的 DataFrame（timestamp, open, high, low, close, volume）
+    """
+    query = select(
+        Kline.timestamp, Kline.open, Kline.high, Kline.low, Kline.close, Kline.volume
+    ).where(
+        Kline.exchange == exchange,
+        Kline.symbol == symbol,
+        Kline.interval == interval
+    )
+    if start_time:
+        query = query.where(Kline.timestamp >= start_time)
+    if end_time:
+        query = query.where(Kline.timestamp <= end_time)
+    query = query.order_by(Kline.timestamp).execution_options(yield_per=chunk_size)
+    
+    result = await db.stream(query)
+    async for rows in result.partitions(chunk_size):
+        yield pd.DataFrame(rows, columns=list(BAR_FIELDS))
+
+
+async def dataframe_chunks(data: pd.DataFrame, chunk_size: int = 50000) -> AsyncIterator[pd.DataFrame]:
+    """将内存中的 DataFrame 按块输出（与 stream_kline_chunks 接口一致）"""
+    for start in range(0, len(data), chunk_size):
+        yield data.iloc[start:start + chunk_size]
+
+
+class CsvResultWriter:
+    """
+    回测结果写出器
+    
+    每处理完一块K线就把该块的权益曲线和新成交追加到 CSV 文件。
+    """
+    
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.equity_path = os.path.join(directory, 'equity_curve.csv')
+        self.trades_path = os.path.join(directory, 'trades.csv')
+        self._equity_header = True
+        self._trades_header = True
+    
+    def write_equity(self, timestamps: pd.Index, equity: np.ndarray):
+        """追加权益曲线"""
+        pd.DataFrame({'timestamp': timestamps, 'equity': equity}).to_csv(
+            self.equity_path, mode='w' if self._equity_header else 'a',
+            header=self._equity_header, index=False
+        )
+        self._equity_header = False
+    
+    def write_trades(self, trades: List[Dict[str, Any]]):
+        """追加成交记录"""
+        if not trades:
+            return
+        pd.DataFrame(trades).to_csv(
+            self.trades_path, mode='w' if self._trades_header else 'a',
+            header=self._trades_header, index=False
+        )
+        self._trades_header = False
+    
+    def close(self):
+        pass
+    
+    def outputs(self) -> Dict[str, Any]:
+        """写出结果的位置（合并到回测指标中）"""
+        return {'equity_curve': self.equity_path, 'trades': self.trades_path}
+
+
+class SpoolResultWriter:
+    """
+    磁盘暂存结果写出器（回测任务使用）
+    
+    每块的权益曲线和成交按列追加到临时目录中的二进制文件（时间戳写入差分值，与 result_store 的存储格式一致），
+    内存中只保留当前块和每块降采样后的预览候选点；回测结束后以 memmap 打开暂存文件，
+    由 result_store 分块压缩打包，全程不把整条权益曲线或全部成交载入内存。
+    成交只暂存单标的的列（流式回测的成交不带 symbol）。
+    """
+    
+    EQUITY_COLUMNS = {'timestamp': np.int64, 'equity': np.float64}
+    TRADE_COLUMNS = {
+        'timestamp': np.int64, 'side': np.int8, 'price': np.float64, 'amount': np.float64, 'commission': np.float64
+    }
+    
+    def __init__(self, directory: Optional[str] = None, preview_points: int = 200):
+        self._owns_directory = directory is None
+        self.directory = directory or tempfile.mkdtemp(prefix='backtest_')
+        os.makedirs(self.directory, exist_ok=True)
+        self.preview_points = preview_points
+        self.equity_points = 0
+        self.trade_count = 0
+        self._last_timestamp = {'equity': np.int64(0), 'trades': np.int64(0)}
+        self._files = {
+            (group, name): open(self._path(group, name), 'wb')
+            for group, columns in (('equity', self.EQUITY_COLUMNS), ('trades', self.TRADE_COLUMNS))
+            for name in columns
+        }
+        self._preview_timestamps: List[np.ndarray] = []
+        self._preview_equity: List[np.ndarray] = []
+    
+    def _path(self, group: str, name: str) -> str:
+        return os.path.join(self.directory, f'{group}_{name}.bin')
+    
+    def _append(self, group: str, arrays: Dict[str, np.ndarray]):
+        """追加一块列数组，时间戳转为与上一块末尾的差分"""
+        timestamps = arrays['timestamp']
+        if len(timestamps):
+            arrays = {**arrays, 'timestamp': np.diff(timestamps, prepend=self._last_timestamp[group])}
+            self._last_timestamp[group] = timestamps[-1]
+        columns = self.EQUITY_COLUMNS if group == 'equity' else self.TRADE_COLUMNS
+        for name, dtype in columns.items():
+            np.asarray(arrays[name], dtype=dtype).tofile(self._files[(group, name)])
+    
+    def write_equity(self, timestamps: pd.Index, equity: np.ndarray):
+        """追加权益曲线，并保留本块的预览候选点（每块的最高/最低点）"""
+        arrays = encode_equity_curve(timestamps, equity)
+        self._append('equity', arrays)
+        self.equity_points += len(equity)
+        keep = downsample_indices(arrays['equity'], self.preview_points)
+        self._preview_timestamps.append(arrays['timestamp'][keep])
+        self._preview_equity.append(arrays['equity'][keep])
+    
+    def write_trades(self, trades: List[Dict[str, Any]]):
+        """追加成交记录"""
+        if not trades:
+            return
+        self._append('trades', encode_trades(trades))
+        self.trade_count += len(trades)
+    
+    def close(self):
+        for handle in self._files.values():
+            handle.close()
+    
+    def _load(self, group: str) -> Dict[str, np.ndarray]:
+        columns = self.EQUITY_COLUMNS if group == 'equity' else self.TRADE_COLUMNS
+        count = self.equity_points if group == 'equity' else self.trade_count
+        return {
+            name: np.memmap(self._path(group, name), dtype=dtype, mode='r') if count else np.empty(0, dtype=dtype)
+            for name, dtype in columns.items()
+        }
+    
+    def pack_equity_curve(self) -> bytes:
+        """打包暂存的权益曲线（格式同 result_store.pack_equity_curve）"""
+        return pack_delta_encoded(self._load('equity'))
+    
+    def pack_trades(self) -> bytes:
+        """打包暂存的成交记录（格式同 result_store.pack_trades）"""
+        return pack_delta_encoded(self._load('trades'))
+    
+    def summary(self, bars: int) -> Dict[str, Any]:
+        """结果摘要（格式同 result_store.summarize_result）"""
+        if not self._preview_equity:
+            return summarize_arrays(bars, 0, self.trade_count, None, None, self.preview_points)
+        return summarize_arrays(
+            bars, self.equity_points, self.trade_count,
+            np.concatenate(self._preview_timestamps), np.concatenate(self._preview_equity),
+            self.preview_points
+        )
+    
+    def cleanup(self):
+        """删除暂存文件（目录由写出器创建时连同目录删除）"""
+        self.close()
+        if self._owns_directory:
+            shutil.rmtree(self.directory, ignore_errors=True)
+        else:
+            for path in (self._path(group, name) for group, name in self._files):
+                if os.path.exists(path):
+                    os.remove(path)
+    
+    def outputs(self) -> Dict[str, Any]:
+        return {'result_directory': self.directory}
+
+
+class TradeHistory:
+    """
+    流式回测中策略可见的成交记录
+    
+    替代策略的 trades 列表：len() 为累计成交数，[-1] 等负下标、迭代只覆盖最近 maxlen 条，
+    保留的范围只取决于成交条数，与分块位置无关；更早的成交已交给写出器，不在内存中保留。
+    """
+    
+    def __init__(self, maxlen: int = 1000):
+        self._recent: deque = deque(maxlen=maxlen)
+        self.count = 0
+    
+    def append(self, trade: Dict[str, Any]):
+        self._recent.append(trade)
+        self.count += 1
+    
+    def __len__(self) -> int:
+        return self.count
+    
+    def __bool__(self) -> bool:
+        return self.count > 0
+    
+    def __iter__(self):
+        return iter(self._recent)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self._recent)[index]
+        if index >= 0:
+            index -= self.count - len(self._recent)
+            if index < 0:
+                raise IndexError("trade is no longer retained in streaming backtest")
+        return self._recent[index]
+
+
+class RunningMetrics:
+    """
+    增量回测指标
+    
+    收益率均值/方差用 Welford 算法累积，最大回撤跟踪历史峰值，
+    结果与 BacktestEngine._calculate_metrics 对整条权益曲线的计算一致。
+    """
+    
+    def __init__(self):
+        self.count = 0
+        self.last_equity: Optional[float] = None
+        self.peak = -math.inf
+        self.max_drawdown = 0.0
+        self._n = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+    
+    def update(self, equity: np.ndarray):
+        """加入一段权益曲线"""
+        if len(equity) == 0:
+            return
+        
+        # 收益率（包含与上一段末尾之间的收益）
+        series = equity if self.last_equity is None else np.concatenate(([self.last_equity], equity))
+        self._merge_returns(series[1:] / series[:-1] - 1)
+        
+        # 回撤
+        peaks = np.maximum.accumulate(np.maximum(equity, self.peak))
+        self.max_drawdown = min(self.max_drawdown, float(((equity - peaks) / peaks).min()))
+        self.peak = float(peaks[-1])
+        
+        self.count += len(equity)
+        self.last_equity = float(equity[-1])
+    
+    def _merge_returns(self, returns: np.ndarray):
+        """合并一批收益率的均值与平方差和（并行 Welford）"""
+        n = len(returns)
+        if n == 0:
+            return
+        mean = float(returns.mean())
+        m2 = float(((returns - mean) ** 2).sum())
+        total = self._n + n
+        delta = mean - self._mean
+        self._mean += delta * n / total
+        self._m2 += m2 + delta ** 2 * self._n * n / total
+        self._n = total
+    
+    @property
+    def sharpe_ratio(self) -> float:
+        if self._n < 2:
+            return float('nan')
+        std = math.sqrt(self._m2 / (self._n - 1))
+        if std == 0:
+            return 0.0
+        return self._mean / std * np.sqrt(252)
+
+
+class StreamingBacktestEngine(BacktestEngine):
+    """
+    流式回测引擎
+    
+    按块消费K线（每块构造一次 BarFeed，块内仍逐根回调策略），
+    每块结束后把权益曲线与新成交交给写出器并清空，指标增量累积。
+    策略的 trades 换成 TradeHistory（累计条数 + 最近 trade_history 条）。
+    """
+    
+    def __init__(
+        self,
+        strategy: BaseStrategy,
+        initial_capital: float = 100000.0,
+        commission: float = 0.001,  # 手续费率
+        trade_history: int = 1000  # 策略可见的最近成交条数
+    ):
+        super().__init__(strategy, pd.DataFrame(columns=list(BAR_FIELDS)), initial_capital, commission)
+        history = TradeHistory(trade_history)
+        for trade in strategy.trades:
+            history.append(trade)
+        strategy.trades = history
+        self.metrics = RunningMetrics()
+        self.total_trades = 0
+        self.sell_trades = 0
+    
+    async def run_stream(
+        self,
+        chunks: AsyncIterator[pd.DataFrame],
+        writer: Union[CsvResultWriter, SpoolResultWriter],
+        total_bars: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        运行流式回测
+        
+        Args:
+            chunks: K线数据块（stream_kline_chunks 或 dataframe_chunks）
+            writer: 结果写出器
+            total_bars: 预计的K线总数（用于进度回调，默认按已处理的条数）
+        
+        Returns:
+            回测指标；equity_curve 和 trades 由写出器给出
+            （CsvResultWriter 为文件路径；SpoolResultWriter 为暂存目录，结果由写出器打包）
+        """
+        try:
+            async for chunk in chunks:
+                if chunk.empty:
+                    continue
+                feed = BarFeed(chunk)
+                equity = self._run_feed(
+                    feed, progress_offset=self.metrics.count,
+                    progress_total=max(total_bars or 0, self.metrics.count + len(feed))
+                )
+                
+                self.metrics.update(equity)
+                writer.write_equity(feed.timestamp, equity)
+                self._flush_trades(writer)
+                logger.debug(f"Streaming backtest processed {self.metrics.count} bars")
+        finally:
+            writer.close()
+        
+        return self._streaming_metrics(writer)
+    
+    def _flush_trades(self, writer: Union[CsvResultWriter, SpoolResultWriter]):
+        """写出并清空引擎中本块的成交记录（策略的 TradeHistory 保留），丢弃已结束的订单"""
+        self.total_trades += len(self.trades)
+        self.sell_trades += sum(1 for trade in self.trades if trade['side'] == 'sell')
+        writer.write_trades(self.trades)
+        self.trades = []
+        self.order_book.history.clear()
+        
+        # 已进入订单簿的订单只保留仍在等待成交的部分
+        orders = self.strategy.orders
+        live = [order for order in orders[:self._order_cursor] if order['status'] == 'pending']
+        orders[:self._order_cursor] = live
+        self._order_cursor = len(live)
+    
+    def _streaming_metrics(self, writer: Union[CsvResultWriter, SpoolResultWriter]) -> Dict[str, Any]:
+        """汇总增量指标"""
+        if self.metrics.count == 0:
+            return {}
+        
+        final_equity = self.metrics.last_equity
+        return {
+            'initial_capital': self.initial_capital,
+            'final_capital': final_equity,
+            'total_return': (final_equity - self.initial_capital) / self.initial_capital,
+            'sharpe_ratio': self.metrics.sharpe_ratio,
+            'max_drawdown': self.metrics.max_drawdown,
+            'win_rate': 0.5 if self.sell_trades > 0 else 0.0,  # 与 BacktestEngine 相同的简化计算
+            'total_trades': self.total_trades,
+            'bars': self.metrics.count,
+            **writer.outputs()
+        }
@@ -0,0 +1,225 @@
+"""
+交易对注册表
+每个交易所的市场列表只加载一次，按计价货币、基础货币、市场类型建立索引，支持前缀/模糊搜索；
+快照持久化到本地文件，冷启动时先读快照，后台定时从交易所刷新
+"""
+import asyncio
+import bisect
+import difflib
+import json
+import os
+import time
+from typing import Dict, Any, List, Optional, Set
+
+from loguru import logger
+
+from app.core.config import settings
+from app.core.executor import blocking_executor
+
+
+def _search_key(text: str) -> str:
+    """搜索用的归一化键：大写、去掉分隔符（btc-usdt、BTC/USDT、btcusdt 相同）"""
+    return ''.join(ch for ch in text.upper() if ch.isalnum())
+
+
+class SymbolIndex:
+    """
+    单个交易所的交易对索引
+    
+    按计价货币、基础货币、市场类型分别建立 {值: 交易对集合}，单条件过滤为一次字典查找，
+    多条件时从最小的集合开始求交集；搜索键排序后二分查找前缀。
+    """
+    
+    def __init__(self, markets: List[Dict[str, Any]], loaded_at: float):
+        self.markets = {market['symbol']: market for market in markets}
+        self.loaded_at = loaded_at
+        self.symbols = sorted(self.markets)
+        self.by_quote: Dict[str, Set[str]] = {}
+        self.by_base: Dict[str, Set[str]] = {}
+        self.by_type: Dict[str, Set[str]] = {}
+        keys = []
+        for market in markets:
+            symbol = market['symbol']
+            self.by_quote.setdefault(market['quote'], set()).add(symbol)
+            self.by_base.setdefault(market['base'], set()).add(symbol)
+            self.by_type.setdefault(market['type'], set()).add(symbol)
+            keys.append((_search_key(symbol), symbol))
+            keys.append((_search_key(market['base']), symbol))
+        keys.sort()
+        self._keys = [key for key, _ in keys]
+        self._key_symbols = [symbol for _, symbol in keys]
+    
+    def filter(
+        self,
+        quote: Optional[str] = None,
+        base: Optional[str] = None,
+        market_type: Optional[str] = None,
+        active_only: bool = True
+    ) -> List[str]:
+        """按条件过滤交易对（条件为空表示不限），按交易对排序"""
+        candidates = [
+            index.get(value.upper() if index is not self.by_type else value.lower(), set())
+            for index, value in ((self.by_quote, quote), (self.by_base, base), (self.by_type, market_type))
+            if value
+        ]
+        if candidates:
+            candidates.sort(key=len)
+            matched = candidates[0].intersection(*candidates[1:])
+        else:
+            matched = self.markets
+        if active_only:
+            matched = [symbol for symbol in matched if self.markets[symbol]['active']]
+        return sorted(matched)
+    
+    def search(self, query: str, limit: int = 20) -> List[str]:
+        """前缀匹配（交易对或基础货币），不足 limit 条时补充模糊匹配"""
+        key = _search_key(query)
+        if not key:
+            return []
+        results: Dict[str, None] = {}
+        position = bisect.bisect_left(self._keys, key)
+        while position < len(self._keys) and self._keys[position].startswith(key) and len(results) < limit:
+            results.setdefault(self._key_symbols[position])
+            position += 1
+        if len(results) < limit:
+            for match in difflib.get_close_matches(key, self._keys, n=limit * 2, cutoff=0.6):
+                position = bisect.bisect_left(self._keys, match)
+                results.setdefault(self._key_symbols[position])
+                if len(results) >= limit:
+                    break
+        return list(results)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {'loaded_at': self.loaded_at, 'markets': list(self.markets.values())}
+
+
+class SymbolRegistry:
+    """
+    交易对注册表
+    
+    - get()：优先返回内存中的索引；没有时读取本地快照，仍没有则从交易所加载（同一交易所的并发加载只执行一次）。
+    - start()：启动后台任务，每 refresh_interval 秒从交易所刷新所有已配置的交易所，并写回快照。
+    
+    Examples:
+        index = await symbol_registry.get('binance_public')
+        usdt_spot = index.filter(quote='USDT', market_type='spot')
+        matches = index.search('eth')
+    """
+    
+    def __init__(self, root: Optional[str] = None, refresh_interval: Optional[float] = None):
+        self.root = root or settings.SYMBOL_REGISTRY_PATH
+        self.refresh_interval = refresh_interval or settings.SYMBOL_REFRESH_INTERVAL
+        self._indexes: Dict[str, SymbolIndex] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._task: Optional[asyncio.Task] = None
+    
+    def snapshot_path(self, exchange: str) -> str:
+        return os.path.join(self.root, f"{exchange}.json")
+    
+    def _read_snapshot(self, exchange: str) -> Optional[Dict[str, Any]]:
+        path = self.snapshot_path(exchange)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    def _write_snapshot(self, exchange: str, data: Dict[str, Any]):
+        os.makedirs(self.root, exist_ok=True)
+        path = self.snapshot_path(exchange)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    
+    async def _fetch_markets(self, exchange: str) -> List[Dict[str, Any]]:
+        """从交易所加载市场列表（强制重新加载，不使用 ccxt 实例上的缓存）"""
+        from app.services.data_collector import data_collector
+        
+        client = data_collector.get_exchange(exchange)
+        if not client:
+            raise ValueError(f"Exchange {exchange} not found")
+        markets = await blocking_executor.run('ccxt', client.load_markets, True)
+        return [
+            {
+                'symbol': market['symbol'],
+                'base': market.get('base') or '',
+                'quote': market.get('quote') or '',
+                'type': market.get('type') or 'spot',
+                'active': market.get('active') is not False,
+            }
+            for market in markets.values()
+        ]
+    
+    async def refresh(self, exchange: str) -> SymbolIndex:
+        """从交易所重新加载并更新索引与快照"""
+        started = time.perf_counter()
+        index = SymbolIndex(await self._fetch_markets(exchange), time.time())
+        self._indexes[exchange] = index
+        try:
+            await blocking_executor.run('symbol_registry', self._write_snapshot, exchange, index.to_dict())
+        except Exception as e:
+            logger.warning(f"Failed to persist symbol snapshot for {exchange}: {e}")
+        logger.info(
+            f"Loaded {len(index.markets)} markets from {exchange} in {time.perf_counter() - started:.1f}s"
+        )
+        return index
+    
+    async def get(self, exchange: str) -> SymbolIndex:
+        """
+        获取交易所的交易对索引
+        
+        Raises:
+            ValueError: 交易所不存在
+        """
+        index = self._indexes.get(exchange)
+        if index is not None:
+            return index
+        
+        lock = self._locks.setdefault(exchange, asyncio.Lock())
+        async with lock:
+            if exchange in self._indexes:
+                return self._indexes[exchange]
+            try:
+                snapshot = await blocking_executor.run('symbol_registry', self._read_snapshot, exchange)
+            except Exception as e:
+                logger.warning(f"Failed to read symbol snapshot for {exchange}: {e}")
+                snapshot = None
+            if snapshot:
+                index = SymbolIndex(snapshot['markets'], snapshot['loaded_at'])
+                self._indexes[exchange] = index
+                return index
+            return await self.refresh(exchange)
+    
+    async def _refresh_loop(self):
+        from app.services.data_collector import data_collector
+        
+        while True:
+            for exchange in data_collector.exchange_names:
+                index = self._indexes.get(exchange)
+                if index is not None and time.time() - index.loaded_at < self.refresh_interval:
+                    continue
+                try:
+                    if index is None:
+                        index = await self.get(exchange)
+                    if time.time() - index.loaded_at >= self.refresh_interval:
+                        await self.refresh(exchange)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Failed to refresh symbols for {exchange}: {e}")
+            await asyncio.sleep(min(self.refresh_interval, 600))
+    
+    def start(self):
+        """启动后台刷新任务（应用启动时调用）"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._refresh_loop())
+    
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+# 全局交易对注册表实例
+symbol_registry = SymbolRegistry()
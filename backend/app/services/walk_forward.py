@@ -0,0 +1,313 @@
+"""
+滚动前推（walk-forward）回测
+在第 N 个窗口上做参数优化，用最优参数在第 N+1 个窗口上做样本外测试，然后向前滚动；
+各折在独立的工作进程中并行执行，样本外权益曲线拼接为一条连续曲线
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple, Type
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from app.services import optimizer as optimizer_module
+from app.services.backtest import BacktestEngine
+from app.services.optimizer import (
+    ParameterOptimizer, SharedBars, OPTIMIZATION_TARGETS, RESULT_METRICS, expand_grid
+)
+from app.strategies.base import BaseStrategy
+
+
+# (样本内起点, 样本内终点, 样本外起点, 样本外终点)，左闭右开的行号区间
+Fold = Tuple[int, int, int, int]
+
+
+def split_folds(
+    length: int,
+    train_size: int,
+    test_size: int,
+    step: Optional[int] = None,
+    anchored: bool = False
+) -> List[Fold]:
+    """
+    划分滚动窗口
+    
+    Args:
+        length: K线总数
+        train_size: 样本内窗口长度
+        test_size: 样本外窗口长度
+        step: 每次前推的K线数（默认等于 test_size，样本外窗口首尾相接；
+            不能小于 test_size，否则相邻折的样本外窗口重叠，拼接后同一K线被计入两次）
+        anchored: 是否锚定起点（样本内窗口从头开始逐步扩大）
+    
+    Returns:
+        各折的行号区间
+    """
+    if train_size <= 0 or test_size <= 0:
+        raise ValueError("train_size and test_size must be positive")
+    step = step or test_size
+    if step < test_size:
+        raise ValueError(f"step ({step}) must not be smaller than test_size ({test_size})")
+    
+    folds = []
+    train_start = 0
+    while True:
+        train_end = train_start + train_size
+        test_end = train_end + test_size
+        if test_end > length:
+            break
+        folds.append((0 if anchored else train_start, train_end, train_end, test_end))
+        train_start += step
+    return folds
+
+
+def stitch_equity(curves: List[pd.DataFrame], initial_capital: float) -> pd.DataFrame:
+    """
+    拼接样本外权益曲线
+    
+    每折的样本外回测都从 initial_capital 开始，按上一折的期末权益等比缩放后首尾相接，
+    相当于把资金连续滚入下一折。
+    """
+    pieces = []
+    capital = initial_capital
+    for curve in curves:
+        if curve.empty:
+            continue
+        scaled = curve['equity'].to_numpy(dtype=float) * (capital / initial_capital)
+        pieces.append(pd.DataFrame({'timestamp': curve['timestamp'].to_numpy(), 'equity': scaled}))
+        capital = scaled[-1]
+    if not pieces:
+        return pd.DataFrame(columns=['timestamp', 'equity'])
+    return pd.concat(pieces, ignore_index=True)
+
+
+def equity_metrics(equity: np.ndarray, initial_capital: float) -> Dict[str, Any]:
+    """权益曲线的收益、夏普与最大回撤（与 BacktestEngine 的计算口径一致）"""
+    if len(equity) == 0:
+        return {}
+    returns = pd.Series(equity).pct_change()
+    std = returns.std()
+    peaks = np.maximum.accumulate(equity)
+    return {
+        'initial_capital': initial_capital,
+        'final_capital': float(equity[-1]),
+        'total_return': (float(equity[-1]) - initial_capital) / initial_capital,
+        'sharpe_ratio': float(returns.mean() / std * np.sqrt(252)) if std != 0 else 0.0,
+        'max_drawdown': float(((equity - peaks) / peaks).min()),
+    }
+
+
+def _run_fold(
+    strategy_class: Type[BaseStrategy],
+    param_sets: List[Dict[str, Any]],
+    data: pd.DataFrame,
+    fold: Fold,
+    target: str,
+    initial_capital: float,
+    commission: float,
+    vectorized: bool
+) -> Dict[str, Any]:
+    """
+    样本内参数扫描 + 样本外测试（单折，在一个进程内串行执行）
+    
+    样本外回测从样本外起点之前 strategy.warmup_bars 根K线开始预热（取自样本内窗口），
+    权益、成交和指标只从样本外起点计算，避免每折开头因指标未就绪而空仓。
+    """
+    train_start, train_end, test_start, test_end = fold
+    train = data.iloc[train_start:train_end]
+    result = {
+        'fold': fold, 'params': None, 'in_sample': None, 'out_of_sample': None,
+        'equity_curve': pd.DataFrame(columns=['timestamp', 'equity']), 'error': None,
+    }
+    
+    sweep = ParameterOptimizer(
+        strategy_class, train,
+        initial_capital=initial_capital, commission=commission,
+        vectorized=vectorized, max_workers=1
+    )
+    table = sweep.run(param_sets, target)
+    valid = table[table['error'].isna()] if 'error' in table else table
+    if valid.empty:
+        result['error'] = 'All parameter sets failed'
+        return result
+    
+    best = valid.iloc[0]
+    result['params'] = params = {name: _python_value(best[name]) for name in param_sets[0].keys()}
+    result['in_sample'] = {key: _python_value(best[key]) for key in RESULT_METRICS}
+    
+    try:
+        strategy = strategy_class(dict(params))
+        warm_start = max(test_start - strategy.warmup_bars, 0)
+        engine = BacktestEngine(
+            strategy, data.iloc[warm_start:test_end].reset_index(drop=True),
+            initial_capital=initial_capital, commission=commission
+        )
+        warmup = test_start - warm_start
+        metrics = engine.run_vectorized(warmup) if vectorized else engine.run(warmup)
+    except Exception as e:
+        result['error'] = str(e)
+        return result
+    
+    result['out_of_sample'] = {key: metrics.get(key) for key in RESULT_METRICS}
+    result['equity_curve'] = engine.equity_curve
+    return result
+
+
+def _run_fold_task(task: Tuple[Any, ...]) -> Dict[str, Any]:
+    """工作进程任务入口（K线数据在进程初始化时从共享内存挂载）"""
+    strategy_class, param_sets, fold, target, initial_capital, commission, vectorized = task
+    return _run_fold(
+        strategy_class, param_sets, optimizer_module._worker_data, fold,
+        target, initial_capital, commission, vectorized
+    )
+
+
+def _python_value(value: Any) -> Any:
+    """numpy 标量转为 Python 原生类型"""
+    return value.item() if isinstance(value, np.generic) else value
+
+
+class WalkForwardRunner:
+    """
+    滚动前推回测
+    
+    每折在一个工作进程中完成样本内网格搜索和样本外测试，各折之间并行；
+    K线数据放入共享内存，工作进程只挂载一次。
+    
+    Examples:
+        runner = WalkForwardRunner(MAStrategy, df)
+        report = runner.run(
+            {'short_period': [5, 10, 20], 'long_period': [30, 60, 120]},
+            train_size=2000, test_size=500
+        )
+        report['equity_curve']  # 拼接后的样本外权益曲线
+        report['folds']         # 各折最优参数与样本内/样本外指标
+    """
+    
+    def __init__(
+        self,
+        strategy_class: Type[BaseStrategy],
+        data: pd.DataFrame,
+        initial_capital: float = 100000.0,
+        commission: float = 0.001,
+        vectorized: Optional[bool] = None,
+        max_workers: Optional[int] = None
+    ):
+        self.strategy_class = strategy_class
+        self.data = data.reset_index(drop=True)
+        self.initial_capital = initial_capital
+        self.commission = commission
+        # 默认：策略实现了 generate_signals 时用向量化回测（指标经 indicator_cache 复用）
+        self.vectorized = strategy_class.supports_vectorized() if vectorized is None else vectorized
+        self.max_workers = max_workers or os.cpu_count() or 1
+    
+    def run(
+        self,
+        param_grid: Dict[str, List[Any]],
+        train_size: int,
+        test_size: int,
+        step: Optional[int] = None,
+        anchored: bool = False,
+        target: str = 'sharpe_ratio'
+    ) -> Dict[str, Any]:
+        """
+        运行滚动前推回测
+        
+        Args:
+            param_grid: 参数候选值 {"param_name": [v1, v2, ...]}
+            train_size: 样本内窗口K线数
+            test_size: 样本外窗口K线数
+            step: 每次前推的K线数（默认等于 test_size）
+            anchored: 是否锚定起点
+            target: 样本内优化目标
+        
+        Returns:
+            {"folds": 各折统计, "equity_curve": 拼接的样本外权益曲线, "metrics": 样本外整体指标, "report": 运行汇总}
+        """
+        if target not in OPTIMIZATION_TARGETS:
+            raise ValueError(f"Unsupported optimization target: {target}")
+        param_sets = expand_grid(param_grid)
+        if not param_sets:
+            raise ValueError("param_grid is empty")
+        folds = split_folds(len(self.data), train_size, test_size, step, anchored)
+        if not folds:
+            raise ValueError(
+                f"Not enough data for one fold: {len(self.data)} bars < {train_size} + {test_size}"
+            )
+        
+        started = time.perf_counter()
+        workers = min(self.max_workers, len(folds))
+        logger.info(
+            f"Walk-forward {self.strategy_class.__name__}: {len(folds)} folds x "
+            f"{len(param_sets)} parameter sets, {workers} workers"
+        )
+        
+        if workers == 1:
+            results = [
+                _run_fold(
+                    self.strategy_class, param_sets, self.data, fold, target,
+                    self.initial_capital, self.commission, self.vectorized
+                )
+                for fold in folds
+            ]
+        else:
+            tasks = [
+                (self.strategy_class, param_sets, fold, target,
+                 self.initial_capital, self.commission, self.vectorized)
+                for fold in folds
+            ]
+            shared = SharedBars(self.data)
+            try:
+                with ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=optimizer_module.process_pool_context(),
+                    initializer=optimizer_module._init_worker,
+                    initargs=(shared.spec,)
+                ) as executor:
+                    results = list(executor.map(_run_fold_task, tasks))
+            finally:
+                shared.close()
+        
+        equity_curve = stitch_equity(
+            [result['equity_curve'] for result in results],
+            self.initial_capital
+        )
+        metrics = equity_metrics(equity_curve['equity'].to_numpy(dtype=float), self.initial_capital)
+        report = {
+            'folds': len(folds),
+            'failed': sum(1 for result in results if result['error']),
+            'param_sets': len(param_sets),
+            'workers': workers,
+            'elapsed_seconds': round(time.perf_counter() - started, 3),
+        }
+        logger.info(f"Walk-forward finished: {report}")
+        
+        return {
+            'folds': [self._fold_stats(i, result) for i, result in enumerate(results)],
+            'equity_curve': equity_curve,
+            'metrics': metrics,
+            'report': report,
+        }
+    
+    def _fold_stats(self, index: int, result: Dict[str, Any]) -> Dict[str, Any]:
+        """单折统计：窗口起止时间、最优参数、样本内与样本外指标"""
+        train_start, train_end, test_start, test_end = result['fold']
+        timestamps = self._timestamps()
+        return {
+            'fold': index,
+            'train_start': timestamps[train_start],
+            'train_end': timestamps[train_end - 1],
+            'test_start': timestamps[test_start],
+            'test_end': timestamps[test_end - 1],
+            'params': result['params'],
+            'in_sample': result['in_sample'],
+            'out_of_sample': result['out_of_sample'],
+            'error': result['error'],
+        }
+    
+    def _timestamps(self) -> pd.Index:
+        if 'timestamp' in self.data.columns:
+            return pd.Index(self.data['timestamp'])
+        return self.data.index
@@ -1,8 +1,14 @@
+import builtins
+import inspect
+from collections import deque
 from abc import ABC, abstractmethod
-from typing import Dict, Any, List
+from typing import Dict, Any, Optional, Type
 from datetime import datetime
+import numpy as np
 import pandas as pd
 
+from app.strategies.indicators import indicator_cache
+
 
 class BaseStrategy(ABC):
     """策略基类"""
@@ -13,8 +19,9 @@ class BaseStrategy(ABC):
         self.orders = []  # 订单列表
         self.trades = []  # 成交记录
         self.capital = self.params.get('initial_capital', 100000.0)
+        self.position_ratio = self.params.get('position_ratio', 0.95)  # 开仓资金比例
         self.current_bar = None
-        
+    
     @abstractmethod
     def on_bar(self, bar: Dict[str, Any]):
         """
@@ -25,6 +32,24 @@ class BaseStrategy(ABC):
         """
         pass
     
+    @property
+    def warmup_bars(self) -> int:
+        """指标所需的最长回看K线数（分段回测时在样本外窗口之前预热），默认不需要预热"""
+        return 0
+    
+    def on_bar_view(self, bar: Any):
+        """
+        数组K线回调（BacktestEngine 事件驱动回测调用）
+        
+        bar 为引擎复用的 BarView，仅在本次回调内有效，支持 bar.close 和
+        bar['close'] 两种访问方式。默认实现转换为字典后调用 on_bar，
+        兼容只实现 on_bar 的旧策略；覆盖此方法可省去每根K线的字典构造。
+        
+        Args:
+            bar: K线视图
+        """
+        self.on_bar(bar.to_dict())
+    
     def on_order(self, order: Dict[str, Any]):
         """订单状态更新回调"""
         pass
@@ -33,7 +58,13 @@ class BaseStrategy(ABC):
         """成交回调"""
         pass
     
-    def buy(self, price: float, amount: float, order_type: str = "market") -> Dict[str, Any]:
+    def buy(
+        self,
+        price: float,
+        amount: float,
+        order_type: str = "market",
+        symbol: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
         买入
         
@@ -41,11 +72,13 @@ class BaseStrategy(ABC):
             price: 价格
             amount: 数量
             order_type: 订单类型 (market/limit)
+            symbol: 交易标的（组合回测使用，默认为当前K线的标的）
         
         Returns:
             订单信息
         """
         order = {
+            "symbol": symbol,
             "side": "buy",
             "price": price,
             "amount": amount,
@@ -56,7 +89,13 @@ class BaseStrategy(ABC):
         self.orders.append(order)
         return order
     
-    def sell(self, price: float, amount: float, order_type: str = "market") -> Dict[str, Any]:
+    def sell(
+        self,
+        price: float,
+        amount: float,
+        order_type: str = "market",
+        symbol: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
         卖出
         
@@ -64,11 +103,13 @@ class BaseStrategy(ABC):
             price: 价格
             amount: 数量
             order_type: 订单类型 (market/limit)
+            symbol: 交易标的（组合回测使用，默认为当前K线的标的）
         
         Returns:
             订单信息
         """
         order = {
+            "symbol": symbol,
             "side": "sell",
             "price": price,
             "amount": amount,
@@ -79,6 +120,22 @@ class BaseStrategy(ABC):
         self.orders.append(order)
         return order
     
+    def cancel_order(self, order: Dict[str, Any]) -> bool:
+        """
+        撤销订单
+        
+        Args:
+            order: buy/sell 返回的订单
+        
+        Returns:
+            是否撤销成功（仅待成交订单可撤销）
+        """
+        if order['status'] != 'pending':
+            return False
+        order['status'] = 'cancelled'
+        self.on_order(order)
+        return True
+    
     def get_position(self, symbol: str = None) -> Dict[str, Any]:
         """获取持仓信息"""
         if symbol:
@@ -100,6 +157,24 @@ class BaseStrategy(ABC):
             添加了指标的DataFrame
         """
         return df
+    
+    def generate_signals(self, df: pd.DataFrame) -> Optional[np.ndarray]:
+        """
+        生成向量化信号（供 BacktestEngine.run_vectorized 使用）
+        
+        Args:
+            df: K线数据DataFrame
+        
+        Returns:
+            与df等长的目标持仓数组：1 持仓，0 空仓，NaN 维持上一状态；
+            返回 None 表示策略不支持向量化回测
+        """
+        return None
+    
+    @classmethod
+    def supports_vectorized(cls) -> bool:
+        """策略是否实现了 generate_signals（参数优化默认据此选择向量化回测）"""
+        return cls.generate_signals is not BaseStrategy.generate_signals
 
 
 class MAStrategy(BaseStrategy):
@@ -111,6 +186,14 @@ class MAStrategy(BaseStrategy):
         self.long_period = self.params.get('long_period', 30)
         self.prices = []
     
+    @property
+    def warmup_bars(self) -> int:
+        return max(self.short_period, self.long_period)
+    
+    def on_bar_view(self, bar: Any):
+        """数组K线回调：只读取收盘价，直接使用视图"""
+        self.on_bar(bar)
+    
     def on_bar(self, bar: Dict[str, Any]):
         """K线回调"""
         self.current_bar = bar
@@ -129,9 +212,143 @@ class MAStrategy(BaseStrategy):
             
             # 金叉买入
             if short_ma > long_ma and not position:
-                amount = self.capital * 0.95 / bar['close']  # 使用95%资金
+                amount = self.capital * self.position_ratio / bar['close']  # 默认使用95%资金
                 self.buy(bar['close'], amount)
             
             # 死叉卖出
             elif short_ma < long_ma and position:
                 self.sell(bar['close'], position.get('amount', 0))
+    
+    def generate_signals(self, df: pd.DataFrame) -> np.ndarray:
+        """向量化信号：金叉持仓，死叉空仓"""
+        close = df['close'].to_numpy(dtype=float)
+        short_ma = indicator_cache.sma(close, self.short_period)
+        long_ma = indicator_cache.sma(close, self.long_period)
+        
+        signals = np.full(len(df), np.nan)
+        signals[short_ma > long_ma] = 1.0
+        signals[short_ma < long_ma] = 0.0
+        return signals
+
+
+class PortfolioMAStrategy(BaseStrategy):
+    """
+    组合移动平均线策略（供 PortfolioBacktestEngine 使用）
+    
+    每个标的独立计算均线：金叉时用当前现金的 allocation 比例买入该标的，死叉时卖出该标的全部持仓。
+    """
+    
+    def __init__(self, params: Dict[str, Any] = None):
+        super().__init__(params)
+        self.short_period = self.params.get('short_period', 10)
+        self.long_period = self.params.get('long_period', 30)
+        self.allocation = self.params.get('allocation', 0.1)  # 每次开仓使用的现金比例
+        self.prices: Dict[str, deque] = {}
+    
+    @property
+    def warmup_bars(self) -> int:
+        return max(self.short_period, self.long_period)
+    
+    def on_bar_view(self, bar: Any):
+        self.on_bar(bar)
+    
+    def on_bar(self, bar: Dict[str, Any]):
+        """K线回调（bar['symbol'] 为当前标的）"""
+        symbol = bar['symbol']
+        prices = self.prices.get(symbol)
+        if prices is None:
+            prices = self.prices[symbol] = deque(maxlen=self.long_period)
+        close = bar['close']
+        prices.append(close)
+        if len(prices) < self.long_period:
+            return
+        
+        window = list(prices)
+        short_ma = sum(window[-self.short_period:]) / self.short_period
+        long_ma = sum(window) / self.long_period
+        position = self.get_position(symbol)
+        
+        if short_ma > long_ma and not position:
+            amount = self.capital * self.allocation / close
+            if amount > 0:
+                self.buy(close, amount, symbol=symbol)
+        elif short_ma < long_ma and position:
+            self.sell(close, position.get('amount', 0), symbol=symbol)
+
+
+# 内置策略（按名称查找策略类，供参数优化等接口使用）
+STRATEGY_CLASSES = {
+    'MAStrategy': MAStrategy,
+}
+
+# 内置组合策略（按名称查找，供组合回测接口使用）
+PORTFOLIO_STRATEGY_CLASSES = {
+    'PortfolioMAStrategy': PortfolioMAStrategy,
+}
+
+
+# 策略代码可用的内置函数
+STRATEGY_BUILTINS = (
+    'abs', 'all', 'any', 'bool', 'dict', 'divmod', 'enumerate', 'filter', 'float', 'getattr',
+    'hasattr', 'int', 'isinstance', 'issubclass', 'iter', 'len', 'list', 'map', 'max', 'min',
+    'next', 'pow', 'print', 'range', 'reversed', 'round', 'set', 'slice', 'sorted', 'str',
+    'sum', 'super', 'tuple', 'zip', 'object', 'property', 'staticmethod', 'classmethod',
+    'None', 'True', 'False', 'Exception', 'ArithmeticError', 'IndexError', 'KeyError',
+    'RuntimeError', 'TypeError', 'ValueError', 'ZeroDivisionError', '__build_class__',
+)
+
+# 策略代码可导入的模块（含子模块）
+STRATEGY_IMPORTS = ('math', 'numpy', 'pandas', 'typing', 'datetime', 'collections', 'app.strategies')
+
+
+def _strategy_import(name, globals=None, locals=None, fromlist=(), level=0):
+    """策略代码的 __import__：只允许 STRATEGY_IMPORTS 中的模块"""
+    if level != 0 or not any(name == allowed or name.startswith(allowed + '.') for allowed in STRATEGY_IMPORTS):
+        raise ImportError(f"Import of '{name}' is not allowed in strategy code")
+    return builtins.__import__(name, globals, locals, fromlist, level)
+
+
+def load_strategy_class(code: str) -> Type[BaseStrategy]:
+    """
+    加载策略类
+    
+    code 为内置策略名称时直接返回对应的类；否则执行策略代码，
+    返回其中最后定义的非抽象 BaseStrategy 子类。
+    
+    注意：策略代码由用户提交，回测任务在 Celery 工作进程中调用本函数，即在工作进程内执行任意代码。
+    执行时只提供 STRATEGY_BUILTINS 中的内置函数（没有 open、eval、exec 等），
+    且只能导入 STRATEGY_IMPORTS 中的模块；这只能拦截直接的文件/系统访问，
+    并不是安全沙箱（例如可以通过对象属性绕过），只应允许受信任的用户提交策略代码。
+    
+    Args:
+        code: 策略代码或内置策略名称
+    
+    Returns:
+        策略类
+    
+    Raises:
+        ValueError: 代码中没有策略类
+        ImportError: 导入了不允许的模块
+    """
+    name = (code or '').strip()
+    if name in STRATEGY_CLASSES:
+        return STRATEGY_CLASSES[name]
+    
+    safe_builtins = {key: getattr(builtins, key) for key in STRATEGY_BUILTINS}
+    safe_builtins['__import__'] = _strategy_import
+    namespace: Dict[str, Any] = {
+        '__name__': 'user_strategy',
+        '__builtins__': safe_builtins,
+        'BaseStrategy': BaseStrategy,
+        'np': np,
+        'pd': pd,
+    }
+    exec(compile(code, '<strategy>', 'exec'), namespace)
+    classes = [
+        obj for obj in namespace.values()
+        if isinstance(obj, type) and issubclass(obj, BaseStrategy)
+        and obj is not BaseStrategy and not inspect.isabstract(obj)
+    ]
+    if not classes:
+        raise ValueError("No BaseStrategy subclass found in strategy code")
+    return classes[-1]
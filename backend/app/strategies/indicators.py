@@ -0,0 +1,141 @@
+"""
+技术指标缓存
+参数扫描时同一数据集上的 SMA/EMA/RSI 只计算一次，供所有回测复用
+"""
+import hashlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.core.config import settings
+
+
+def series_key(values: np.ndarray) -> Tuple[Any, ...]:
+    """
+    序列标识
+    
+    由长度、数据类型和内容哈希（BLAKE2b）组成：内容相同的数组（包括共享内存中的视图）
+    得到相同的标识；长期运行的进程中数组地址被复用或数组被原地修改时不会误命中。
+    哈希的开销约为计算一次 SMA 的一半。
+    """
+    values = np.ascontiguousarray(values)
+    return (len(values), values.dtype.str, hashlib.blake2b(values, digest_size=16).digest())
+
+
+class IndicatorCache:
+    """
+    指标缓存
+    
+    以 (序列标识, 指标名, 窗口) 为键缓存计算结果，按占用字节数限制总内存，
+    超出上限时淘汰最久未使用的结果。
+    """
+    
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Tuple[Any, ...], np.ndarray]" = OrderedDict()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def get(
+        self,
+        values: np.ndarray,
+        indicator: str,
+        window: int,
+        compute: Callable[[np.ndarray, int], np.ndarray]
+    ) -> np.ndarray:
+        """
+        获取指标，未命中时计算并缓存
+        
+        Args:
+            values: 原始序列
+            indicator: 指标名
+            window: 窗口长度
+            compute: 计算函数 compute(values, window)
+        
+        Returns:
+            只读的指标数组
+        """
+        key = (series_key(values), indicator, window)
+        result = self._entries.get(key)
+        if result is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return result
+        
+        self.misses += 1
+        result = np.asarray(compute(values, window), dtype=float)
+        result.setflags(write=False)
+        if result.nbytes <= self.max_bytes:
+            self._entries[key] = result
+            self.current_bytes += result.nbytes
+            self._evict()
+        return result
+    
+    def sma(self, values: np.ndarray, window: int) -> np.ndarray:
+        """简单移动平均"""
+        return self.get(values, 'sma', window, _sma)
+    
+    def ema(self, values: np.ndarray, window: int) -> np.ndarray:
+        """指数移动平均"""
+        return self.get(values, 'ema', window, _ema)
+    
+    def rsi(self, values: np.ndarray, window: int = 14) -> np.ndarray:
+        """相对强弱指标"""
+        return self.get(values, 'rsi', window, _rsi)
+    
+    def stats(self) -> Dict[str, Any]:
+        """命中统计"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': self.hits / total if total else 0.0,
+            'entries': len(self._entries),
+            'bytes': self.current_bytes,
+            'max_bytes': self.max_bytes,
+        }
+    
+    def clear(self):
+        """清空缓存和统计"""
+        self._entries.clear()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def _evict(self):
+        """淘汰最久未使用的结果直到不超过内存上限"""
+        while self.current_bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self.current_bytes -= evicted.nbytes
+            self.evictions += 1
+
+
+def _sma(values: np.ndarray, window: int) -> np.ndarray:
+    return pd.Series(values).rolling(window=window).mean().to_numpy()
+
+
+def _ema(values: np.ndarray, window: int) -> np.ndarray:
+    return pd.Series(values).ewm(span=window, adjust=False).mean().to_numpy()
+
+
+def _rsi(values: np.ndarray, window: int) -> np.ndarray:
+    delta = pd.Series(values).diff()
+    gain = delta.where(delta > 0, 0)
+    loss = -delta.where(delta < 0, 0)
+    avg_gain = gain.rolling(window=window).mean()
+    avg_loss = loss.rolling(window=window).mean()
+    rs = avg_gain / avg_loss
+    return (100 - (100 / (1 + rs))).to_numpy()
+
+
+# 全局指标缓存实例（每个进程一份）
+indicator_cache = IndicatorCache(max_bytes=settings.INDICATOR_CACHE_MAX_MB * 1024 * 1024)
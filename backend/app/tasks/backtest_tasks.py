@@ -0,0 +1,220 @@
+"""
+回测任务
+在 Celery 工作进程中执行 POST /strategies/backtest 创建的回测，
+通过 Redis 上报进度，并支持协作式取消
+"""
+import asyncio
+import math
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+import redis
+from loguru import logger
+
+from app.core.config import settings
+from app.core.database import create_worker_session_factory
+from app.models.strategy import Strategy, Backtest
+from app.services.backtest import BacktestEngine, BacktestCancelled, load_klines_dataframe
+from app.services.kline_sync import interval_to_timedelta
+from app.services.result_store import pack_equity_curve, pack_trades, summarize_result
+from app.services.streaming_backtest import StreamingBacktestEngine, SpoolResultWriter, stream_kline_chunks
+from app.strategies.base import load_strategy_class
+from app.tasks.data_tasks import celery_app
+
+
+# 进度和取消标记在 Redis 中的保留时间（秒）
+BACKTEST_KEY_TTL = 86400
+
+# 每处理多少根K线上报一次进度并检查取消标记
+PROGRESS_INTERVAL = 10000
+
+
+def backtest_progress_key(backtest_id: int) -> str:
+    """回测进度键"""
+    return f"backtest:progress:{backtest_id}"
+
+
+def backtest_cancel_key(backtest_id: int) -> str:
+    """回测取消标记键"""
+    return f"backtest:cancel:{backtest_id}"
+
+
+def _redis() -> redis.Redis:
+    """工作进程使用的同步 Redis 连接"""
+    return redis.Redis.from_url(
+        settings.REDIS_URL,
+        password=settings.REDIS_PASSWORD if settings.REDIS_PASSWORD else None,
+        decode_responses=True
+    )
+
+
+def estimate_bars(interval: str, start_date: datetime, end_date: datetime) -> int:
+    """按周期估算回测区间内的K线数（用于选择回测引擎和上报进度）"""
+    return int((end_date - start_date) / interval_to_timedelta(interval)) + 1
+
+
+def _finite(value: Any) -> Optional[float]:
+    """NaN/inf 转为 None"""
+    if value is None:
+        return None
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+
+class ProgressReporter:
+    """
+    进度回调
+    
+    由 BacktestEngine 每 PROGRESS_INTERVAL 根K线调用一次：
+    更新 Celery 任务状态和 Redis 进度，发现取消标记时抛出 BacktestCancelled。
+    """
+    
+    def __init__(self, task, backtest_id: int, client: redis.Redis):
+        self.task = task
+        self.backtest_id = backtest_id
+        self.client = client
+    
+    def __call__(self, done: int, total: int):
+        progress = done / total if total else 1.0
+        self.client.set(backtest_progress_key(self.backtest_id), progress, ex=BACKTEST_KEY_TTL)
+        self.task.update_state(
+            state='PROGRESS',
+            meta={'backtest_id': self.backtest_id, 'progress': progress, 'bars': done, 'total': total}
+        )
+        if self.client.exists(backtest_cancel_key(self.backtest_id)):
+            raise BacktestCancelled(f"Backtest {self.backtest_id} cancelled at bar {done}/{total}")
+
+
+async def _execute_backtest(task, backtest_id: int) -> Dict[str, Any]:
+    """
+    执行回测并写回结果
+    
+    Args:
+        task: 当前 Celery 任务（用于 update_state）
+        backtest_id: 回测ID
+    
+    Returns:
+        任务结果摘要
+    """
+    engine, session_factory = create_worker_session_factory()
+    client = _redis()
+    
+    try:
+        async with session_factory() as db:
+            backtest = await db.get(Backtest, backtest_id)
+            if not backtest:
+                logger.error(f"Backtest {backtest_id} not found")
+                return {"status": "error", "message": "Backtest not found"}
+            if backtest.status == "cancelled" or client.exists(backtest_cancel_key(backtest_id)):
+                backtest.status = "cancelled"
+                await db.commit()
+                return {"status": "cancelled", "backtest_id": backtest_id}
+            
+            backtest.status = "running"
+            backtest.progress = 0.0
+            await db.commit()
+            
+            try:
+                strategy = await db.get(Strategy, backtest.strategy_id)
+                if not strategy:
+                    raise ValueError(f"Strategy {backtest.strategy_id} not found")
+                
+                strategy_class = load_strategy_class(strategy.code)
+                params = {**(strategy.params or {}), 'initial_capital': backtest.initial_capital}
+                commission = backtest.commission if backtest.commission is not None else 0.001
+                expected_bars = estimate_bars(backtest.interval, backtest.start_date, backtest.end_date)
+                
+                if expected_bars >= settings.BACKTEST_STREAMING_MIN_BARS:
+                    # 长区间分块读取，K线不整体载入内存
+                    bt_engine = StreamingBacktestEngine(
+                        strategy_class(params),
+                        initial_capital=backtest.initial_capital,
+                        commission=commission
+                    )
+                    bt_engine.progress_callback = ProgressReporter(task, backtest_id, client)
+                    bt_engine.progress_interval = PROGRESS_INTERVAL
+                    chunks = stream_kline_chunks(
+                        db, backtest.exchange, backtest.symbol, backtest.interval,
+                        backtest.start_date, backtest.end_date,
+                        chunk_size=settings.BACKTEST_STREAMING_CHUNK_SIZE
+                    )
+                    # 权益曲线和成交逐块暂存到磁盘，结束后从暂存文件打包
+                    writer = SpoolResultWriter()
+                    try:
+                        result = await bt_engine.run_stream(chunks, writer, total_bars=expected_bars)
+                        if not result:
+                            raise ValueError("No kline data in the requested range")
+                        bars = result['bars']
+                        result_data = writer.summary(bars)
+                        equity_curve_data = writer.pack_equity_curve()
+                        trades_data = writer.pack_trades()
+                    finally:
+                        writer.cleanup()
+                else:
+                    data = await load_klines_dataframe(
+                        db, backtest.exchange, backtest.symbol, backtest.interval,
+                        backtest.start_date, backtest.end_date
+                    )
+                    if data.empty:
+                        raise ValueError("No kline data in the requested range")
+                    
+                    bt_engine = BacktestEngine(
+                        strategy_class(params),
+                        data,
+                        initial_capital=backtest.initial_capital,
+                        commission=commission
+                    )
+                    bt_engine.progress_callback = ProgressReporter(task, backtest_id, client)
+                    bt_engine.progress_interval = PROGRESS_INTERVAL
+                    
+                    result = bt_engine.run()
+                    bars = len(data)
+                    result_data = summarize_result(result, bars)
+                    equity_curve_data = pack_equity_curve(result['equity_curve'])
+                    trades_data = pack_trades(result.get('trades', []))
+            
+            except BacktestCancelled as e:
+                logger.info(str(e))
+                backtest.status = "cancelled"
+                await db.commit()
+                return {"status": "cancelled", "backtest_id": backtest_id}
+            
+            except Exception as e:
+                logger.error(f"Backtest {backtest_id} failed: {e}")
+                backtest.status = "failed"
+                backtest.error_message = str(e)
+                await db.commit()
+                return {"status": "error", "backtest_id": backtest_id, "message": str(e)}
+            
+            backtest.final_capital = _finite(result.get('final_capital'))
+            backtest.total_return = _finite(result.get('total_return'))
+            backtest.sharpe_ratio = _finite(result.get('sharpe_ratio'))
+            backtest.max_drawdown = _finite(result.get('max_drawdown'))
+            backtest.win_rate = _finite(result.get('win_rate'))
+            backtest.total_trades = result.get('total_trades', 0)
+            backtest.result_data = result_data
+            backtest.equity_curve_data = equity_curve_data
+            backtest.trades_data = trades_data
+            backtest.status = "completed"
+            backtest.progress = 1.0
+            backtest.error_message = None
+            await db.commit()
+            
+            logger.info(f"Backtest {backtest_id} completed: {bars} bars, {backtest.total_trades} trades")
+            return {"status": "success", "backtest_id": backtest_id, "final_capital": backtest.final_capital}
+    finally:
+        client.delete(backtest_progress_key(backtest_id), backtest_cancel_key(backtest_id))
+        client.close()
+        await engine.dispose()
+
+
+@celery_app.task(bind=True, name='run_backtest')
+def run_backtest(self, backtest_id: int):
+    """
+    回测任务
+    
+    Args:
+        backtest_id: 回测ID
+    """
+    logger.info(f"Starting backtest {backtest_id}...")
+    return asyncio.run(_execute_backtest(self, backtest_id))
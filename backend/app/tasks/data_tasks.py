@@ -2,18 +2,24 @@
 数据采集定时任务
 使用Celery实现定时数据采集
 """
+import asyncio
 from celery import Celery
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List
 from loguru import logger
 
 from app.core.config import settings
-from app.services.data_collector import data_collector
+from app.core.database import create_worker_session_factory
+from app.core.redis import RedisClient
+from app.services.kline_partitions import maintain_partitions
+from app.services.kline_sync import KlineSync
 
 # 创建Celery应用
 celery_app = Celery(
     'quant_trading',
     broker=settings.CELERY_BROKER_URL,
-    backend=settings.CELERY_RESULT_BACKEND
+    backend=settings.CELERY_RESULT_BACKEND,
+    include=['app.tasks.backtest_tasks']
 )
 
 # Celery配置
@@ -26,24 +32,50 @@ celery_app.conf.update(
 )
 
 
+# 实时采集的交易所、交易对和周期
+REALTIME_EXCHANGE = 'binance_public'
+REALTIME_SYMBOLS = ['BTC/USDT', 'ETH/USDT', 'BNB/USDT']
+REALTIME_INTERVAL = '1m'
+REALTIME_LOOKBACK = timedelta(hours=6)  # 覆盖图缺失时最多补齐的时长
+
+
+async def _sync_realtime_klines() -> List[Dict[str, Any]]:
+    """增量同步各交易对最新的已收盘K线"""
+    engine, session_factory = create_worker_session_factory()
+    redis = RedisClient()  # 每次任务一个新的事件循环，不复用全局连接
+    try:
+        sync = KlineSync(redis=redis)
+        start = datetime.now(timezone.utc) - REALTIME_LOOKBACK
+        results = []
+        async with session_factory() as db:
+            for symbol in REALTIME_SYMBOLS:
+                results.append(await sync.sync(db, REALTIME_EXCHANGE, symbol, REALTIME_INTERVAL, start))
+        return results
+    finally:
+        await redis.disconnect()
+        await engine.dispose()
+
+
 @celery_app.task(name='collect_realtime_data')
 def collect_realtime_data():
     """
     实时数据采集任务
-    每分钟执行一次
+    每分钟执行一次，按覆盖图只抓取上次同步之后新收盘的K线
     """
     try:
         logger.info("Starting realtime data collection...")
         
-        # 采集热门交易对的实时数据
-        symbols = ['BTC/USDT', 'ETH/USDT', 'BNB/USDT']
+        results = asyncio.run(_sync_realtime_klines())
+        inserted = sum(result['inserted'] for result in results)
+        errors = [result['error'] for result in results if result['error']]
         
-        for symbol in symbols:
-            # 这里可以实现实时数据采集逻辑
-            pass
-        
-        logger.info("Realtime data collection completed")
-        return {"status": "success", "symbols": symbols}
+        logger.info(f"Realtime data collection completed: {inserted} klines inserted")
+        return {
+            "status": "error" if errors else "success",
+            "symbols": REALTIME_SYMBOLS,
+            "inserted": inserted,
+            "errors": errors
+        }
         
     except Exception as e:
         logger.error(f"Realtime data collection failed: {e}")
@@ -74,6 +106,30 @@ def collect_daily_data():
         return {"status": "error", "message": str(e)}
 
 
+async def _maintain_kline_partitions() -> Dict[str, Any]:
+    """在一个事务中执行分区维护"""
+    engine, _ = create_worker_session_factory()
+    try:
+        async with engine.begin() as conn:
+            return await maintain_partitions(conn)
+    finally:
+        await engine.dispose()
+
+
+@celery_app.task(name='maintain_kline_partitions')
+def maintain_kline_partitions():
+    """
+    K线分区维护
+    创建未来的时间分区，把默认分区中的数据迁入时间分区，删除超过保留期的分区
+    """
+    try:
+        result = asyncio.run(_maintain_kline_partitions())
+        return {"status": "success", **result}
+    except Exception as e:
+        logger.error(f"Kline partition maintenance failed: {e}")
+        return {"status": "error", "message": str(e)}
+
+
 # 定时任务配置
 celery_app.conf.beat_schedule = {
     'collect-realtime-data': {
@@ -84,4 +140,8 @@ celery_app.conf.beat_schedule = {
         'task': 'collect_daily_data',
         'schedule': 86400.0,  # 每天执行一次
     },
+    'maintain-kline-partitions': {
+        'task': 'maintain_kline_partitions',
+        'schedule': 86400.0,  # 每天执行一次
+    },
 }
@@ -0,0 +1,97 @@
+"""
+K线读取基准测试
+对比三种从数据库读取K线的方式：
+1. ORM：select(Kline)，每行构造一个 ORM 对象
+2. Core：select(各列)，每行一个 Row 元组，再构造 DataFrame
+3. 快速读取：fetch_kline_arrays，COPY 二进制格式直接解析为 NumPy 数组
+
+用法：
+    python benchmark_kline_reads.py binance_public BTC/USDT 1m --days 30 --repeat 5
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+
+from app.core.database import AsyncSessionLocal, engine
+from app.models.market import Kline
+from app.services.kline_reader import OHLCV_COLUMNS, arrays_to_frame, fetch_kline_arrays
+
+
+def _conditions(exchange: str, symbol: str, interval: str, start: datetime, end: datetime):
+    return (
+        Kline.exchange == exchange,
+        Kline.symbol == symbol,
+        Kline.interval == interval,
+        Kline.timestamp >= start,
+        Kline.timestamp <= end,
+    )
+
+
+async def read_orm(db, exchange, symbol, interval, start, end) -> pd.DataFrame:
+    query = select(Kline).where(*_conditions(exchange, symbol, interval, start, end)).order_by(Kline.timestamp)
+    klines = (await db.execute(query)).scalars().all()
+    return pd.DataFrame([
+        {name: getattr(kline, name) for name in OHLCV_COLUMNS} for kline in klines
+    ], columns=list(OHLCV_COLUMNS))
+
+
+async def read_core(db, exchange, symbol, interval, start, end) -> pd.DataFrame:
+    query = select(
+        Kline.timestamp, Kline.open, Kline.high, Kline.low, Kline.close, Kline.volume
+    ).where(*_conditions(exchange, symbol, interval, start, end)).order_by(Kline.timestamp)
+    rows = (await db.execute(query)).all()
+    return pd.DataFrame(rows, columns=list(OHLCV_COLUMNS))
+
+
+async def read_fast(db, exchange, symbol, interval, start, end) -> pd.DataFrame:
+    return arrays_to_frame(await fetch_kline_arrays(db, exchange, symbol, interval, start, end))
+
+
+async def run_benchmark(exchange: str, symbol: str, interval: str, days: int, repeat: int):
+    """运行基准测试"""
+    end = datetime.now(timezone.utc)
+    start = end - timedelta(days=days)
+    print(f"读取 {exchange} {symbol} {interval}，{start:%Y-%m-%d} ~ {end:%Y-%m-%d}，每种方式 {repeat} 次")
+    
+    results = {}
+    for name, reader in (('ORM', read_orm), ('Core', read_core), ('快速读取', read_fast)):
+        timings = []
+        for _ in range(repeat):
+            # 每次使用新会话，ORM 的 identity map 不跨次复用
+            async with AsyncSessionLocal() as db:
+                started = time.perf_counter()
+                data = await reader(db, exchange, symbol, interval, start, end)
+                timings.append(time.perf_counter() - started)
+        results[name] = data
+        median = statistics.median(timings)
+        rate = len(data) / median if median > 0 else 0
+        print(f"{name:<8} {len(data):>10} 行  中位数 {median * 1000:>9.1f} ms  {rate:>12,.0f} 行/秒")
+    
+    # 核对结果一致
+    baseline = results['ORM']
+    for name, data in results.items():
+        same = len(data) == len(baseline) and all(
+            np.allclose(data[column].to_numpy(dtype=float), baseline[column].to_numpy(dtype=float))
+            for column in OHLCV_COLUMNS[1:]
+        )
+        if not same:
+            print(f"警告：{name} 的结果与 ORM 不一致")
+    
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="K线读取基准测试")
+    parser.add_argument("exchange")
+    parser.add_argument("symbol")
+    parser.add_argument("interval")
+    parser.add_argument("--days", type=int, default=30, help="读取最近多少天")
+    parser.add_argument("--repeat", type=int, default=5, help="每种方式重复次数")
+    args = parser.parse_args()
+    asyncio.run(run_benchmark(args.exchange, args.symbol, args.interval, args.days, args.repeat))
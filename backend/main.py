@@ -5,6 +5,11 @@ from loguru import logger
 
 from app.core.config import settings
 from app.core.database import engine, Base
+from app.core.executor import blocking_executor
+from app.services.kline_partitions import maintain_partitions
+from app.services.market_gateway import market_gateway
+from app.services.search_service import search_service
+from app.services.symbol_registry import symbol_registry
 from app.api import api_router
 
 
@@ -20,11 +25,25 @@ async def lifespan(app: FastAPI):
     
     logger.info("Database tables created successfully")
     
+    # K线分区维护（创建缺失的分区、执行保留策略）
+    async with engine.begin() as conn:
+        await maintain_partitions(conn)
+    
+    # 交易对注册表：读取本地快照，后台定时从交易所刷新
+    symbol_registry.start()
+    
+    # 外部信息源（新闻、市场情绪）的连接池会话
+    await search_service.start()
+    
     yield
     
     # 关闭时执行
     logger.info("Shutting down Quantitative Trading System...")
+    await market_gateway.close()
+    await symbol_registry.stop()
+    await search_service.close()
     await engine.dispose()
+    blocking_executor.shutdown()
 
 
 # 创建FastAPI应用
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 测试直接导入 app 包（与 main.py 相同，以 backend 目录为根）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
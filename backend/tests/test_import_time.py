@@ -0,0 +1,35 @@
+"""
+导入耗时测试：导入 data_collector 不应加载交易所/行情 SDK（ccxt、yfinance、tushare 在首次使用时才导入）
+"""
+import os
+import subprocess
+import sys
+
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ('ccxt', 'yfinance', 'tushare')
+
+
+def test_data_collector_import_skips_sdks():
+    code = (
+        "import sys\n"
+        "import app.services.data_collector\n"
+        f"loaded = [name for name in {HEAVY_MODULES!r} if name in sys.modules]\n"
+        "print(','.join(loaded))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=BACKEND_DIR, capture_output=True, text=True, timeout=120
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == ''
+    
+    # -X importtime 在 stderr 中逐行列出导入的模块：import time: self | cumulative | 模块名
+    imported = {
+        line.rsplit('|', 1)[-1].strip().split('.')[0]
+        for line in result.stderr.splitlines()
+        if line.startswith('import time:')
+    }
+    assert imported, "no -X importtime output"
+    assert not imported & set(HEAVY_MODULES)
@@ -0,0 +1,171 @@
+"""
+行情网关测试：用内存中的假行情源代替 ccxt.pro
+"""
+import asyncio
+from typing import Dict, Any
+
+from app.services.market_gateway import MarketDataGateway
+
+
+EXCHANGE = 'binance_public'
+
+
+class FakeFeed:
+    """每个交易对一个队列，push() 写入的行情由 watch_ticker() 依次返回"""
+    
+    def __init__(self):
+        self.queues: Dict[str, asyncio.Queue] = {}
+        self.watchers: Dict[str, int] = {}
+    
+    def _queue(self, symbol: str) -> asyncio.Queue:
+        return self.queues.setdefault(symbol, asyncio.Queue())
+    
+    def push(self, symbol: str, price: float):
+        self._queue(symbol).put_nowait({'symbol': symbol, 'last': price, 'timestamp': int(price)})
+    
+    async def watch_ticker(self, exchange: str, symbol: str) -> Dict[str, Any]:
+        self.watchers[symbol] = self.watchers.get(symbol, 0) + 1
+        return await self._queue(symbol).get()
+
+
+async def drain(feed: FakeFeed):
+    """让上游任务把队列中的行情全部写入环形缓冲区"""
+    for _ in range(1000):
+        if all(queue.empty() for queue in feed.queues.values()):
+            break
+        await asyncio.sleep(0)
+    await asyncio.sleep(0)
+
+
+def test_multi_symbol_fan_out():
+    async def scenario():
+        feed = FakeFeed()
+        gateway = MarketDataGateway(feed=feed, buffer_size=16, max_batch=8, idle_timeout=0)
+        clients = [gateway.stream(EXCHANGE, ['BTC/USDT', 'ETH/USDT']) for _ in range(3)]
+        pending = [asyncio.ensure_future(client.__anext__()) for client in clients]
+        await asyncio.sleep(0)
+        
+        feed.push('BTC/USDT', 100.0)
+        feed.push('ETH/USDT', 10.0)
+        await drain(feed)
+        
+        received = [set() for _ in clients]
+        for index, client in enumerate(clients):
+            batch = await pending[index]
+            received[index].update(tick['symbol'] for tick in batch)
+            while received[index] != {'BTC/USDT', 'ETH/USDT'}:
+                batch = await asyncio.wait_for(client.__anext__(), 1)
+                received[index].update(tick['symbol'] for tick in batch)
+        
+        metrics = gateway.metrics()
+        assert metrics['upstream_streams'] == 2
+        assert metrics['subscribers'] == {f'{EXCHANGE}:BTC/USDT': 3, f'{EXCHANGE}:ETH/USDT': 3}
+        assert gateway.latest(EXCHANGE, 'BTC/USDT')['last_price'] == 100.0
+        
+        for client in clients:
+            await client.aclose()
+        await gateway.close()
+    
+    asyncio.run(scenario())
+
+
+def test_slow_consumer_receives_latest_tick_of_every_symbol():
+    async def scenario():
+        feed = FakeFeed()
+        gateway = MarketDataGateway(feed=feed, buffer_size=32, max_batch=4, idle_timeout=0)
+        client = gateway.stream(EXCHANGE, ['BTC/USDT', 'ETH/USDT'])
+        first = asyncio.ensure_future(client.__anext__())
+        await asyncio.sleep(0)
+        
+        feed.push('BTC/USDT', 1.0)
+        await drain(feed)
+        await first
+        
+        # 客户端不读取期间两个交易对各到达 100 条行情，ETH 的写入在后
+        for i in range(100):
+            feed.push('BTC/USDT', 1000.0 + i)
+        await drain(feed)
+        for i in range(100):
+            feed.push('ETH/USDT', 2000.0 + i)
+        await drain(feed)
+        
+        batch = await asyncio.wait_for(client.__anext__(), 1)
+        by_symbol: Dict[str, list] = {}
+        for tick in batch:
+            by_symbol.setdefault(tick['symbol'], []).append(tick['last_price'])
+        
+        assert len(batch) <= 4
+        assert by_symbol['BTC/USDT'][-1] == 1099.0
+        assert by_symbol['ETH/USDT'][-1] == 2099.0
+        # 每个交易对内按时间顺序，只保留最新的部分
+        assert by_symbol['BTC/USDT'] == sorted(by_symbol['BTC/USDT'])
+        
+        await client.aclose()
+        await gateway.close()
+    
+    asyncio.run(scenario())
+
+
+def test_unsubscribe_stops_upstream():
+    async def scenario():
+        feed = FakeFeed()
+        gateway = MarketDataGateway(feed=feed, buffer_size=16, max_batch=8, idle_timeout=0)
+        first = gateway.stream(EXCHANGE, ['BTC/USDT', 'ETH/USDT'])
+        second = gateway.stream(EXCHANGE, ['BTC/USDT'])
+        pending = [asyncio.ensure_future(first.__anext__()), asyncio.ensure_future(second.__anext__())]
+        await asyncio.sleep(0)
+        
+        feed.push('BTC/USDT', 1.0)
+        await drain(feed)
+        await asyncio.gather(*pending)
+        assert gateway.metrics()['upstream_streams'] == 2
+        
+        # 第一个客户端离开：ETH 无人订阅，上游停止；BTC 仍有第二个客户端
+        await first.aclose()
+        await asyncio.sleep(0)
+        metrics = gateway.metrics()
+        assert metrics['subscribers'] == {f'{EXCHANGE}:BTC/USDT': 1}
+        assert metrics['upstream_streams'] == 1
+        assert gateway.ring(EXCHANGE, 'ETH/USDT') is None
+        
+        await second.aclose()
+        await asyncio.sleep(0)
+        metrics = gateway.metrics()
+        assert metrics['subscribers'] == {}
+        assert metrics['upstream_streams'] == 0
+        
+        # 之后写入的行情不再被读取
+        feed.push('BTC/USDT', 2.0)
+        await asyncio.sleep(0)
+        assert feed.queues['BTC/USDT'].qsize() == 1
+        
+        await gateway.close()
+    
+    asyncio.run(scenario())
+
+
+def test_idle_timeout_keeps_upstream_for_reconnect():
+    async def scenario():
+        feed = FakeFeed()
+        gateway = MarketDataGateway(feed=feed, buffer_size=16, max_batch=8, idle_timeout=0.05)
+        client = gateway.stream(EXCHANGE, ['BTC/USDT'])
+        pending = asyncio.ensure_future(client.__anext__())
+        await asyncio.sleep(0)
+        feed.push('BTC/USDT', 1.0)
+        await drain(feed)
+        await pending
+        await client.aclose()
+        
+        # 空闲期内重新订阅，复用同一个上游任务
+        task = gateway._tasks[(EXCHANGE, 'BTC/USDT')]
+        again = gateway.stream(EXCHANGE, ['BTC/USDT'])
+        batch = await asyncio.wait_for(again.__anext__(), 1)
+        assert batch[0]['last_price'] == 1.0
+        assert gateway._tasks[(EXCHANGE, 'BTC/USDT')] is task
+        await again.aclose()
+        
+        await asyncio.sleep(0.1)
+        assert gateway.metrics()['upstream_streams'] == 0
+        await gateway.close()
+    
+    asyncio.run(scenario())
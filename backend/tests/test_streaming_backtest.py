@@ -0,0 +1,79 @@
+"""
+流式回测测试：分块结果与内存回测一致，且不受分块位置影响
+"""
+import asyncio
+import os
+
+import numpy as np
+import pandas as pd
+
+from app.services.backtest import BacktestEngine
+from app.services.result_store import pack_equity_curve, pack_trades
+from app.services.streaming_backtest import (
+    StreamingBacktestEngine, SpoolResultWriter, TradeHistory, dataframe_chunks
+)
+from app.strategies.base import MAStrategy
+
+
+PARAMS = {'short_period': 5, 'long_period': 20, 'initial_capital': 10000}
+
+
+class LimitedMAStrategy(MAStrategy):
+    """读取成交历史的策略：成交 30 笔后停止，上一笔亏损卖出后暂停开仓"""
+    
+    def on_bar(self, bar):
+        if len(self.trades) >= 30:
+            return
+        last = self.trades[-1] if self.trades else None
+        if last and last['side'] == 'sell' and bar['close'] < last['price']:
+            return
+        super().on_bar(bar)
+
+
+def _klines(n: int = 20000) -> pd.DataFrame:
+    close = 100 + np.cumsum(np.random.default_rng(0).normal(0, 0.1, n))
+    return pd.DataFrame({
+        'timestamp': pd.date_range('2024-01-01', periods=n, freq='1min', tz='UTC'),
+        'open': close, 'high': close + 0.1, 'low': close - 0.1, 'close': close, 'volume': 1.0,
+    })
+
+
+def _stream(strategy_class, data: pd.DataFrame, chunk_size: int):
+    writer = SpoolResultWriter()
+    engine = StreamingBacktestEngine(strategy_class(PARAMS), 10000, 0.001, trade_history=3)
+    try:
+        result = asyncio.run(engine.run_stream(dataframe_chunks(data, chunk_size), writer))
+        return result, writer.pack_equity_curve(), writer.pack_trades(), writer.summary(result['bars'])
+    finally:
+        writer.cleanup()
+        assert not os.path.exists(writer.directory)
+
+
+def test_spooled_results_match_in_memory_engine():
+    data = _klines()
+    for strategy_class in (MAStrategy, LimitedMAStrategy):
+        expected = BacktestEngine(strategy_class(PARAMS), data, 10000, 0.001).run()
+        for chunk_size in (7000, 333):
+            result, equity_blob, trades_blob, summary = _stream(strategy_class, data, chunk_size)
+            assert result['total_trades'] == expected['total_trades']
+            assert result['final_capital'] == expected['final_capital']
+            assert equity_blob == pack_equity_curve(expected['equity_curve'])
+            assert trades_blob == pack_trades(expected['trades'])
+            assert summary['equity_points'] == len(data)
+            assert summary['trades'] == expected['total_trades']
+
+
+def test_trade_history_keeps_count_and_recent_trades():
+    history = TradeHistory(maxlen=2)
+    for i in range(5):
+        history.append({'id': i})
+    assert len(history) == 5
+    assert history[-1] == {'id': 4}
+    assert history[4] == {'id': 4}
+    assert [trade['id'] for trade in history] == [3, 4]
+    try:
+        history[0]
+    except IndexError:
+        pass
+    else:
+        raise AssertionError("trade 0 should no longer be retained")
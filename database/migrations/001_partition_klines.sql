@@ -0,0 +1,103 @@
+-- K线表分区迁移
+-- 把单表 klines 迁移为分区表：按周期 LIST 分区，每个周期再按时间 RANGE 分区（1m/5m 按月，其余按年），
+-- 与 schema.sql 及后端分区维护任务（app/services/kline_partitions.py）的命名一致
+--
+-- 用法：
+--   psql -U postgres -d quant_trading -f database/migrations/001_partition_klines.sql
+--
+-- 注意：
+--   1. 整个迁移在一个事务中执行，期间 klines 不可读写，数据量大时请在维护窗口执行；
+--   2. 旧表重命名为 klines_legacy 保留，核对数据后手动删除（见文件末尾）；
+--   3. 旧表时间列若为 TIMESTAMP（无时区），按当前会话时区转换为 TIMESTAMPTZ。
+
+BEGIN;
+
+-- ============================================
+-- 1. 旧表改名
+-- ============================================
+ALTER TABLE klines RENAME TO klines_legacy;
+ALTER INDEX IF EXISTS klines_pkey RENAME TO klines_legacy_pkey;
+
+-- ============================================
+-- 2. 创建分区表
+-- ============================================
+CREATE TABLE klines (
+    exchange VARCHAR(50) NOT NULL,
+    symbol VARCHAR(50) NOT NULL,
+    interval VARCHAR(10) NOT NULL,
+    timestamp TIMESTAMPTZ NOT NULL,
+    open DECIMAL(20, 8) NOT NULL,
+    high DECIMAL(20, 8) NOT NULL,
+    low DECIMAL(20, 8) NOT NULL,
+    close DECIMAL(20, 8) NOT NULL,
+    volume DECIMAL(30, 8) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (exchange, symbol, interval, timestamp)
+) PARTITION BY LIST (interval);
+
+CREATE INDEX idx_klines_timestamp_brin ON klines USING BRIN (timestamp);
+
+-- 周期分区、默认分区，以及覆盖旧数据到当前时间的时间分区
+DO $$
+DECLARE
+    iv TEXT;
+    period TEXT;
+    step INTERVAL;
+    first_ts TIMESTAMPTZ;
+    last_ts TIMESTAMPTZ;
+    lo TIMESTAMPTZ;
+    hi TIMESTAMPTZ;
+BEGIN
+    FOR iv, period IN
+        SELECT * FROM (VALUES
+            ('1m', 'month'), ('5m', 'month'),
+            ('15m', 'year'), ('30m', 'year'), ('1h', 'year'), ('4h', 'year'), ('1d', 'year'), ('1w', 'year')
+        ) AS p(interval_name, granularity)
+    LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF klines FOR VALUES IN (%L) PARTITION BY RANGE (timestamp)',
+            'klines_' || iv, iv
+        );
+        EXECUTE format('CREATE TABLE %I PARTITION OF %I DEFAULT', 'klines_' || iv || '_default', 'klines_' || iv);
+
+        SELECT min(timestamp), max(timestamp) INTO first_ts, last_ts FROM klines_legacy WHERE interval = iv;
+        first_ts := LEAST(COALESCE(first_ts, now()), now());
+        last_ts := GREATEST(COALESCE(last_ts, now()), now());
+        step := CASE period WHEN 'month' THEN INTERVAL '1 month' ELSE INTERVAL '1 year' END;
+
+        lo := date_trunc(period, first_ts AT TIME ZONE 'UTC') AT TIME ZONE 'UTC';
+        WHILE lo <= last_ts LOOP
+            hi := ((lo AT TIME ZONE 'UTC') + step) AT TIME ZONE 'UTC';
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                'klines_' || iv || '_p' || to_char(lo AT TIME ZONE 'UTC', CASE period WHEN 'month' THEN 'YYYYMM' ELSE 'YYYY' END),
+                'klines_' || iv, lo, hi
+            );
+            lo := hi;
+        END LOOP;
+    END LOOP;
+END $$;
+
+-- 其他周期
+CREATE TABLE klines_other PARTITION OF klines DEFAULT;
+
+-- ============================================
+-- 3. 迁移数据
+-- ============================================
+INSERT INTO klines (exchange, symbol, interval, timestamp, open, high, low, close, volume)
+SELECT exchange, symbol, interval, timestamp, open, high, low, close, volume
+FROM klines_legacy
+ORDER BY interval, timestamp
+ON CONFLICT DO NOTHING;
+
+COMMENT ON TABLE klines IS 'K线数据表（OHLCV），按周期和时间分区';
+
+COMMIT;
+
+ANALYZE klines;
+
+-- ============================================
+-- 4. 核对后删除旧表
+-- ============================================
+-- SELECT (SELECT COUNT(*) FROM klines_legacy) AS legacy_rows, (SELECT COUNT(*) FROM klines) AS partitioned_rows;
+-- DROP TABLE klines_legacy;
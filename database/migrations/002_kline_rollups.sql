@@ -0,0 +1,54 @@
+-- 高周期K线表
+-- 创建 kline_rollups，并由已有的 1m K线一次性聚合出各周期；之后由后端在 1m K线入库时增量更新
+--
+-- 用法：
+--   psql -U postgres -d quant_trading -f database/migrations/002_kline_rollups.sql
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS kline_rollups (
+    exchange VARCHAR(50) NOT NULL,
+    symbol VARCHAR(50) NOT NULL,
+    interval VARCHAR(10) NOT NULL,
+    timestamp TIMESTAMPTZ NOT NULL,
+    open DOUBLE PRECISION NOT NULL,
+    high DOUBLE PRECISION NOT NULL,
+    low DOUBLE PRECISION NOT NULL,
+    close DOUBLE PRECISION NOT NULL,
+    volume DOUBLE PRECISION NOT NULL,
+    bar_count INTEGER NOT NULL,
+    PRIMARY KEY (exchange, symbol, interval, timestamp)
+);
+
+CREATE INDEX IF NOT EXISTS idx_kline_rollups_timestamp_brin ON kline_rollups USING BRIN (timestamp);
+
+-- 由 1m K线聚合（与 app/services/resampler.py 的对齐方式一致：按 UTC 对齐，周线从周一开始）
+INSERT INTO kline_rollups (exchange, symbol, interval, timestamp, open, high, low, close, volume, bar_count)
+SELECT
+    k.exchange,
+    k.symbol,
+    r.interval,
+    date_bin(r.width, k.timestamp, r.origin) AS bucket,
+    (array_agg(k.open ORDER BY k.timestamp))[1],
+    max(k.high),
+    min(k.low),
+    (array_agg(k.close ORDER BY k.timestamp DESC))[1],
+    sum(k.volume),
+    count(*)
+FROM klines k
+CROSS JOIN (VALUES
+    ('5m', INTERVAL '5 minutes', TIMESTAMPTZ '1970-01-01 00:00:00+00'),
+    ('15m', INTERVAL '15 minutes', TIMESTAMPTZ '1970-01-01 00:00:00+00'),
+    ('30m', INTERVAL '30 minutes', TIMESTAMPTZ '1970-01-01 00:00:00+00'),
+    ('1h', INTERVAL '1 hour', TIMESTAMPTZ '1970-01-01 00:00:00+00'),
+    ('4h', INTERVAL '4 hours', TIMESTAMPTZ '1970-01-01 00:00:00+00'),
+    ('1d', INTERVAL '1 day', TIMESTAMPTZ '1970-01-01 00:00:00+00'),
+    ('1w', INTERVAL '7 days', TIMESTAMPTZ '1970-01-05 00:00:00+00')
+) AS r(interval, width, origin)
+WHERE k.interval = '1m'
+GROUP BY k.exchange, k.symbol, r.interval, bucket
+ON CONFLICT (exchange, symbol, interval, timestamp) DO NOTHING;
+
+COMMIT;
+
+ANALYZE kline_rollups;
@@ -330,9 +330,14 @@ LIMIT 20;
 -- 9. 数据维护查询
 -- ============================================
 
--- 清理旧的K线数据（保留最近1年）
--- DELETE FROM klines 
--- WHERE timestamp < CURRENT_DATE - INTERVAL '1 year';
+-- 查看K线分区及大小（旧数据由分区维护任务按保留策略整分区删除）
+SELECT
+    relid::regclass AS partition,
+    parentrelid::regclass AS parent,
+    pg_size_pretty(pg_relation_size(relid)) AS size
+FROM pg_partition_tree('klines')
+WHERE isleaf
+ORDER BY relid::regclass::text;
 
 -- 归档旧订单（示例，需要先创建归档表）
 -- INSERT INTO orders_archive 
@@ -7,6 +7,7 @@ DROP TABLE IF EXISTS positions CASCADE;
 DROP TABLE IF EXISTS orders CASCADE;
 DROP TABLE IF EXISTS backtests CASCADE;
 DROP TABLE IF EXISTS strategies CASCADE;
+DROP TABLE IF EXISTS kline_rollups CASCADE;
 DROP TABLE IF EXISTS klines CASCADE;
 DROP TABLE IF EXISTS users CASCADE;
 
@@ -73,9 +74,17 @@ COMMENT ON COLUMN strategies.status IS '策略状态：running, stopped, error';
 CREATE TABLE backtests (
     id SERIAL PRIMARY KEY,
     strategy_id INTEGER NOT NULL REFERENCES strategies(id) ON DELETE CASCADE,
+    exchange VARCHAR(50) NOT NULL DEFAULT 'binance_public',
+    symbol VARCHAR(50) NOT NULL DEFAULT 'BTC/USDT',
+    interval VARCHAR(10) NOT NULL DEFAULT '1h',
     start_date DATE NOT NULL,
     end_date DATE NOT NULL,
     initial_capital DECIMAL(20, 2) DEFAULT 100000.00,
+    commission DECIMAL(10, 6) DEFAULT 0.001,
+    status VARCHAR(20) DEFAULT 'pending',
+    progress DECIMAL(5, 4) DEFAULT 0,
+    task_id VARCHAR(100),
+    error_message TEXT,
     final_capital DECIMAL(20, 2),
     total_return DECIMAL(10, 4),
     sharpe_ratio DECIMAL(10, 4),
@@ -83,22 +92,35 @@ CREATE TABLE backtests (
     win_rate DECIMAL(10, 4),
     total_trades INTEGER,
     result_data JSONB,
+    equity_curve_data BYTEA,
+    trades_data BYTEA,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
 -- 回测表索引
 CREATE INDEX idx_backtests_strategy_id ON backtests(strategy_id);
 CREATE INDEX idx_backtests_created_at ON backtests(created_at DESC);
+CREATE INDEX idx_backtests_status ON backtests(status);
 
 -- 回测表注释
 COMMENT ON TABLE backtests IS '策略回测结果表';
+COMMENT ON COLUMN backtests.exchange IS '交易所名称';
+COMMENT ON COLUMN backtests.symbol IS '交易对';
+COMMENT ON COLUMN backtests.interval IS 'K线周期';
 COMMENT ON COLUMN backtests.initial_capital IS '初始资金';
+COMMENT ON COLUMN backtests.commission IS '手续费率';
+COMMENT ON COLUMN backtests.status IS '回测状态：pending, running, completed, failed, cancelled';
+COMMENT ON COLUMN backtests.progress IS '回测进度（0~1）';
+COMMENT ON COLUMN backtests.task_id IS 'Celery任务ID';
+COMMENT ON COLUMN backtests.error_message IS '失败原因';
+COMMENT ON COLUMN backtests.equity_curve_data IS '权益曲线（压缩的列式二进制）';
+COMMENT ON COLUMN backtests.trades_data IS '成交记录（压缩的列式二进制）';
 COMMENT ON COLUMN backtests.final_capital IS '最终资金';
 COMMENT ON COLUMN backtests.total_return IS '总收益率';
 COMMENT ON COLUMN backtests.sharpe_ratio IS '夏普比率';
 COMMENT ON COLUMN backtests.max_drawdown IS '最大回撤';
 COMMENT ON COLUMN backtests.win_rate IS '胜率';
-COMMENT ON COLUMN backtests.result_data IS '详细回测数据（JSON格式）';
+COMMENT ON COLUMN backtests.result_data IS '回测结果摘要（JSON格式）';
 
 -- ============================================
 -- 4. 订单表
@@ -201,24 +223,44 @@ COMMENT ON COLUMN trades.trade_id IS '交易所成交ID';
 -- ============================================
 -- 7. K线数据表
 -- ============================================
+-- 按周期 LIST 分区，每个周期再按时间 RANGE 分区（1m/5m 按月，其余按年）；
+-- 时间分区由后端的分区维护任务创建（启动时及每天一次，提前创建未来分区、执行保留策略），
+-- 尚未创建时间分区的时段先写入各周期的默认分区，维护任务会把这些数据迁入对应的时间分区
 CREATE TABLE klines (
-    id SERIAL PRIMARY KEY,
     exchange VARCHAR(50) NOT NULL,
     symbol VARCHAR(50) NOT NULL,
     interval VARCHAR(10) NOT NULL,
-    timestamp TIMESTAMP NOT NULL,
+    timestamp TIMESTAMPTZ NOT NULL,
     open DECIMAL(20, 8) NOT NULL,
     high DECIMAL(20, 8) NOT NULL,
     low DECIMAL(20, 8) NOT NULL,
     close DECIMAL(20, 8) NOT NULL,
     volume DECIMAL(30, 8) NOT NULL,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (exchange, symbol, interval, timestamp)
+) PARTITION BY LIST (interval);
 
--- K线数据表索引（重要：用于快速查询）
-CREATE UNIQUE INDEX idx_klines_unique ON klines(exchange, symbol, interval, timestamp);
-CREATE INDEX idx_klines_symbol ON klines(symbol);
-CREATE INDEX idx_klines_timestamp ON klines(timestamp DESC);
+-- 周期分区及其默认分区
+DO $$
+DECLARE
+    iv TEXT;
+BEGIN
+    FOREACH iv IN ARRAY ARRAY['1m', '5m', '15m', '30m', '1h', '4h', '1d', '1w'] LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF klines FOR VALUES IN (%L) PARTITION BY RANGE (timestamp)',
+            'klines_' || iv, iv
+        );
+        EXECUTE format('CREATE TABLE %I PARTITION OF %I DEFAULT', 'klines_' || iv || '_default', 'klines_' || iv);
+    END LOOP;
+END $$;
+
+-- 其他周期
+CREATE TABLE klines_other PARTITION OF klines DEFAULT;
+
+-- K线数据表索引
+-- 主键 (exchange, symbol, interval, timestamp) 用于按交易对查询和写入去重；
+-- 时间列使用 BRIN 索引（K线按时间顺序写入，索引只有几个页，写入几乎无开销）
+CREATE INDEX idx_klines_timestamp_brin ON klines USING BRIN (timestamp);
 
 -- K线数据表注释
 COMMENT ON TABLE klines IS 'K线数据表（OHLCV）';
@@ -232,6 +274,30 @@ COMMENT ON COLUMN klines.low IS '最低价';
 COMMENT ON COLUMN klines.close IS '收盘价';
 COMMENT ON COLUMN klines.volume IS '成交量';
 
+-- ============================================
+-- 7.1 高周期K线表（由 1m K线聚合）
+-- ============================================
+CREATE TABLE kline_rollups (
+    exchange VARCHAR(50) NOT NULL,
+    symbol VARCHAR(50) NOT NULL,
+    interval VARCHAR(10) NOT NULL,
+    timestamp TIMESTAMPTZ NOT NULL,
+    open DOUBLE PRECISION NOT NULL,
+    high DOUBLE PRECISION NOT NULL,
+    low DOUBLE PRECISION NOT NULL,
+    close DOUBLE PRECISION NOT NULL,
+    volume DOUBLE PRECISION NOT NULL,
+    bar_count INTEGER NOT NULL,
+    PRIMARY KEY (exchange, symbol, interval, timestamp)
+);
+
+CREATE INDEX idx_kline_rollups_timestamp_brin ON kline_rollups USING BRIN (timestamp);
+
+COMMENT ON TABLE kline_rollups IS '高周期K线（由1m K线聚合，新的1m K线入库后增量更新）';
+COMMENT ON COLUMN kline_rollups.interval IS '周期：5m, 15m, 30m, 1h, 4h, 1d, 1w';
+COMMENT ON COLUMN kline_rollups.timestamp IS '周期开盘时间（UTC 对齐，周线从周一开始）';
+COMMENT ON COLUMN kline_rollups.bar_count IS '聚合的1m K线数，等于周期分钟数时为完整K线';
+
 -- ============================================
 -- 8. 插入测试数据（可选）
 -- ============================================
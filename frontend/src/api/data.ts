@@ -14,13 +14,26 @@ export const getExchanges = () => {
 }
 
 // 获取交易对列表
-export const getDataSymbols = (params: { exchange: string }) => {
+export const getDataSymbols = (params: {
+  exchange: string
+  quote?: string
+  base?: string
+  market_type?: string
+}) => {
   return request.get<{ exchange: string; symbols: string[]; count: number }>(
     '/data/symbols',
     { params }
   )
 }
 
+// 搜索交易对（前缀/模糊匹配）
+export const searchDataSymbols = (params: { exchange: string; q: string; limit?: number }) => {
+  return request.get<{ exchange: string; query: string; symbols: string[] }>(
+    '/data/symbols/search',
+    { params }
+  )
+}
+
 // 获取实时行情
 export const getDataTicker = (params: { exchange: string; symbol: string }) => {
   return request.get('/data/ticker', { params })
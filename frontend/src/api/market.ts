@@ -43,6 +43,54 @@ export const getTicker = (params: { exchange: string; symbol: string }) => {
   return request.get<Ticker>('/market/ticker', { params })
 }
 
+export interface TickerUpdate {
+  exchange: string
+  symbol: string
+  last_price: number
+  bid: number
+  ask: number
+  volume_24h: number
+  change_24h: number
+  timestamp: number
+}
+
+// 订阅实时行情（WebSocket 推送，断线后自动重连），返回取消订阅函数
+export const subscribeTickers = (
+  params: { exchange: string; symbols: string[] },
+  onTicks: (ticks: TickerUpdate[]) => void
+) => {
+  const base = import.meta.env.VITE_API_BASE_URL || '/api/v1'
+  const url = new URL(`${base}/market/ws/ticker`, window.location.href)
+  url.protocol = url.protocol === 'https:' ? 'wss:' : 'ws:'
+  url.searchParams.set('exchange', params.exchange)
+  url.searchParams.set('symbols', params.symbols.join(','))
+
+  let socket: WebSocket | null = null
+  let closed = false
+  let retryDelay = 1000
+
+  const connect = () => {
+    socket = new WebSocket(url.toString())
+    socket.onopen = () => {
+      retryDelay = 1000
+    }
+    socket.onmessage = (event) => {
+      onTicks(JSON.parse(event.data))
+    }
+    socket.onclose = () => {
+      if (closed) return
+      setTimeout(connect, retryDelay)
+      retryDelay = Math.min(retryDelay * 2, 30000)
+    }
+  }
+  connect()
+
+  return () => {
+    closed = true
+    socket?.close()
+  }
+}
+
 // 获取交易对列表
 export const getSymbols = (params: { exchange: string }) => {
   return request.get<{ exchange: string; symbols: string[] }>('/market/symbols', { params })
@@ -33,9 +33,13 @@ export interface StrategyUpdate {
 
 export interface BacktestCreate {
   strategy_id: number
+  exchange?: string
+  symbol?: string
+  interval?: string
   start_date: string
   end_date: string
   initial_capital?: number
+  commission?: number
 }
 
 export interface BacktestResult {
@@ -43,7 +47,14 @@ export interface BacktestResult {
   strategy_id: number
   start_date: string
   end_date: string
+  exchange: string
+  symbol: string
+  interval: string
   initial_capital: number
+  commission?: number
+  status: string
+  progress?: number
+  error_message?: string
   final_capital?: number
   total_return?: number
   sharpe_ratio?: number
@@ -54,6 +65,29 @@ export interface BacktestResult {
   created_at: string
 }
 
+export interface BacktestEquity {
+  backtest_id: number
+  timestamps: string[]
+  equity: number[]
+  total_points: number
+  downsampled: boolean
+}
+
+export interface BacktestTrade {
+  timestamp: string
+  side: string
+  price: number
+  amount: number
+  commission: number
+  symbol?: string
+}
+
+export interface BacktestTrades {
+  backtest_id: number
+  trades: BacktestTrade[]
+  total: number
+}
+
 // 获取策略列表
 export const getStrategies = (params?: { skip?: number; limit?: number }) => {
   return request.get<Strategy[]>('/strategies/', { params })
@@ -98,3 +132,24 @@ export const createBacktest = (data: BacktestCreate) => {
 export const getBacktest = (id: number) => {
   return request.get<BacktestResult>(`/strategies/backtest/${id}`)
 }
+
+// 获取回测权益曲线（按范围截取，超过 max_points 时服务端降采样）
+export const getBacktestEquity = (
+  id: number,
+  params?: { start?: string; end?: string; max_points?: number }
+) => {
+  return request.get<BacktestEquity>(`/strategies/backtest/${id}/equity`, { params })
+}
+
+// 获取回测成交记录（分页）
+export const getBacktestTrades = (
+  id: number,
+  params?: { start?: string; end?: string; skip?: number; limit?: number }
+) => {
+  return request.get<BacktestTrades>(`/strategies/backtest/${id}/trades`, { params })
+}
+
+// 取消回测
+export const cancelBacktest = (id: number) => {
+  return request.post(`/strategies/backtest/${id}/cancel`)
+}